@@ -0,0 +1,115 @@
+"""Runs the offline benchmark suite and compares it against a baseline
+
+Every case in bench/suite.py is sampled `--repeat` times and the median time per call is
+kept.  Results are written as JSON, and when a baseline file from an earlier run is given,
+cases slower than the baseline by more than `--tolerance` are reported and the exit status
+is 1.
+
+    python -m bench [--suite local --suite aws ...] [--quick] [--output results.json]
+                    [--baseline baseline.json] [--tolerance 0.25] [--repeat 5]
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from .suite import SUITES
+
+
+def measure(case, repeat : int) -> dict:
+    case.fn()
+    samples = []
+    for _ in range(repeat):
+        fn = case.fn
+        t0 = time.perf_counter()
+        for _ in range(case.number):
+            fn()
+        samples.append((time.perf_counter() - t0) / case.number)
+    median = statistics.median(samples)
+    result = { "seconds": median, "min_seconds": min(samples), "number": case.number, "repeat": repeat }
+    if case.nbytes:
+        result["nbytes"] = case.nbytes
+        result["mb_per_s"] = case.nbytes / median / 1e6
+    return result
+
+
+def run(suites, quick : bool = False, repeat : int = 5, progress = None) -> dict:
+    results = {}
+    for name in suites:
+        for case in SUITES[name](quick):
+            results[case.name] = measure(case, repeat)
+            if progress is not None:
+                progress(case.name, results[case.name])
+    return {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": quick,
+        },
+        "results": results,
+    }
+
+
+def slowdown(result : dict, base : dict) -> float:
+    """How many times slower result is than base; transfers are compared per byte, so --quick runs compare with full ones"""
+    if result.get("nbytes") and base.get("nbytes"):
+        return (result["seconds"] / result["nbytes"]) / (base["seconds"] / base["nbytes"])
+    return result["seconds"] / base["seconds"]
+
+
+def compare(results : dict, baseline : dict, tolerance : float) -> list:
+    """Returns (name, baseline seconds, seconds, ratio) for the cases slower than tolerance allows"""
+    regressions = []
+    for name, result in results["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        ratio = slowdown(result, base)
+        if ratio > 1 + tolerance:
+            regressions.append((name, base["seconds"], result["seconds"], ratio))
+    return regressions
+
+
+def format_time(seconds : float) -> str:
+    if seconds >= 1:
+        return f"{seconds:8.2f} s "
+    if seconds >= 1e-3:
+        return f"{seconds*1e3:8.2f} ms"
+    return f"{seconds*1e6:8.2f} us"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--suite", action="append", choices=sorted(SUITES), help="suite to run, repeatable (default all)")
+    parser.add_argument("--quick", action="store_true", help="smaller payloads and keystores")
+    parser.add_argument("--repeat", type=int, default=5, help="samples per case")
+    parser.add_argument("--output", default=None, help="write the results to this JSON file")
+    parser.add_argument("--baseline", default=None, help="compare against the results in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown against the baseline (default 0.25)")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+
+    def progress(name, result):
+        line = f"{name:<36} {format_time(result['seconds'])}"
+        if "mb_per_s" in result:
+            line += f" {result['mb_per_s']:10.1f} MB/s"
+        base = baseline["results"].get(name) if baseline else None
+        if base is not None:
+            line += f"   {slowdown(result, base):6.2f}x baseline"
+        print(line, flush=True)
+
+    results = run(args.suite or list(SUITES), args.quick, args.repeat, progress)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for name, base, seconds, ratio in regressions:
+            print(f"!! {name} regressed {ratio:.2f}x: {format_time(base).strip()} -> {format_time(seconds).strip()}")
+        sys.exit(1 if regressions else 0)
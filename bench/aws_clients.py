@@ -0,0 +1,68 @@
+"""Per-handle cost of AwsBackend.object()/secret()
+
+Compares building a new botocore client for every handle (the previous behaviour)
+against the cached per-(service, region) client owned by AwsBackend.  No requests
+are sent, so the benchmark runs offline with dummy credentials.
+
+    python -m bench.aws_clients [-n 200]
+"""
+import argparse
+import time
+import multicloud
+from multicloud.backend.secret import Secret
+from multicloud_aws.aws_object import AwsObject
+
+
+class StaticSecret(Secret):
+    def __init__(self, value : dict):
+        super().__init__(None, "static")
+        self.value = value
+
+    def get(self) -> dict:
+        return self.value
+
+
+def make_context():
+    config = {
+        "bench": {
+            "network": { "verify": True },
+            "backend": { "type": "aws", "Bucket": "bench", "Region": "us-west-2" }
+        }
+    }
+    creds = StaticSecret({ "access_id": "AKIABENCHMARK", "secret_key": "benchmark" })
+    return multicloud.Context("bench", config, credentials=creds)
+
+
+def per_handle_uncached(ctx, n):
+    backend = ctx.backend
+    t0 = time.perf_counter()
+    for i in range(n):
+        client = backend.session.client(service_name='s3', region_name=backend.region)
+        AwsObject(ctx, f"key/{i}", backend.bucket, client, backend.options)
+    return (time.perf_counter() - t0) / n
+
+
+def per_handle_cached(ctx, n):
+    t0 = time.perf_counter()
+    for i in range(n):
+        ctx.object(f"key/{i}")
+    return (time.perf_counter() - t0) / n
+
+
+def run(n=200):
+    ctx = make_context()
+    ctx.object("warmup")
+    return {
+        "uncached_us": per_handle_uncached(ctx, n) * 1e6,
+        "cached_us": per_handle_cached(ctx, n) * 1e6,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", type=int, default=200, help="handles to create per measurement")
+    args = parser.parse_args()
+    result = run(args.n)
+    print(f"new client per handle: {result['uncached_us']:10.1f} us/handle")
+    print(f"cached client:         {result['cached_us']:10.1f} us/handle")
+    print(f"speedup:               {result['uncached_us'] / result['cached_us']:10.1f} x")
@@ -0,0 +1,78 @@
+"""Throughput of bulk object operations against one-at-a-time calls
+
+Writes, reads and deletes N small objects first with a loop over ctx.object(k),
+then with put_many / get_many / delete_many.  By default a temporary local
+backend is used; --service benchmarks a service from ~/.jaws instead.
+
+    python -m bench.bulk [-n 2000] [--size 1024] [--workers 16] [--service NAME]
+"""
+import argparse
+import os
+import tempfile
+import time
+import multicloud
+
+
+def make_context(service=None):
+    if service is not None:
+        return multicloud.Context(service)
+    basedir = tempfile.mkdtemp(prefix="multicloud-bench-")
+    return multicloud.Context("bench", {
+        "bench": {
+            "network": { "verify": True },
+            "backend": { "type": "local", "basedir": basedir }
+        }
+    })
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def run(n=2000, size=1024, workers=16, service=None, prefix="bench/bulk/"):
+    ctx = make_context(service)
+    payload = os.urandom(size)
+    keys = [ f"{prefix}{i:08d}" for i in range(n) ]
+
+    def sequential_put():
+        for key in keys:
+            ctx.object(key).put_bytes(payload)
+
+    def sequential_get():
+        for key in keys:
+            ctx.object(key).get_bytes()
+
+    def sequential_delete():
+        for key in keys:
+            ctx.object(key).delete()
+
+    def check(result):
+        result.raise_for_errors()
+
+    results = {}
+    results["sequential"] = {
+        "put": n / timed(sequential_put),
+        "get": n / timed(sequential_get),
+        "delete": n / timed(sequential_delete),
+    }
+    results["bulk"] = {
+        "put": n / timed(lambda: check(ctx.put_many(((key, payload) for key in keys), workers))),
+        "get": n / timed(lambda: check(ctx.get_many(keys, workers))),
+        "delete": n / timed(lambda: check(ctx.delete_many(keys, workers))),
+    }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", type=int, default=2000, help="number of objects")
+    parser.add_argument("--size", type=int, default=1024, help="object size in bytes")
+    parser.add_argument("--workers", type=int, default=16, help="bulk worker threads")
+    parser.add_argument("--service", default=None, help="service from ~/.jaws, default is a temporary local backend")
+    args = parser.parse_args()
+    results = run(args.n, args.size, args.workers, args.service)
+    print(f"{'ops/s':>10} {'put':>10} {'get':>10} {'delete':>10}")
+    for mode, rates in results.items():
+        print(f"{mode:>10} {rates['put']:10.0f} {rates['get']:10.0f} {rates['delete']:10.0f}")
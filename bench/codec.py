@@ -0,0 +1,103 @@
+"""Compression ratio against throughput of the object codecs
+
+Compresses generated JSON and CSV payloads with every codec and level, reporting the
+ratio and the compress and decompress rates of the raw codec, then writes and reads the
+payload through a codec-wrapped local backend with put_file / get_file to include the
+streaming layer.  zstd rows are skipped when the zstandard package is not installed.
+
+    python -m bench.codec [--rows 200000] [--codec gzip:6] [--codec zstd:3 ...]
+"""
+import argparse
+import json
+import random
+import shutil
+import tempfile
+import time
+import multicloud
+from multicloud.common.codec import get_codec
+
+DEFAULT_CODECS = [ "gzip:1", "gzip:6", "gzip:9", "zstd:1", "zstd:3", "zstd:9", "zstd:19" ]
+# size of the writes and reads made through the streaming layer
+STREAM_CHUNK = 1024 * 1024
+
+
+def make_payloads(rows):
+    rng = random.Random(42)
+    records = [ { "id": i, "name": f"user{rng.randrange(10000)}", "score": round(rng.random() * 100, 3),
+                  "tags": rng.sample(["red", "green", "blue", "cyan", "black"], 2), "active": rng.random() < 0.5 }
+                for i in range(rows) ]
+    csv = "id,name,score,tags,active\n" + "".join(
+        f"{r['id']},{r['name']},{r['score']},{'|'.join(r['tags'])},{int(r['active'])}\n" for r in records)
+    return { "json": json.dumps(records).encode(), "csv": csv.encode() }
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - t0, result
+
+
+def stream(ctx, key, data):
+    def put():
+        with ctx.object(key).put_file() as f:
+            for i in range(0, len(data), STREAM_CHUNK):
+                f.write(data[i:i+STREAM_CHUNK])
+
+    def get():
+        with ctx.object(key).get_file() as f:
+            return sum(len(chunk) for chunk in iter(lambda: f.read(STREAM_CHUNK), b""))
+
+    put_s, _ = timed(put)
+    get_s, size = timed(get)
+    assert size == len(data)
+    return put_s, get_s
+
+
+def run(rows=200000, codecs=DEFAULT_CODECS):
+    payloads = make_payloads(rows)
+    basedir = tempfile.mkdtemp(prefix="multicloud-bench-")
+    results = []
+    try:
+        for spec in ["identity"] + list(codecs):
+            name, _, level = spec.partition(":")
+            try:
+                codec = get_codec(name, level or None)
+            except ImportError:
+                continue
+            ctx = multicloud.Context("bench", { "bench": {
+                "network": { "verify": True },
+                "backend": { "type": "local", "basedir": basedir, "codec": name, "codec_level": level or None } } })
+            for kind, data in payloads.items():
+                mb = len(data) / 1e6
+                if codec is None:
+                    compress_s, decompress_s, stored = 0.0, 0.0, len(data)
+                else:
+                    compress_s, compressed = timed(lambda: codec.compress(data))
+                    decompress_s, restored = timed(lambda: codec.decompress(compressed))
+                    assert restored == data
+                    stored = len(compressed)
+                put_s, get_s = stream(ctx, f"{spec}/{kind}", data)
+                results.append({
+                    "codec": spec, "payload": kind, "mb": mb,
+                    "ratio": len(data) / stored,
+                    "compress_mbs": mb / compress_s if compress_s else None,
+                    "decompress_mbs": mb / decompress_s if decompress_s else None,
+                    "put_mbs": mb / put_s,
+                    "get_mbs": mb / get_s,
+                })
+    finally:
+        shutil.rmtree(basedir, ignore_errors=True)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000, help="records in each payload")
+    parser.add_argument("--codec", action="append", default=None, help="codec:level to measure, repeatable")
+    args = parser.parse_args()
+    results = run(args.rows, args.codec or DEFAULT_CODECS)
+    rate = lambda value: f"{value:10.1f}" if value is not None else f"{'-':>10}"
+    print(f"{'codec':>10} {'payload':>8} {'MB':>7} {'ratio':>7} {'comp MB/s':>10} {'dec MB/s':>10} {'put MB/s':>10} {'get MB/s':>10}")
+    for r in results:
+        print(f"{r['codec']:>10} {r['payload']:>8} {r['mb']:7.1f} {r['ratio']:7.2f} {rate(r['compress_mbs'])} "
+              f"{rate(r['decompress_mbs'])} {rate(r['put_mbs'])} {rate(r['get_mbs'])}")
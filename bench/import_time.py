@@ -0,0 +1,83 @@
+"""Import-time budget for `import multicloud`
+
+Runs `python -X importtime -c "import multicloud"` in fresh interpreters, takes the
+median cumulative import time of the multicloud package and fails when it exceeds the
+budget.  It also fails when importing multicloud, or using the local object backend,
+loads any heavy optional dependency, which is the usual way a regression sneaks in.
+
+    python -m bench.import_time [--budget-ms 25] [--runs 7]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# modules that must only be loaded once the backend needing them is selected
+HEAVY_MODULES = [
+    "yaml", "certifi", "keyring", "cryptography", "boto3", "botocore",
+    "webdav4", "httpx", "paramiko", "asyncio",
+]
+
+LOCAL_BACKEND_PROBE = """
+import json, sys, multicloud
+ctx = multicloud.Context("probe", {"probe": {"network": {"verify": True}, "backend": {"type": "local", "basedir": sys.argv[1]}}})
+ctx.object("probe").put_bytes(b"x")
+ctx.object("probe").get_bytes()
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+def package_root():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_python(args):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [package_root(), env.get("PYTHONPATH")]))
+    return subprocess.run([sys.executable] + args, capture_output=True, text=True, env=env, check=True)
+
+
+def import_time_us():
+    """Cumulative import time of the multicloud package in a fresh interpreter"""
+    stderr = run_python(["-X", "importtime", "-c", "import multicloud"]).stderr
+    for line in stderr.splitlines():
+        fields = [ f.strip() for f in line.split("|") ]
+        if len(fields) == 3 and fields[2] == "multicloud":
+            return int(fields[1])
+    raise RuntimeError("multicloud not found in -X importtime output")
+
+
+def loaded_modules(code, *args):
+    return set(json.loads(run_python(["-c", code] + list(args)).stdout))
+
+
+def run(runs=7):
+    samples = [ import_time_us() for _ in range(runs) ]
+    # modules the interpreter loads by itself (e.g. from .pth files) are not multicloud's doing
+    preloaded = loaded_modules("import json, sys; print(json.dumps(sorted(sys.modules)))")
+    on_import = loaded_modules("import json, sys, multicloud; print(json.dumps(sorted(sys.modules)))") - preloaded
+    with tempfile.TemporaryDirectory() as basedir:
+        on_local = loaded_modules(LOCAL_BACKEND_PROBE, basedir) - preloaded
+    return {
+        "import_ms": statistics.median(samples) / 1000,
+        "heavy_on_import": sorted(m for m in HEAVY_MODULES if m in on_import),
+        "heavy_on_local_backend": sorted(m for m in HEAVY_MODULES if m in on_local),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=25.0, help="maximum median import time")
+    parser.add_argument("--runs", type=int, default=7, help="interpreters to sample")
+    args = parser.parse_args()
+    result = run(args.runs)
+    print(f"import multicloud: {result['import_ms']:.1f} ms (budget {args.budget_ms:.1f} ms)")
+    failed = result["import_ms"] > args.budget_ms
+    for phase in ("heavy_on_import", "heavy_on_local_backend"):
+        if result[phase]:
+            print(f"{phase}: {', '.join(result[phase])}")
+            failed = True
+    sys.exit(1 if failed else 0)
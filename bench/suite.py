@@ -0,0 +1,232 @@
+"""Offline benchmark cases for contexts, objects and secrets on every backend
+
+Each suite is a generator of Case objects, timed by the runner in bench/__main__.py as they are
+yielded.  Suites needing a stand-in server start it in process: moto for S3 and WsgiDAV for the
+NAS WebDAV server.  A suite whose stand-in is not installed is skipped.
+"""
+import os
+import random
+import shutil
+import tempfile
+import threading
+import multicloud
+from multicloud.backend.secret import Secret
+
+SMALL = 1024
+LARGE = 16 * 1024 * 1024
+QUICK_LARGE = 4 * 1024 * 1024
+# writer threads of the concurrent local durability cases
+WRITERS = 8
+KEYRING_SIZES = (10, 1000, 10000, 100000)
+QUICK_KEYRING_SIZES = (10, 1000)
+# bytes written and read per call when streaming large objects
+STREAM_CHUNK = 1024 * 1024
+
+
+class StaticSecret(Secret):
+    """Fixed credentials handed to backends that would otherwise look them up"""
+
+    def __init__(self, value : dict):
+        super().__init__(None, "static")
+        self.value = value
+
+    def get(self) -> dict:
+        return self.value
+
+
+class Case:
+    """One timed operation
+
+    Args:
+      name :str: unique name, used to match results against a baseline
+      fn :Callable: the operation, called `number` times per sample
+      number :int: calls per sample
+      nbytes :int: payload bytes per call, to also report throughput
+    """
+
+    def __init__(self, name : str, fn, number : int, nbytes : int = 0):
+        self.name = name
+        self.fn = fn
+        self.number = number
+        self.nbytes = nbytes
+
+
+def service(name : str, backend : dict, **sections) -> dict:
+    return { name: dict({ "network": { "verify": True }, "backend": backend }, **sections) }
+
+
+def object_cases(prefix : str, ctx, large : int, small_number : int):
+    """put/get of small objects and streamed put/get of a large one"""
+    small = os.urandom(SMALL)
+    big = os.urandom(large)
+    keys = [ f"bench/small/{i}" for i in range(small_number) ]
+    counter = iter(range(1 << 62))
+
+    def put_small():
+        ctx.object(keys[next(counter) % len(keys)]).put_bytes(small)
+
+    def get_small():
+        ctx.object(keys[next(counter) % len(keys)]).get_bytes()
+
+    def put_large():
+        with ctx.object("bench/large").put_file() as f:
+            for i in range(0, len(big), STREAM_CHUNK):
+                f.write(big[i:i+STREAM_CHUNK])
+
+    def get_large():
+        with ctx.object("bench/large").get_file() as f:
+            while f.read(STREAM_CHUNK):
+                pass
+
+    def list_small():
+        for _ in ctx.list("bench/small/"):
+            pass
+
+    for key in keys:
+        ctx.object(key).put_bytes(small)
+    yield Case(f"{prefix}.handle", lambda: ctx.object("bench/handle"), 2000)
+    yield Case(f"{prefix}.put_small", put_small, small_number, SMALL)
+    yield Case(f"{prefix}.get_small", get_small, small_number, SMALL)
+    yield Case(f"{prefix}.list", list_small, 10)
+    yield Case(f"{prefix}.put_large", put_large, 1, large)
+    yield Case(f"{prefix}.get_large", get_large, 1, large)
+
+
+def context_suite(quick : bool = False):
+    basedir = tempfile.mkdtemp(prefix="multicloud-bench-")
+    config = multicloud.Config(service("bench", { "type": "local", "basedir": basedir }))
+    try:
+        yield Case("context.construct", lambda: multicloud.Context("bench", config), 500)
+        yield Case("context.construct_and_connect", lambda: multicloud.Context("bench", config).backend, 500)
+        multicloud.get_context("bench", config)
+        yield Case("context.get_context_shared", lambda: multicloud.get_context("bench", config), 5000)
+    finally:
+        shutil.rmtree(basedir, ignore_errors=True)
+
+
+def local_suite(quick : bool = False):
+    basedir = tempfile.mkdtemp(prefix="multicloud-bench-")
+    ctx = multicloud.Context("bench", service("bench", { "type": "local", "basedir": basedir }))
+    try:
+        yield from object_cases("local", ctx, QUICK_LARGE if quick else LARGE, 200)
+    finally:
+        shutil.rmtree(basedir, ignore_errors=True)
+
+
+def sharded_suite(quick : bool = False):
+    """The local backend with the sharded layout and its key index"""
+    basedir = tempfile.mkdtemp(prefix="multicloud-bench-")
+    ctx = multicloud.Context("bench", service("bench", { "type": "local", "basedir": basedir, "layout": "sharded" }))
+    try:
+        yield from object_cases("sharded", ctx, QUICK_LARGE if quick else LARGE, 200)
+    finally:
+        shutil.rmtree(basedir, ignore_errors=True)
+
+
+def durability_suite(quick : bool = False):
+    """Concurrent small puts on the local backend with each durability setting"""
+    from concurrent.futures import ThreadPoolExecutor
+    small = os.urandom(SMALL)
+    number = 50 if quick else 200
+    with ThreadPoolExecutor(WRITERS) as pool:
+        for durability in ("none", "fsync", "group"):
+            basedir = tempfile.mkdtemp(prefix="multicloud-bench-")
+            ctx = multicloud.Context("bench", service("bench", { "type": "local", "basedir": basedir, "durability": durability }))
+
+            def put_concurrent():
+                for _ in pool.map(lambda i: ctx.object(f"bench/small/{i % 100}").put_bytes(small), range(WRITERS * number)):
+                    pass
+            try:
+                yield Case(f"local.{durability}.put_concurrent", put_concurrent, 1, WRITERS * number * SMALL)
+            finally:
+                shutil.rmtree(basedir, ignore_errors=True)
+
+
+def aws_suite(quick : bool = False):
+    try:
+        import boto3
+        from moto import mock_aws
+    except ImportError:
+        return
+    with mock_aws():
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket="bench")
+        ctx = multicloud.Context("bench", service("bench", { "type": "aws", "Bucket": "bench", "Region": "us-east-1" }),
+                                 credentials=StaticSecret({ "access_id": "AKIABENCHMARK", "secret_key": "benchmark" }))
+        yield from object_cases("aws", ctx, QUICK_LARGE if quick else LARGE, 50)
+
+
+def start_webdav(root : str):
+    """Serves root over WebDAV on a free local port, returns (server, port)"""
+    from wsgidav.wsgidav_app import WsgiDAVApp
+    from cheroot import wsgi
+    app = WsgiDAVApp({
+        "provider_mapping": { "/": root },
+        "simple_dc": { "user_mapping": { "*": { "bench": { "password": "bench" } } } },
+        "http_authenticator": { "accept_basic": True, "accept_digest": False, "default_to_digest": False },
+        "verbose": 0,
+        "logging": { "enable": False },
+    })
+    server = wsgi.Server(("127.0.0.1", 0), app, numthreads=16)
+    server.prepare()
+    threading.Thread(target=server.serve, daemon=True).start()
+    return server, server.bind_addr[1]
+
+
+def nas_suite(quick : bool = False):
+    try:
+        import wsgidav, cheroot
+    except ImportError:
+        return
+    root = tempfile.mkdtemp(prefix="multicloud-bench-dav-")
+    server, port = start_webdav(root)
+    try:
+        ctx = multicloud.Context("bench", service("bench", { "type": "nas", "server": "127.0.0.1", "port": port, "scheme": "http" }),
+                                 credentials=StaticSecret({ "username": "bench", "password": "bench" }))
+        yield from object_cases("nas", ctx, QUICK_LARGE if quick else LARGE, 50)
+    finally:
+        server.stop()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def keyring_suite(quick : bool = False):
+    """FernetKeyring lookups, journal appends and loading at several keystore sizes
+
+    The keystores are filled in one transaction, and the KDF, which dominates opening a
+    keyring, is measured once on its own.
+    """
+    from multicloud.backend.portable.fernet_keyring import FernetKeyring
+    workdir = tempfile.mkdtemp(prefix="multicloud-bench-keyring-")
+    try:
+        keyring = None
+        for size in (QUICK_KEYRING_SIZES if quick else KEYRING_SIZES):
+            path = os.path.join(workdir, f"keyring-{size}.json")
+            if keyring is None:
+                keyring = FernetKeyring("bench", path)
+                yield Case("keyring.kdf", lambda: keyring.superkey(b"bench"), 1)
+            else:
+                # reuse the derived key and its salt, the KDF is measured above
+                salt = keyring.salt
+                keyring.keystore_path = path
+                keyring.keystore = keyring.load_data()
+                keyring.salt = salt
+            with keyring.transaction():
+                for i in range(size):
+                    keyring.set_password("bench", f"secret-{i}", f"value-{i}")
+            names = [ f"secret-{random.randrange(size)}" for _ in range(1000) ]
+            counter = iter(range(1 << 62))
+            yield Case(f"keyring.get.{size}", lambda: keyring.get_password("bench", names[next(counter) % len(names)]), 1000)
+            yield Case(f"keyring.set.{size}", lambda: keyring.set_password("bench", names[next(counter) % len(names)], "updated"), 100)
+            yield Case(f"keyring.load.{size}", keyring.load_data, 1 if size >= 10000 else 20)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+SUITES = {
+    "context": context_suite,
+    "local": local_suite,
+    "sharded": sharded_suite,
+    "durability": durability_suite,
+    "aws": aws_suite,
+    "nas": nas_suite,
+    "keyring": keyring_suite,
+}
@@ -1,5 +1,18 @@
 from .autocontext import Context
+from .registry import get_context, clear_contexts
 from .common.config import Config
 from .backend import Backend
 from .common.network import Network
-from .common.environment import Environment
\ No newline at end of file
+from .common.environment import Environment
+
+
+def __getattr__(name):
+    # AsyncContext pulls in asyncio, so it is only imported when first used
+    if name == "AsyncContext":
+        from .asynccontext import AsyncContext
+        return AsyncContext
+    # the metrics registry is only loaded when metrics are used
+    if name == "get_metrics":
+        from .common.metrics import get_metrics
+        return get_metrics
+    raise AttributeError(f"module 'multicloud' has no attribute '{name}'")
@@ -0,0 +1,225 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterable, Optional, Tuple, Union
+
+from .autocontext import Context
+from .backend.bulk import BulkResult
+from .backend.object import Object, ObjectInfo
+from .backend.secret import Secret
+from .common.config import Config
+
+
+class AsyncContext:
+    def __init__(self, service="default", config : Optional[Union[Config, dict, str]]=None, credentials: Optional[Secret] = None,
+                 max_in_flight : int = 32, executor : Optional[ThreadPoolExecutor] = None, context : Optional[Context] = None):
+        """An asyncio front end for a multicloud Context
+
+        Every object and secret operation is awaitable.  Backends that provide a native coroutine
+        for an operation (a method named after it with an 'a' prefix, e.g. `aget_bytes`) are awaited
+        directly; everything else runs on a managed thread pool so the event loop never blocks.
+        At most `max_in_flight` operations run against the backend at once.
+
+        Args:
+           service :str: The name of the service to create, see multicloud.Context
+           config :config: The service configuration, see multicloud.Context
+           credentials :Secret: Optional credentials for the backend, see multicloud.Context
+           max_in_flight :int: Maximum number of concurrent operations against the backend
+           executor :ThreadPoolExecutor: Optional executor to use instead of a managed one
+           context :Context: Optional existing context to wrap instead of creating one
+        """
+        self.context = context if context is not None else Context(service, config, credentials)
+        self.max_in_flight = max_in_flight
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._semaphore = None
+
+    def __repr__(self):
+        return f"AsyncContext<{self.context.service}>({self.context.backend})"
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="multicloud-async")
+        return self._executor
+
+    async def run(self, fn, *args, **kwargs):
+        """Runs a blocking call on the executor, counting it against the in-flight limit"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+
+    async def call(self, target, name : str, *args, **kwargs):
+        """Awaits target.a<name>() when the backend provides it, otherwise runs target.<name>() on the executor"""
+        native = getattr(target, f"a{name}", None)
+        if native is not None:
+            if self._semaphore is None:
+                self._semaphore = asyncio.Semaphore(self.max_in_flight)
+            async with self._semaphore:
+                return await native(*args, **kwargs)
+        return await self.run(getattr(target, name), *args, **kwargs)
+
+    def object(self, key : str) -> 'AsyncObject':
+        return AsyncObject(self, self.context.object(key))
+
+    def secret(self, name : str) -> 'AsyncSecret':
+        return AsyncSecret(self, self.context.secret(name))
+
+    async def list(self, prefix : str = "", delimiter : Optional[str] = None, batch_size : int = 1000) -> AsyncIterator[ObjectInfo]:
+        """Streams Backend.list(), fetching batch_size entries per executor call"""
+        listing = iter(self.context.list(prefix, delimiter))
+        def next_batch():
+            batch = []
+            for info in listing:
+                batch.append(info)
+                if len(batch) >= batch_size:
+                    break
+            return batch
+        while True:
+            batch = await self.run(next_batch)
+            if not batch:
+                return
+            for info in batch:
+                yield info
+
+    async def _bulk(self, coroutines) -> BulkResult:
+        keys = list(coroutines.keys())
+        outcomes = await asyncio.gather(*coroutines.values(), return_exceptions=True)
+        result = BulkResult()
+        for key, outcome in zip(keys, outcomes):
+            if isinstance(outcome, Exception):
+                result.errors[key] = outcome
+            else:
+                result.results[key] = outcome
+        return result
+
+    async def get_many(self, keys : Iterable[str]) -> BulkResult:
+        """Reads many objects concurrently, bounded by max_in_flight"""
+        return await self._bulk({ key: self.object(key).get_bytes() for key in keys })
+
+    async def put_many(self, items : Union[dict, Iterable[Tuple[str, bytes]]]) -> BulkResult:
+        """Writes many objects concurrently, bounded by max_in_flight"""
+        if isinstance(items, dict):
+            items = items.items()
+        return await self._bulk({ key: self.object(key).put_bytes(data) for key, data in items })
+
+    async def delete_many(self, keys : Iterable[str]) -> BulkResult:
+        """Deletes many objects, using the backend's own bulk delete"""
+        keys = list(keys)
+        return await self.run(self.context.delete_many, keys, self.max_in_flight)
+
+    async def get_secrets(self, names : Iterable[str]) -> BulkResult:
+        """Reads many secrets, using the backend's own bulk fetch"""
+        names = list(names)
+        return await self.run(self.context.get_secrets, names, self.max_in_flight)
+
+    async def close(self):
+        """Shuts down the managed executor"""
+        if self._owns_executor and self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.get_running_loop().run_in_executor(None, executor.shutdown)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+class AsyncObject:
+    """Awaitable counterpart of multicloud Object, created by AsyncContext.object()"""
+
+    def __init__(self, actx : AsyncContext, obj : Object):
+        self.actx = actx
+        self.object = obj
+        self.key = obj.key
+
+    def __repr__(self):
+        return f"AsyncObject<{self.key}>"
+
+    async def get_bytes(self) -> bytes:
+        return await self.actx.call(self.object, "get_bytes")
+
+    async def put_bytes(self, data : bytes, content_encoding : Optional[str] = None):
+        return await self.actx.call(self.object, "put_bytes", data, content_encoding)
+
+    async def get_text(self) -> str:
+        return (await self.get_bytes()).decode()
+
+    async def put_text(self, value : str):
+        await self.put_bytes(value.encode())
+
+    async def get_range(self, offset : int, length : int) -> bytes:
+        return await self.actx.call(self.object, "get_range", offset, length)
+
+    async def get_ranges(self, ranges) -> list:
+        return await self.actx.call(self.object, "get_ranges", list(ranges))
+
+    async def get_buffer(self) -> memoryview:
+        return await self.actx.call(self.object, "get_buffer")
+
+    async def exists(self) -> bool:
+        return await self.actx.call(self.object, "exists")
+
+    async def delete(self):
+        return await self.actx.call(self.object, "delete")
+
+    async def iter_bytes(self, chunk_size : int = 1024 * 1024) -> AsyncIterator[bytes]:
+        """Streams the object in chunks of up to chunk_size bytes"""
+        stream = await self.actx.run(self.object.get_file, True)
+        try:
+            while True:
+                chunk = await self.actx.run(stream.read, chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+        finally:
+            await self.actx.run(stream.close)
+
+    async def open_writer(self) -> 'AsyncWriter':
+        """Opens a streaming writer over Object.put_file()"""
+        return AsyncWriter(self.actx, await self.actx.run(self.object.put_file, True))
+
+
+class AsyncWriter:
+    """Awaitable wrapper around the stream returned by Object.put_file()
+
+    Use it as an async context manager; leaving the block with an exception is forwarded to the
+    underlying stream so that uploads that support it (e.g. S3 multipart) are aborted.
+    """
+
+    def __init__(self, actx : AsyncContext, stream):
+        self.actx = actx
+        self.stream = stream
+
+    async def write(self, data : bytes) -> int:
+        return await self.actx.run(self.stream.write, data)
+
+    async def close(self):
+        await self.actx.run(self.stream.close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.actx.run(self.stream.__exit__, exc_type, exc, tb)
+
+
+class AsyncSecret:
+    """Awaitable counterpart of multicloud Secret, created by AsyncContext.secret()"""
+
+    def __init__(self, actx : AsyncContext, secret : Secret):
+        self.actx = actx
+        self.secret = secret
+        self.name = secret.name
+
+    def __repr__(self):
+        return f"AsyncSecret<{self.name}>"
+
+    async def get(self) -> dict:
+        return await self.actx.call(self.secret, "get")
+
+    async def set(self, value : dict):
+        return await self.actx.call(self.secret, "set", value)
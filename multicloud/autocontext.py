@@ -1,11 +1,12 @@
-import os
-import yaml
+import threading
 
-from .virtual import create_backend, create_network, create_environment
-from .backend.object import Object
+from .virtual import create_backend, create_network, create_environment, create_secret_cache, create_metrics
+from .backend.object import Object, ObjectInfo
 from .backend.secret import Secret
+from .backend.bulk import BulkResult
+from .backend.secret_cache import CachedSecret
 from .common.config import Config
-from typing import Optional, Union
+from typing import Iterable, Iterator, Optional, Tuple, Union
 
 
 class Context:
@@ -24,6 +25,11 @@ class Context:
                         ...
                     network:
                         cacerts: <optional-root-ssl-certificate-bundle-file>
+                    secret_cache:
+                        ttl: <seconds-to-cache-secret-values>
+                        max_size: <maximum-number-of-cached-secrets>
+                    metrics:
+                        enabled: <record-operation-metrics, see multicloud.common.metrics>
                     backend:
                         type: [local|aws|tiny|nas]
                         basedir: <base-directory-for-local>
@@ -34,12 +40,16 @@ class Context:
         If not specified, environment defaults to the running unix environment variables.
         Network defaults to the certifi certificate bundle.
         Backend type must be specified.  For 'aws' the bucket must be specified.  For 'local' the basedir must be specified.
+
+        The backend is built on first use, by the first object(), secret() or list() call.  Use
+        multicloud.get_context() to share one context per service instead of constructing new ones.
         """
         if config is None:
-            with open(os.path.expanduser("~/.jaws"), "rt") as f:
-                config = Config.from_yaml(self, f.read())
+            config = Config.from_file()
         elif type(config) is dict:
             config = Config(config)
+        elif type(config) is str:
+            config = Config.from_yaml(config)
         assert type(config) is Config, "config must be a multicloud.Config instance"
         config_group = config.get_section(service)
         assert config_group is not None, f"Service '{service}' not found in config"
@@ -47,16 +57,69 @@ class Context:
         self.credentials = credentials
         self.environment = create_environment(self, config_group.get_section("environment"))
         self.network = create_network(self, config_group.get_section("network"))
-        self.backend = create_backend(self, config_group.get_section("backend"))
+        self.secret_cache = create_secret_cache(self, config_group.get_section("secret_cache"))
+        self.metrics = create_metrics(self, config_group.get_section("metrics"))
+        self._backend_config = config_group.get_section("backend")
+        self._backend = None
+        self._backend_lock = threading.Lock()
+
+    @property
+    def backend(self):
+        """The service backend, created on first access"""
+        backend = self._backend
+        if backend is None:
+            with self._backend_lock:
+                if self._backend is None:
+                    self._backend = create_backend(self, self._backend_config)
+                backend = self._backend
+        return backend
 
     def object(self, key:str) -> Object:
         return self.backend.object(key)
 
     def secret(self, name:str) -> Secret:
-        return self.backend.secret(name)
+        secret = self.backend.secret(name)
+        if self.secret_cache is not None:
+            return CachedSecret(secret, self.secret_cache)
+        return secret
+
+    def list(self, prefix:str = "", delimiter:Optional[str] = None) -> Iterator[ObjectInfo]:
+        return self.backend.list(prefix, delimiter)
+
+    def get_many(self, keys:Iterable[str], max_workers:Optional[int] = None) -> BulkResult:
+        return self.backend.get_many(keys, max_workers)
+
+    def put_many(self, items:Union[dict, Iterable[Tuple[str, bytes]]], max_workers:Optional[int] = None) -> BulkResult:
+        return self.backend.put_many(items, max_workers)
+
+    def delete_many(self, keys:Iterable[str], max_workers:Optional[int] = None) -> BulkResult:
+        return self.backend.delete_many(keys, max_workers)
+
+    def get_secrets(self, names:Iterable[str], max_workers:Optional[int] = None) -> BulkResult:
+        """Reads many secrets, serving what it can from the secret cache and fetching the rest in one backend call"""
+        names = list(names)
+        if self.secret_cache is None:
+            return self.backend.get_secrets(names, max_workers)
+        result = BulkResult()
+        handles = { name: CachedSecret(self.backend.secret(name), self.secret_cache) for name in names }
+        missing = {}
+        for name, handle in handles.items():
+            value = self.secret_cache.get(handle.cache_key)
+            if value is None:
+                missing[name] = self.secret_cache.generation(handle.cache_key)
+            else:
+                result.results[name] = value
+        if missing:
+            fetched = self.backend.get_secrets(list(missing), max_workers)
+            for name, value in fetched.results.items():
+                self.secret_cache.put(handles[name].cache_key, value, missing[name])
+            result.results.update(fetched.results)
+            result.errors.update(fetched.errors)
+        return result
 
     def __repr__(self):
-        return f"Context<{self.service}>({self.backend},{self.network},{self.environment})"
+        backend = self._backend if self._backend is not None else "unconnected"
+        return f"Context<{self.service}>({backend},{self.network},{self.environment})"
 
 
 
@@ -1,11 +1,21 @@
 from ..common.runtime import Runtime, detect_runtime
 from .secret import Secret
-from .object import Object
+from .object import Object, ObjectInfo
+from .bulk import BulkResult, run_bulk
+from typing import Iterable, Iterator, Optional, Tuple, Union
+import itertools
+
+_instances = itertools.count()
 
 class Backend:
+    # default number of concurrent operations used by the bulk methods
+    bulk_workers = 16
+
     def __init__(self, ctx, name="BaseBackend"):
         self.name = name
         self.ctx = ctx
+        # identifies the backend for the life of the process, unlike id() which is reused
+        self.instance = next(_instances)
 
     def __repr__(self):
         return f"{self.name}<>"
@@ -16,3 +26,51 @@ class Backend:
     def object(self, key) -> Object:
         raise NotImplementedError("base class")
 
+    def list(self, prefix:str = "", delimiter:Optional[str] = None) -> Iterator[ObjectInfo]:
+        """Lazily lists the objects whose keys start with prefix
+
+        Keys are streamed as they are found, so listings of any size run in constant memory.
+        The order of the results depends on the backend.
+
+        Args:
+            prefix : str : Only keys starting with this prefix are listed
+            delimiter : Optional[str] : When set, keys containing the delimiter after the prefix are
+                rolled up into a single ObjectInfo with is_prefix set, instead of being listed
+        """
+        raise NotImplementedError("base class")
+
+    def get_many(self, keys:Iterable[str], max_workers:Optional[int] = None) -> BulkResult:
+        """Reads many objects concurrently
+
+        Returns:
+            BulkResult : results maps each key to its bytes, errors maps each failed key to its exception
+        """
+        return run_bulk(lambda key, _: self.object(key).get_bytes(),
+                        ((key, None) for key in keys), max_workers or self.bulk_workers)
+
+    def put_many(self, items:Union[dict, Iterable[Tuple[str, bytes]]], max_workers:Optional[int] = None) -> BulkResult:
+        """Writes many objects concurrently
+
+        Args:
+            items : a dict of key -> bytes, or an iterable of (key, bytes) pairs
+        """
+        if isinstance(items, dict):
+            items = items.items()
+        return run_bulk(lambda key, data: self.object(key).put_bytes(data), items, max_workers or self.bulk_workers)
+
+    def get_secrets(self, names:Iterable[str], max_workers:Optional[int] = None) -> BulkResult:
+        """Reads many secrets
+
+        Backends that can fetch several secrets in one round trip override this.  The default
+        reads them concurrently.
+
+        Returns:
+            BulkResult : results maps each name to its value, errors maps each failed name to its exception
+        """
+        return run_bulk(lambda name, _: self.secret(name).get(),
+                        ((name, None) for name in names), max_workers or self.bulk_workers)
+
+    def delete_many(self, keys:Iterable[str], max_workers:Optional[int] = None) -> BulkResult:
+        """Deletes many objects concurrently"""
+        return run_bulk(lambda key, _: self.object(key).delete(),
+                        ((key, None) for key in keys), max_workers or self.bulk_workers)
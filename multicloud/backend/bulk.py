@@ -0,0 +1,53 @@
+from typing import Callable, Iterable, Tuple
+
+
+class BulkResult:
+    """The per-key outcome of a bulk operation
+
+    Attributes:
+        results :dict: key -> value for every key that succeeded (None for puts and deletes)
+        errors :dict: key -> exception for every key that failed
+    """
+    def __init__(self):
+        self.results = {}
+        self.errors = {}
+
+    def __repr__(self):
+        return f"BulkResult<{len(self.results)} ok, {len(self.errors)} failed>"
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def raise_for_errors(self):
+        """Raises the first error, if any key failed"""
+        for key, error in self.errors.items():
+            raise RuntimeError(f"{len(self.errors)} bulk operations failed, first was '{key}'") from error
+
+
+def run_bulk(fn : Callable, items : Iterable[Tuple[str, object]], max_workers : int) -> BulkResult:
+    """Runs fn(key, arg) for every (key, arg) item on a bounded thread pool
+
+    At most 2 * max_workers calls are queued at any time, so the items iterable is consumed
+    lazily.  Exceptions are collected per key rather than raised.
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+    result = BulkResult()
+
+    def collect(done):
+        for future in done:
+            key = pending.pop(future)
+            try:
+                result.results[key] = future.result()
+            except Exception as e:
+                result.errors[key] = e
+
+    pending = {}
+    with ThreadPoolExecutor(max_workers=max(int(max_workers), 1), thread_name_prefix="multicloud-bulk") as executor:
+        for key, arg in items:
+            if len(pending) >= 2 * max_workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending[executor.submit(fn, key, arg)] = key
+        collect(wait(pending).done)
+    return result
@@ -0,0 +1,54 @@
+from typing import Iterable, Iterator, Optional
+from ..backend import Backend
+from ..bulk import BulkResult
+from ..secret import Secret
+from ..object import Object, ObjectInfo
+from .caching_object import CachingObject
+from .caching_options import CachingOptions
+from .disk_cache import DiskCache
+
+
+class CachingBackend(Backend):
+    def __init__(self, ctx, options : CachingOptions, source : Backend):
+        """Wraps another backend with a read-through cache of objects on local disk
+
+        Objects read through the backend are kept in `cachedir`, bounded to `max_bytes` with
+        least recently used eviction, and revalidated against the source's etag once they are
+        older than `revalidate` seconds.  The cache directory can be shared by several processes.
+        Secrets and listings are served by the source backend directly.
+
+        Args:
+            ctx : Context : The context this backend is part of
+            options : CachingOptions : The resolved cache settings
+            source : Backend : The backend being cached
+        """
+        super().__init__(ctx, "CachingBackend")
+        self.options = options
+        self.source = source
+        self.cache = DiskCache(options.cachedir, options.max_bytes)
+
+    def __repr__(self):
+        return f"{self.name}<{self.options.cachedir}>({self.source!r})"
+
+    def secret(self, name) -> Secret:
+        return self.source.secret(name)
+
+    def object(self, key) -> Object:
+        return CachingObject(self.ctx, key, self.source.object(key), self.cache, self.options.revalidate)
+
+    def list(self, prefix:str = "", delimiter:Optional[str] = None) -> Iterator[ObjectInfo]:
+        return self.source.list(prefix, delimiter)
+
+    def get_secrets(self, names:Iterable[str], max_workers:Optional[int] = None) -> BulkResult:
+        return self.source.get_secrets(names, max_workers)
+
+    def delete_many(self, keys:Iterable[str], max_workers:Optional[int] = None) -> BulkResult:
+        """Deletes through the source's own bulk delete, then drops the cache entries"""
+        result = self.source.delete_many(keys, max_workers)
+        for key in list(result.results) + list(result.errors):
+            self.cache.invalidate(key)
+        return result
+
+    def stats(self) -> dict:
+        """Cache hit, miss, revalidation and eviction counts for this process"""
+        return self.cache.stats()
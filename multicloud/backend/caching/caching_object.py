@@ -0,0 +1,218 @@
+import io
+import mmap
+import os
+import time
+from io import IOBase, TextIOWrapper
+from typing import Optional
+from ..object import Object, ObjectInfo, TextWriter, check_range
+from ..local.local_object import pread
+from .disk_cache import DiskCache
+
+
+class CachingObject(Object):
+    def __init__(self, ctx, key:str, source:Object, cache:DiskCache, revalidate:float):
+        """An object read through a local disk cache
+
+        Reads are served from the cache while the entry was validated less than `revalidate`
+        seconds ago.  Older entries are revalidated against the source's etag with one metadata
+        request and only downloaded again when the source has changed.  Writes and deletes go
+        to the source and drop the cache entry.
+
+        Args:
+            ctx : Context : The context this object is part of
+            key : str : The object key
+            source : Object : The object in the wrapped backend
+            cache : DiskCache : The backend's disk cache
+            revalidate : float : Seconds an entry is trusted without asking the source
+        """
+        super().__init__(ctx, key)
+        self.source = source
+        self.cache = cache
+        self.revalidate = float(revalidate)
+
+    def __repr__(self):
+        return f"CachingObject<{self.key}>({self.source!r})"
+
+    @staticmethod
+    def _same_version(meta : dict, info : ObjectInfo) -> bool:
+        if info.etag is not None or meta['etag'] is not None:
+            return info.etag == meta['etag']
+        return info.size is not None and info.mtime is not None and \
+            (info.size, info.mtime) == (meta['size'], meta['mtime'])
+
+    def _fetch(self, info : Optional[ObjectInfo] = None) -> Optional[dict]:
+        """Downloads the source object into the cache
+
+        Returns None when the object is too large to cache or missing, so the caller reads the
+        source directly and gets the source's own not-found error.
+        """
+        if info is None:
+            info = self.source.info()
+        if info is None:
+            self.cache.invalidate(self.key)
+            return None
+        if info.size is not None and info.size > self.cache.max_bytes:
+            return None
+        reader, content_encoding = self.source.get_file_with_encoding()
+        try:
+            return self.cache.store(self.key, reader, info, content_encoding)
+        finally:
+            reader.close()
+
+    def _entry(self) -> Optional[dict]:
+        """Returns a current cache entry for the object, fetching it if needed"""
+        meta = self.cache.lookup(self.key)
+        if meta is None:
+            self.cache.misses += 1
+            return self._fetch()
+        now = time.time()
+        if now - meta['checked'] < self.revalidate:
+            self.cache.hits += 1
+            return self.cache.touch(self.key, meta)
+        info = self.source.info()
+        if info is not None and self._same_version(meta, info):
+            self.cache.revalidations += 1
+            return self.cache.touch(self.key, meta, checked=now)
+        self.cache.misses += 1
+        if info is None:
+            self.cache.invalidate(self.key)
+            return None
+        return self._fetch(info)
+
+    def _open(self):
+        """Opens the cached data file, or returns None when the object bypasses the cache"""
+        opened = self._open_entry()
+        return None if opened is None else opened[0]
+
+    def _open_entry(self):
+        """Opens the cached data file and returns it with its meta data, None when bypassing the cache"""
+        for attempt in (1, 2):
+            meta = self._entry()
+            if meta is None:
+                return None
+            try:
+                return open(self.cache.data_path(self.key, meta), "rb"), meta
+            except FileNotFoundError:
+                # evicted or replaced by another process since the lookup
+                if attempt == 2:
+                    raise
+                self.cache.invalidate(self.key)
+
+    def get_bytes(self):
+        f = self._open()
+        if f is None:
+            return self.source.get_bytes()
+        with f:
+            return f.read()
+
+    def get_file(self, binary:bool = True) -> IOBase:
+        f = self._open()
+        if f is None:
+            return self.source.get_file(binary)
+        return f if binary else TextIOWrapper(f)
+
+    def get_content_encoding(self) -> Optional[str]:
+        meta = self._entry()
+        if meta is None:
+            return self.source.get_content_encoding()
+        return meta.get('encoding')
+
+    def get_file_with_encoding(self):
+        opened = self._open_entry()
+        if opened is None:
+            return self.source.get_file_with_encoding()
+        f, meta = opened
+        return f, meta.get('encoding')
+
+    def get_buffer(self) -> memoryview:
+        """Maps the cached data file read-only, see LocalObject.get_buffer"""
+        f = self._open()
+        if f is None:
+            return self.source.get_buffer()
+        with f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return memoryview(b"")
+            return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def get_range(self, offset:int, length:int) -> bytes:
+        return self.get_ranges([(offset, length)])[0]
+
+    def get_ranges(self, ranges) -> list:
+        ranges = list(ranges)
+        for offset, length in ranges:
+            check_range(offset, length)
+        f = self._open()
+        if f is None:
+            return self.source.get_ranges(ranges)
+        with f:
+            return [ pread(f.fileno(), length, offset) for offset, length in ranges ]
+
+    def put_bytes(self, data : bytes, content_encoding : Optional[str] = None):
+        try:
+            self.source.put_bytes(data, content_encoding)
+        finally:
+            self.cache.invalidate(self.key)
+
+    def put_file(self, binary:bool = True, content_encoding:Optional[str] = None) -> IOBase:
+        self.cache.invalidate(self.key)
+        writer = _InvalidatingWriter(self.source.put_file(binary=True, content_encoding=content_encoding), self.cache, self.key)
+        if binary:
+            return writer
+        return TextWriter(writer)
+
+    def exists(self) -> bool:
+        meta = self.cache.lookup(self.key)
+        if meta is not None and time.time() - meta['checked'] < self.revalidate:
+            return True
+        return self.source.exists()
+
+    def info(self) -> Optional[ObjectInfo]:
+        return self.source.info()
+
+    def delete(self):
+        try:
+            self.source.delete()
+        finally:
+            self.cache.invalidate(self.key)
+
+
+class _InvalidatingWriter(io.RawIOBase):
+    """Passes writes through to the source stream and drops the cache entry once it is closed"""
+
+    def __init__(self, stream, cache : DiskCache, key : str):
+        super().__init__()
+        self.stream = stream
+        self.cache = cache
+        self.key = key
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        return self.stream.write(b)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self.stream.close()
+        finally:
+            self.cache.invalidate(self.key)
+            super().close()
+
+    def abort(self):
+        if self.closed:
+            return
+        try:
+            self.stream.abort()
+        finally:
+            self.cache.invalidate(self.key)
+            super().close()
+
+    def __exit__(self, exc_type, exc, tb):
+        # let the source abort an upload from a block that raised
+        try:
+            self.stream.__exit__(exc_type, exc, tb)
+        finally:
+            self.cache.invalidate(self.key)
+            super().close()
@@ -0,0 +1,17 @@
+import os
+from ...common.config import Config
+from ...common.options import Options
+
+
+class CachingOptions(Options):
+    """Disk cache settings resolved once per backend"""
+    __slots__ = ('cachedir', 'max_bytes', 'revalidate')
+
+    def __init__(self, ctx, opts : Config):
+        self.resolve(ctx, opts, {
+            'cachedir': ('cachedir', os.path.join("~", ".cache", "multicloud", ctx.service)),
+            'max_bytes': ('max_bytes', 1024 * 1024 * 1024),
+            # seconds a cached object is served without checking the source's etag
+            'revalidate': ('revalidate', 60),
+        })
+        self._set('cachedir', os.path.expanduser(self.cachedir))
@@ -0,0 +1,258 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Optional
+from ..object import ObjectInfo
+
+META_SUFFIX = ".meta"
+DATA_SUFFIX = ".data"
+TMP_SUFFIX = ".tmp"
+LOCK_FILE = ".lock"
+# the bytes held by the cache, shared by every process using the directory
+USAGE_FILE = ".usage"
+# eviction trims the cache to this fraction of max_bytes, so it does not run on every store
+EVICT_TARGET = 0.9
+# unreferenced data and temporary files older than this are left over from a crash
+ORPHAN_AGE = 3600
+
+
+class DiskCache:
+    """A size-bounded cache of object contents in a local directory, shareable between processes
+
+    Each key has a small JSON meta file naming the source version (etag, size, mtime) and the
+    data file holding that version.  Data files are written once under a version specific name
+    and published by atomically replacing the meta file, so readers in other processes see
+    either the old or the new entry, never a partial one.  Hits bump the meta file's mtime,
+    which eviction uses as the LRU order; eviction holds an advisory lock on the directory so
+    only one process trims it at a time.
+
+    The bytes held are kept in a usage file that every process updates under the same lock,
+    so the budget covers all of them.  Eviction measures the directory and rewrites it, which
+    also corrects any drift left by a process that crashed between a store and its update.
+    """
+
+    def __init__(self, cachedir : str, max_bytes : int):
+        """
+        Args:
+            cachedir : str : The cache directory, created if missing
+            max_bytes : int : Byte budget for cached data
+        """
+        self.cachedir = cachedir
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._bytes = None
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+        os.makedirs(cachedir, exist_ok=True)
+
+    def __repr__(self):
+        return f"DiskCache<{self.cachedir}>"
+
+    def _base(self, key : str) -> str:
+        digest = hashlib.sha256(key.encode('UTF-8')).hexdigest()
+        return os.path.join(self.cachedir, digest[:2], digest)
+
+    def data_path(self, key : str, meta : dict) -> str:
+        return os.path.join(os.path.dirname(self._base(key)), meta['data'])
+
+    def lookup(self, key : str) -> Optional[dict]:
+        """Returns the meta data of the cached entry for key, or None"""
+        try:
+            with open(self._base(key) + META_SUFFIX, "rt") as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        return meta if meta.get('key') == key else None
+
+    def touch(self, key : str, meta : dict, checked : Optional[float] = None):
+        """Marks an entry as recently used, and as revalidated at `checked` when given"""
+        path = self._base(key) + META_SUFFIX
+        if checked is not None:
+            meta = dict(meta, checked=checked)
+            self._write_meta(path, meta)
+            return meta
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return meta
+
+    def store(self, key : str, reader, info : ObjectInfo, content_encoding : Optional[str] = None) -> dict:
+        """Copies the stream into the cache as the version described by info
+
+        The data is cached as stored, so encoded objects stay compressed in the cache and
+        their encoding is kept in the meta data.
+
+        Returns:
+            :dict: the meta data of the new entry
+        """
+        base = self._base(key)
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        version = hashlib.sha256(info.etag.encode('UTF-8')).hexdigest()[:16] if info.etag else uuid.uuid4().hex[:16]
+        data_name = f"{os.path.basename(base)}.{version}{DATA_SUFFIX}"
+        tmp_path = f"{base}.{uuid.uuid4().hex}{TMP_SUFFIX}"
+        try:
+            with open(tmp_path, "wb") as f:
+                shutil.copyfileobj(reader, f, 1024 * 1024)
+                size = f.tell()
+            os.replace(tmp_path, os.path.join(os.path.dirname(base), data_name))
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        previous = self.lookup(key)
+        meta = { 'key': key, 'etag': info.etag, 'size': size, 'mtime': info.mtime,
+                 'data': data_name, 'encoding': content_encoding, 'checked': time.time() }
+        self._write_meta(base + META_SUFFIX, meta)
+        if previous is not None and previous['data'] != data_name:
+            self._remove(self.data_path(key, previous))
+        self._account(size - (previous['size'] if previous is not None else 0))
+        return meta
+
+    def invalidate(self, key : str):
+        """Drops the cached entry for key, if any"""
+        meta = self.lookup(key)
+        self._remove(self._base(key) + META_SUFFIX)
+        if meta is not None:
+            self._remove(self.data_path(key, meta))
+            self._account(-meta['size'])
+
+    def _write_meta(self, path : str, meta : dict):
+        tmp_path = f"{path}.{uuid.uuid4().hex}{TMP_SUFFIX}"
+        with open(tmp_path, "wt") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _remove(path : str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _account(self, delta : int):
+        """Adds delta to the shared usage total, evicting when the cache is over its budget"""
+        with self._interprocess_lock():
+            total = self._read_usage()
+            # a missing total is measured, which already includes the change being accounted
+            total = self.usage() if total is None else max(total + delta, 0)
+            self._write_usage(total)
+        with self._lock:
+            self._bytes = total
+        if total > self.max_bytes:
+            self.evict()
+
+    def _read_usage(self) -> Optional[int]:
+        try:
+            with open(os.path.join(self.cachedir, USAGE_FILE), "rt") as f:
+                return int(f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_usage(self, total : int):
+        """Records the shared total, the caller holds the directory lock"""
+        with open(os.path.join(self.cachedir, USAGE_FILE), "wt") as f:
+            f.write(str(total))
+
+    def usage(self) -> int:
+        """Bytes held by cached data, measured from the directory"""
+        return sum(size for _, _, size, _ in self._entries())
+
+    def _entries(self):
+        """Yields (meta path, data path, size, last use) for every entry, removing stale files"""
+        now = time.time()
+        referenced = set()
+        data_files = []
+        for subdir in os.scandir(self.cachedir):
+            if not subdir.is_dir(follow_symlinks=False):
+                continue
+            with os.scandir(subdir.path) as files:
+                for entry in files:
+                    if entry.name.endswith(META_SUFFIX):
+                        try:
+                            with open(entry.path, "rt") as f:
+                                meta = json.load(f)
+                            used = entry.stat().st_mtime
+                        except (FileNotFoundError, ValueError):
+                            continue
+                        data_path = os.path.join(subdir.path, meta['data'])
+                        referenced.add(data_path)
+                        yield entry.path, data_path, meta['size'], used
+                    elif entry.name.endswith((DATA_SUFFIX, TMP_SUFFIX)):
+                        data_files.append(entry)
+        for entry in data_files:
+            if entry.path not in referenced:
+                try:
+                    if now - entry.stat().st_mtime > ORPHAN_AGE:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    def evict(self):
+        """Removes least recently used entries until the cache is below its budget"""
+        with self._interprocess_lock():
+            entries = sorted(self._entries(), key=lambda entry: entry[3])
+            total = sum(entry[2] for entry in entries)
+            target = self.max_bytes * EVICT_TARGET
+            for meta_path, data_path, size, _ in entries:
+                if total <= target:
+                    break
+                self._remove(meta_path)
+                self._remove(data_path)
+                total -= size
+                self.evictions += 1
+            self._write_usage(total)
+            with self._lock:
+                self._bytes = total
+
+    def _interprocess_lock(self):
+        return _DirectoryLock(os.path.join(self.cachedir, LOCK_FILE))
+
+    def clear(self):
+        with self._interprocess_lock():
+            for meta_path, data_path, _, _ in list(self._entries()):
+                self._remove(meta_path)
+                self._remove(data_path)
+            self._write_usage(0)
+            with self._lock:
+                self._bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'revalidations': self.revalidations,
+            'evictions': self.evictions,
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+        }
+
+
+class _DirectoryLock:
+    """An exclusive advisory lock on a file, a no-op where fcntl is unavailable"""
+
+    def __init__(self, path : str):
+        self.path = path
+        self.fd = None
+
+    def __enter__(self):
+        try:
+            import fcntl
+        except ImportError:
+            return self
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
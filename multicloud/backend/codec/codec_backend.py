@@ -0,0 +1,51 @@
+from typing import Iterable, Iterator, Optional
+from ..backend import Backend
+from ..bulk import BulkResult
+from ..secret import Secret
+from ..object import Object, ObjectInfo
+from .codec_object import CodecObject
+from .codec_options import CodecOptions
+
+
+class CodecBackend(Backend):
+    def __init__(self, ctx, options : CodecOptions, source : Backend):
+        """Wraps another backend so objects are stored compressed
+
+        Object data is compressed and decompressed as it streams through `put_*` and `get_*`,
+        never holding a whole streamed object in memory.  The codec is recorded with every
+        object (S3 ContentEncoding, or a sidecar file for the local and NAS backends), so a
+        service can change its codec and still read what was written before.  Secrets and
+        listings are served by the source backend directly; listed sizes are encoded sizes.
+
+        Args:
+            ctx : Context : The context this backend is part of
+            options : CodecOptions : The resolved codec settings
+            source : Backend : The backend storing the encoded objects
+        """
+        super().__init__(ctx, "CodecBackend")
+        self.options = options
+        self.source = source
+
+    def __getattr__(self, name):
+        # backend specific calls, like flush() of a write-behind source, reach the source
+        if name == 'source':
+            raise AttributeError(name)
+        return getattr(self.source, name)
+
+    def __repr__(self):
+        return f"{self.name}<{self.options.codec!r}>({self.source!r})"
+
+    def secret(self, name) -> Secret:
+        return self.source.secret(name)
+
+    def object(self, key) -> Object:
+        return CodecObject(self.ctx, key, self.source.object(key), self.options.codec)
+
+    def list(self, prefix:str = "", delimiter:Optional[str] = None) -> Iterator[ObjectInfo]:
+        return self.source.list(prefix, delimiter)
+
+    def get_secrets(self, names:Iterable[str], max_workers:Optional[int] = None) -> BulkResult:
+        return self.source.get_secrets(names, max_workers)
+
+    def delete_many(self, keys:Iterable[str], max_workers:Optional[int] = None) -> BulkResult:
+        return self.source.delete_many(keys, max_workers)
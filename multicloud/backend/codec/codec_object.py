@@ -0,0 +1,131 @@
+from io import IOBase, BufferedReader, TextIOWrapper
+from typing import Optional
+from ..object import Object, ObjectInfo, TextWriter, check_range
+from ...common.codec import Codec, get_codec
+
+
+class CodecObject(Object):
+    def __init__(self, ctx, key:str, source:Object, codec:Optional[Codec]):
+        """An object compressed on write and decompressed on read
+
+        Writes are compressed with the backend's codec as they stream through, and the codec's
+        name is recorded as the object's content encoding.  Reads decode the data with the
+        codec recorded for the object, whatever the backend's codec is now, so objects written
+        with another codec or without one read back correctly.
+
+        Args:
+            ctx : Context : The context this object is part of
+            key : str : The object key
+            source : Object : The object in the wrapped backend, holding the encoded data
+            codec : Codec : The codec new writes use, None to write plain data
+        """
+        super().__init__(ctx, key)
+        self.source = source
+        self.codec = codec
+
+    def __repr__(self):
+        return f"CodecObject<{self.key}>({self.source!r})"
+
+    def _open(self):
+        """Opens the decoded data, returns (stream, codec) with codec None for plain data"""
+        stream, content_encoding = self.source.get_file_with_encoding()
+        try:
+            codec = get_codec(content_encoding)
+        except BaseException:
+            stream.close()
+            raise
+        if codec is None:
+            return stream, None
+        return codec.reader(stream), codec
+
+    def put_bytes(self, data : bytes, content_encoding : Optional[str] = None):
+        """Compresses and stores the object
+
+        Args:
+            data : bytes : The object contents
+            content_encoding : str : Set when data is already encoded, which stores it as is
+        """
+        if content_encoding is not None or self.codec is None:
+            self.source.put_bytes(data, content_encoding)
+            return
+        self.source.put_bytes(self.codec.compress(data), self.codec.name)
+
+    def put_file(self, binary:bool = True, content_encoding:Optional[str] = None) -> IOBase:
+        """Opens a stream that compresses what is written to it into the source's upload stream"""
+        if content_encoding is not None or self.codec is None:
+            writer = self.source.put_file(binary=True, content_encoding=content_encoding)
+        else:
+            writer = self.codec.writer(self.source.put_file(binary=True, content_encoding=self.codec.name))
+        if binary:
+            return writer
+        return TextWriter(writer)
+
+    def get_bytes(self):
+        stream, _ = self._open()
+        with stream:
+            return stream.read()
+
+    def get_file(self, binary:bool = True) -> IOBase:
+        stream, codec = self._open()
+        if codec is not None:
+            stream = BufferedReader(stream)
+        return stream if binary else TextIOWrapper(stream)
+
+    def get_file_with_encoding(self):
+        """Opens the decoded data, which has no content encoding"""
+        return self.get_file(binary=True), None
+
+    def get_buffer(self) -> memoryview:
+        if self.source.get_content_encoding() is None:
+            return self.source.get_buffer()
+        return memoryview(self.get_bytes()).toreadonly()
+
+    def get_range(self, offset:int, length:int) -> bytes:
+        return self.get_ranges([(offset, length)])[0]
+
+    def get_ranges(self, ranges) -> list:
+        """Reads parts of the decoded object
+
+        Plain objects use the source's partial reads.  Compressed data cannot be read from the
+        middle, so encoded objects are decompressed once from the start, in offset order,
+        keeping only the bytes of the range being read.
+        """
+        ranges = list(ranges)
+        for offset, length in ranges:
+            check_range(offset, length)
+        if self.source.get_content_encoding() is None:
+            return self.source.get_ranges(ranges)
+        stream, codec = self._open()
+        with stream:
+            if codec is None:
+                # rewritten as plain data since the encoding was checked
+                data = stream.read()
+                return [ bytes(data[offset:offset+length]) for offset, length in ranges ]
+            results = [None] * len(ranges)
+            buffer = bytearray()
+            base = 0
+            for index in sorted(range(len(ranges)), key=lambda i: ranges[i][0]):
+                offset, length = ranges[index]
+                if offset >= base + len(buffer):
+                    base += len(buffer) + stream.skip(offset - base - len(buffer))
+                    buffer.clear()
+                else:
+                    del buffer[:offset - base]
+                    base = offset
+                while len(buffer) < length:
+                    chunk = stream.read(length - len(buffer))
+                    if not chunk:
+                        break
+                    buffer += chunk
+                results[index] = bytes(buffer[:length])
+            return results
+
+    def exists(self) -> bool:
+        return self.source.exists()
+
+    def info(self) -> Optional[ObjectInfo]:
+        """The source's info, whose size is the stored (encoded) size"""
+        return self.source.info()
+
+    def delete(self):
+        self.source.delete()
@@ -0,0 +1,17 @@
+from ...common.codec import get_codec
+from ...common.config import Config
+from ...common.options import Options
+
+
+class CodecOptions(Options):
+    """Compression settings resolved once per backend"""
+    __slots__ = ('codec', 'codec_level')
+
+    def __init__(self, ctx, opts : Config):
+        self.resolve(ctx, opts, {
+            # Content-Encoding written objects are compressed with: gzip, zstd or identity
+            'codec': ('codec', 'identity'),
+            'codec_level': ('codec_level', None),
+        })
+        # fails on an unknown codec or a missing zstandard package when the backend is created
+        self._set('codec', get_codec(self.codec, self.codec_level))
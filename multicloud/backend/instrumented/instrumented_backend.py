@@ -0,0 +1,89 @@
+import time
+from typing import Iterable, Iterator, Optional, Tuple, Union
+from ..backend import Backend
+from ..bulk import BulkResult
+from ..secret import Secret
+from ..object import Object, ObjectInfo
+from ...common.metrics import Metrics
+from .instrumented_object import InstrumentedObject, InstrumentedSecret
+
+
+class InstrumentedBackend(Backend):
+    def __init__(self, ctx, source : Backend, metrics : Metrics):
+        """Records the count, bytes, errors and latency of every call made to another backend
+
+        Operations are labelled with the source's backend name and the context's service.
+        Wrapping backends (caching, codec, ...) are instrumented at every level, so the time
+        spent in a wrapper and in the backend it wraps are reported separately.
+
+        Args:
+            ctx : Context : The context this backend is part of
+            source : Backend : The backend being measured
+            metrics : Metrics : The registry the operations are recorded in
+        """
+        super().__init__(ctx, source.name)
+        self.source = source
+        self.metrics = metrics
+        self.bulk_workers = source.bulk_workers
+
+    def __getattr__(self, name):
+        # backend specific calls, like stats() or flush(), reach the source unmeasured
+        if name == 'source':
+            raise AttributeError(name)
+        return getattr(self.source, name)
+
+    def __repr__(self):
+        return f"Instrumented<{self.source!r}>"
+
+    def record(self, op : str, key : Optional[str], seconds : float, nbytes : int = 0, error : Optional[BaseException] = None):
+        self.metrics.record(self.name, self.ctx.service, op, key, seconds, nbytes, error)
+
+    def _timed_bulk(self, op : str, call, *args, nbytes = None) -> BulkResult:
+        start = time.perf_counter()
+        try:
+            result = call(*args)
+        except Exception as e:
+            self.record(op, None, time.perf_counter() - start, 0, e)
+            raise
+        error = next(iter(result.errors.values()), None)
+        self.record(op, None, time.perf_counter() - start, 0 if nbytes is None else nbytes(result), error)
+        return result
+
+    def secret(self, name) -> Secret:
+        return InstrumentedSecret(self.ctx, name, self.source.secret(name), self)
+
+    def object(self, key) -> Object:
+        return InstrumentedObject(self.ctx, key, self.source.object(key), self)
+
+    def list(self, prefix:str = "", delimiter:Optional[str] = None) -> Iterator[ObjectInfo]:
+        """Lists the source, recorded once the listing is exhausted or abandoned"""
+        start = time.perf_counter()
+        error = None
+        try:
+            yield from self.source.list(prefix, delimiter)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.record('list', prefix, time.perf_counter() - start, 0, error)
+
+    def get_many(self, keys:Iterable[str], max_workers:Optional[int] = None) -> BulkResult:
+        return self._timed_bulk('get_many', self.source.get_many, keys, max_workers,
+                                nbytes=lambda result: sum(len(data) for data in result.results.values()))
+
+    def put_many(self, items:Union[dict, Iterable[Tuple[str, bytes]]], max_workers:Optional[int] = None) -> BulkResult:
+        counted = [0]
+
+        def count(items):
+            for key, data in (items.items() if isinstance(items, dict) else items):
+                counted[0] += len(data)
+                yield key, data
+
+        return self._timed_bulk('put_many', self.source.put_many, count(items), max_workers,
+                                nbytes=lambda result: counted[0])
+
+    def delete_many(self, keys:Iterable[str], max_workers:Optional[int] = None) -> BulkResult:
+        return self._timed_bulk('delete_many', self.source.delete_many, keys, max_workers)
+
+    def get_secrets(self, names:Iterable[str], max_workers:Optional[int] = None) -> BulkResult:
+        return self._timed_bulk('get_secrets', self.source.get_secrets, names, max_workers)
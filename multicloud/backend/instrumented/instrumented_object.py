@@ -0,0 +1,210 @@
+import io
+import time
+from io import IOBase, BufferedReader, TextIOWrapper
+from typing import Optional
+from ..object import Object, ObjectInfo, TextWriter
+from ..secret import Secret
+
+
+class InstrumentedObject(Object):
+    def __init__(self, ctx, key:str, source:Object, backend):
+        """An object whose operations are recorded in the backend's metrics
+
+        Args:
+            ctx : Context : The context this object is part of
+            key : str : The object key
+            source : Object : The object being measured
+            backend : InstrumentedBackend : The backend holding the metrics and labels
+        """
+        super().__init__(ctx, key)
+        self.source = source
+        self.backend = backend
+
+    def __repr__(self):
+        return f"InstrumentedObject<{self.key}>({self.source!r})"
+
+    def _timed(self, op : str, call, *args, nbytes = None):
+        start = time.perf_counter()
+        try:
+            result = call(*args)
+        except Exception as e:
+            self.backend.record(op, self.key, time.perf_counter() - start, 0, e)
+            raise
+        size = 0 if nbytes is None else nbytes(result)
+        self.backend.record(op, self.key, time.perf_counter() - start, size)
+        return result
+
+    def put_bytes(self, data : bytes, content_encoding : Optional[str] = None):
+        start = time.perf_counter()
+        try:
+            self.source.put_bytes(data, content_encoding)
+        except Exception as e:
+            self.backend.record('put_bytes', self.key, time.perf_counter() - start, 0, e)
+            raise
+        self.backend.record('put_bytes', self.key, time.perf_counter() - start, len(data))
+
+    def put_file(self, binary:bool = True, content_encoding:Optional[str] = None) -> IOBase:
+        start = time.perf_counter()
+        stream = self._timed('put_file.open', self.source.put_file, True, content_encoding)
+        writer = _CountingWriter(stream, self, 'put_file', start)
+        if binary:
+            return writer
+        return TextWriter(writer)
+
+    def get_bytes(self):
+        return self._timed('get_bytes', self.source.get_bytes, nbytes=len)
+
+    def get_file(self, binary:bool = True) -> IOBase:
+        start = time.perf_counter()
+        stream = self._timed('get_file.open', self.source.get_file, True)
+        reader = _CountingReader(stream, self, 'get_file', start)
+        return reader if binary else TextIOWrapper(BufferedReader(reader))
+
+    def get_content_encoding(self) -> Optional[str]:
+        return self._timed('get_content_encoding', self.source.get_content_encoding)
+
+    def get_file_with_encoding(self):
+        start = time.perf_counter()
+        stream, content_encoding = self._timed('get_file.open', self.source.get_file_with_encoding)
+        return _CountingReader(stream, self, 'get_file', start), content_encoding
+
+    def get_buffer(self) -> memoryview:
+        return self._timed('get_buffer', self.source.get_buffer, nbytes=lambda view: view.nbytes)
+
+    def get_range(self, offset:int, length:int) -> bytes:
+        return self._timed('get_range', self.source.get_range, offset, length, nbytes=len)
+
+    def get_ranges(self, ranges) -> list:
+        return self._timed('get_ranges', self.source.get_ranges, list(ranges),
+                           nbytes=lambda parts: sum(len(part) for part in parts))
+
+    def exists(self) -> bool:
+        return self._timed('exists', self.source.exists)
+
+    def info(self) -> Optional[ObjectInfo]:
+        return self._timed('info', self.source.info)
+
+    def delete(self):
+        self._timed('delete', self.source.delete)
+
+
+class InstrumentedSecret(Secret):
+    """A secret whose get and set calls are recorded in the backend's metrics"""
+
+    def __init__(self, ctx, name : str, source : Secret, backend):
+        super().__init__(ctx, name)
+        self.source = source
+        self.backend = backend
+
+    def __repr__(self):
+        return f"InstrumentedSecret<{self.source!r}>"
+
+    def _timed(self, op : str, call, *args):
+        start = time.perf_counter()
+        try:
+            result = call(*args)
+        except Exception as e:
+            self.backend.record(op, self.name, time.perf_counter() - start, 0, e)
+            raise
+        self.backend.record(op, self.name, time.perf_counter() - start)
+        return result
+
+    def get(self) -> dict:
+        return self._timed('secret.get', self.source.get)
+
+    def set(self, value : dict):
+        self._timed('secret.set', self.source.set, value)
+
+
+class _CountingReader(io.RawIOBase):
+    """Counts the bytes read from a stream and records the read once it is closed"""
+
+    def __init__(self, stream, obj : InstrumentedObject, op : str, start : float):
+        super().__init__()
+        self.stream = stream
+        self.obj = obj
+        self.op = op
+        self.start = start
+        self.nbytes = 0
+        self.error = None
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size : int = -1) -> bytes:
+        try:
+            data = self.stream.read(size)
+        except Exception as e:
+            self.error = e
+            raise
+        self.nbytes += len(data)
+        return data
+
+    def readall(self) -> bytes:
+        return self.read(-1)
+
+    def readinto(self, b) -> int:
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self.stream.close()
+        finally:
+            super().close()
+            self.obj.backend.record(self.op, self.obj.key, time.perf_counter() - self.start, self.nbytes, self.error)
+
+
+class _CountingWriter(io.RawIOBase):
+    """Counts the bytes written to a stream and records the write once it is closed or aborted"""
+
+    def __init__(self, stream, obj : InstrumentedObject, op : str, start : float):
+        super().__init__()
+        self.stream = stream
+        self.obj = obj
+        self.op = op
+        self.start = start
+        self.nbytes = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        view = memoryview(b)
+        written = self.stream.write(view)
+        self.nbytes += view.nbytes if written is None else written
+        return written
+
+    def close(self):
+        self._finish(None, None, None)
+
+    def abort(self):
+        """Aborts the source stream, the write is recorded as failed"""
+        if self.closed:
+            return
+        try:
+            self.stream.abort()
+        finally:
+            super().close()
+            self.obj.backend.record(self.op, self.obj.key, time.perf_counter() - self.start, self.nbytes,
+                                    RuntimeError("write aborted"))
+
+    def _finish(self, exc_type, exc, tb):
+        if self.closed:
+            return
+        error = exc
+        try:
+            # let the source commit, or abort an upload from a block that raised
+            self.stream.__exit__(exc_type, exc, tb)
+        except Exception as e:
+            error = error or e
+            raise
+        finally:
+            super().close()
+            self.obj.backend.record(self.op, self.obj.key, time.perf_counter() - self.start, self.nbytes, error)
+
+    def __exit__(self, exc_type, exc, tb):
+        self._finish(exc_type, exc, tb)
@@ -1,22 +1,67 @@
 from ..backend import Backend
-from .local_secret import LocalSecret
-from .local_object import LocalObject
+from .local_commit import DURABILITY_MODES, DURABILITY_NONE, DURABILITY_FSYNC, DURABILITY_GROUP, PendingFile, GroupCommit, \
+    close_files, publish, fsync_directories, fsync_directory
+from .local_layout import Layout, open_layout, scan
+from .local_object import LocalObject, OBJECT_SUFFIX
+from .local_options import LocalOptions
 from ..secret import Secret
-from ..object import Object
+from ..object import Object, ObjectInfo
 from ...errors import ConfigurationError
 from ...autocontext import Context
-from typing import Optional
+from typing import Iterator, List, Optional
+import os
+import threading
 
 class LocalBackend(Backend):
-    def __init__(self, ctx : Context, basedir: Optional[str] = None):
+    def __init__(self, ctx : Context, options : LocalOptions):
         """A local filesystem based backend
-        
+
+        Objects are written to a temporary file next to their destination and renamed over it,
+        so readers never see a partial object.  The durability setting decides what a completed
+        write survives:
+
+          - none: nothing is fsynced, a crash may lose recent writes (the default)
+          - fsync: every write fsyncs its data and directory before returning
+          - group: concurrent writes share their directory fsyncs, see GroupCommit
+
+        The plain layout stores each object at `basedir/<key>.object`.  The sharded layout
+        spreads objects over hash-named directories so no directory grows past a few hundred
+        entries at millions of keys, and keeps the keys in a SQLite index (see LocalIndex) for
+        listing.  The layout is recorded in basedir and converted with mc-local-migrate.
+
         Args:
             ctx : Context : The context this backend is part of
-            basedir : str : The base directory to store objects in
+            options : LocalOptions : The resolved settings, basedir is where objects are stored
         """
         super().__init__(ctx, "LocalBackend")
-        self.basedir = basedir
+        self.options = options
+        self.basedir = options.basedir
+        self.durability = options.durability
+        if self.durability not in DURABILITY_MODES:
+            raise ConfigurationError(f"local durability must be one of {', '.join(DURABILITY_MODES)}, not '{self.durability}'")
+        self._lock = threading.Lock()
+        self._directories = set()
+        self.layout = Layout()
+        self.index = None
+        if self.basedir is not None:
+            self.layout = open_layout(self.basedir, self.requested_layout(options))
+            if self.layout.index:
+                from .local_index import LocalIndex, INDEX_FILE
+                # group commit fsyncs the index once per round instead of on every update
+                self.index = LocalIndex(os.path.join(self.basedir, INDEX_FILE), sync=self.durability == DURABILITY_FSYNC)
+        self._group = GroupCommit(float(options.group_commit_delay), self.index and self.index.flush) \
+            if self.durability == DURABILITY_GROUP else None
+
+    @staticmethod
+    def requested_layout(options : LocalOptions) -> Optional[Layout]:
+        if options.layout is None and options.index is None:
+            return None
+        name = options.layout or Layout().name
+        try:
+            layout = Layout(name, options.shard_depth, options.index if options.index is not None else name != Layout().name)
+        except ValueError as e:
+            raise ConfigurationError(str(e))
+        return layout
 
     def secret(self, name) -> Secret:
         """Returns an abstraction to access a secret stored in the local keyring
@@ -24,6 +69,7 @@ class LocalBackend(Backend):
         Args:
             name : str : The name of the secret to access
         """
+        from .local_secret import LocalSecret
         return LocalSecret(self.ctx, name)
 
     def object(self, key) -> Object:
@@ -34,7 +80,126 @@ class LocalBackend(Backend):
         """
         if self.basedir is None:
             raise ConfigurationError("object service requires the 'basedir' configuration setting")
-        return LocalObject(self.ctx, key, self.basedir)
+        return LocalObject(self.ctx, key, self)
+
+    def ensure_directory(self, path : str):
+        """Creates the directory path and its parents, once per backend
+
+        Directories already seen by this backend are skipped without a syscall.  Writers that
+        find a cached directory missing, because it was removed behind the backend's back, call
+        `forget_directory` and retry.
+        """
+        if path in self._directories:
+            return
+        os.makedirs(path, exist_ok=True)
+        if self.durability != DURABILITY_NONE:
+            # make the entries of the directories that may be new durable, up to basedir
+            root = os.path.normpath(self.basedir)
+            parent = os.path.normpath(path)
+            while parent != root and parent.startswith(root):
+                parent = os.path.dirname(parent)
+                fsync_directory(parent)
+        with self._lock:
+            self._directories.add(path)
+
+    def forget_directory(self, path : str):
+        with self._lock:
+            self._directories.discard(path)
+
+    def commit(self, files : List[PendingFile], key : Optional[str] = None, remove = ()):
+        """Renames written temporary files over their destinations as the durability setting requires
 
+        Args:
+            files : list : (descriptor, temporary path, destination path) of each file, closed by this call
+            key : str : The key of the object written first in files, recorded in the index
+            remove : tuple : Paths removed once the files are in place
+        """
+        sync = self.durability != DURABILITY_NONE
+        close_files(files, sync)
+        publish(files)
+        for path in remove:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        if self.index is not None and key is not None:
+            # before the directory fsyncs, so that group commit makes the row durable with them
+            self.index.refresh(key, files[0][2])
+        if sync:
+            directories = { os.path.dirname(path) for _, _, path in files }
+            if self._group is not None:
+                self._group.commit(directories)
+            else:
+                error = fsync_directories([directories])[0]
+                if error is not None:
+                    raise error
+
+    def forget(self, key : str, path : str):
+        """Removes a deleted key from the index, unless a concurrent write has put it back"""
+        if self.index is not None:
+            self.index.refresh(key, path)
+
+    def list(self, prefix:str = "", delimiter:Optional[str] = None) -> Iterator[ObjectInfo]:
+        """Lists objects from the index, or by scanning the directory tree under basedir
+
+        With an index the keys are read from it in key order.  Otherwise directories are scanned
+        one at a time with os.scandir; in the plain layout only the directories that can contain
+        matching keys are visited, the sharded layout scans every shard.  The etag of a local
+        object is derived from its modification time and size.
+
+        Args:
+            prefix : str : Only keys starting with this prefix are listed
+            delimiter : Optional[str] : Only '/' is supported, which lists one directory level
+        """
+        if self.basedir is None:
+            raise ConfigurationError("object service requires the 'basedir' configuration setting")
+        if delimiter not in (None, "/"):
+            raise ValueError(f"LocalBackend only supports the '/' delimiter, not '{delimiter}'")
+        if self.index is not None:
+            yield from self.index.list(prefix, delimiter)
+            return
+        if self.layout.sharded:
+            yield from self.list_shards(prefix, delimiter)
+            return
+        start = prefix[:prefix.rfind("/")+1]
+        pending = [start]
+        while pending:
+            keydir = pending.pop()
+            try:
+                entries = os.scandir(os.path.join(self.basedir, keydir))
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdir = f"{keydir}{entry.name}/"
+                        if subdir.startswith(prefix):
+                            if delimiter:
+                                yield ObjectInfo(subdir, is_prefix=True)
+                            else:
+                                pending.append(subdir)
+                    elif entry.name.endswith(OBJECT_SUFFIX):
+                        key = f"{keydir}{entry.name[:-len(OBJECT_SUFFIX)]}"
+                        if key.startswith(prefix):
+                            st = entry.stat()
+                            yield ObjectInfo(key, st.st_size, st.st_mtime, f"{st.st_mtime_ns:x}-{st.st_size:x}")
 
-    
\ No newline at end of file
+    def list_shards(self, prefix : str, delimiter : Optional[str]) -> Iterator[ObjectInfo]:
+        prefixes = set()
+        for relpath in scan(self.basedir, OBJECT_SUFFIX):
+            key = self.layout.key(relpath)
+            if key is None or not key.startswith(prefix):
+                continue
+            if delimiter:
+                cut = key.find(delimiter, len(prefix))
+                if cut >= 0:
+                    common = key[:cut+len(delimiter)]
+                    if common not in prefixes:
+                        prefixes.add(common)
+                        yield ObjectInfo(common, is_prefix=True)
+                    continue
+            try:
+                st = os.stat(os.path.join(self.basedir, f"{relpath}{OBJECT_SUFFIX}"))
+            except FileNotFoundError:
+                continue
+            yield ObjectInfo(key, st.st_size, st.st_mtime, f"{st.st_mtime_ns:x}-{st.st_size:x}")
@@ -0,0 +1,188 @@
+import itertools
+import os
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+TMP_SUFFIX = ".tmp"
+DURABILITY_NONE = "none"
+DURABILITY_FSYNC = "fsync"
+DURABILITY_GROUP = "group"
+DURABILITY_MODES = (DURABILITY_NONE, DURABILITY_FSYNC, DURABILITY_GROUP)
+
+# a written temporary file: (open descriptor, temporary path, destination path)
+PendingFile = Tuple[int, str, str]
+
+# distinguishes the temporary files of concurrent writers in one process
+_tmp_counter = itertools.count()
+_tmp_flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0) | getattr(os, 'O_CLOEXEC', 0)
+_datasync = getattr(os, 'fdatasync', os.fsync)
+
+
+def open_temporary(path : str) -> Tuple[int, str]:
+    """Creates a new temporary file next to path, returns (descriptor, temporary path)"""
+    tmp_path = f"{path}.{os.getpid()}-{next(_tmp_counter)}{TMP_SUFFIX}"
+    return os.open(tmp_path, _tmp_flags, 0o666), tmp_path
+
+
+def write_all(fd : int, data) -> int:
+    """Writes all of data to fd, looping over short writes"""
+    view = memoryview(data).cast('B')
+    total = view.nbytes
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+    return total
+
+
+def discard(files : List[PendingFile]):
+    """Closes and removes the temporary files of a write that will not be committed"""
+    for fd, tmp_path, _ in files:
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+def fsync_directory(path : str):
+    """Makes the entries of a directory durable, a no-op where directories cannot be opened"""
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def close_files(files : List[PendingFile], sync : bool):
+    """Closes written temporary files, fsyncing their data first when sync is set
+
+    On failure the temporary files are removed.
+    """
+    try:
+        if sync:
+            for fd, _, _ in files:
+                _datasync(fd)
+    except BaseException:
+        discard(files)
+        raise
+    for fd, _, _ in files:
+        os.close(fd)
+
+
+def publish(files : List[PendingFile]):
+    """Renames closed temporary files over their destinations, in order
+
+    Readers see either the previous contents of a destination or the new ones, never a
+    partial file.  On failure the temporary files left are removed and the destinations
+    that were not yet renamed keep their previous contents.
+    """
+    try:
+        for _, tmp_path, path in files:
+            os.replace(tmp_path, path)
+    except BaseException:
+        for _, tmp_path, _ in files:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+        raise
+
+
+def fsync_directories(batch : List[set]) -> list:
+    """fsyncs the directories of several writes, each distinct directory once
+
+    Returns the exception of each write, None for the writes whose directories are durable.
+    """
+    errors = [ None ] * len(batch)
+    writes = {}
+    for i, directories in enumerate(batch):
+        for directory in directories:
+            writes.setdefault(directory, []).append(i)
+    for directory, indexes in writes.items():
+        try:
+            fsync_directory(directory)
+        except Exception as e:
+            for i in indexes:
+                errors[i] = errors[i] or e
+    return errors
+
+
+class _Commit:
+    __slots__ = ('directories', 'done', 'error')
+
+    def __init__(self, directories : set):
+        self.directories = directories
+        self.done = False
+        self.error = None
+
+
+class GroupCommit:
+    """Shares the directory fsyncs of concurrent writers
+
+    Each writer fsyncs its own data, which the filesystem journal already coalesces across
+    threads, renames it into place and then waits here for its directories to be fsynced.
+    A writer that finds no commit in progress becomes the leader: it waits `delay` seconds
+    for other writers to arrive and fsyncs each directory of every queued writer once.
+    Writers arriving meanwhile wait and are committed by the next leader, so under load one
+    round of directory fsyncs covers many writes while a lone writer pays no more than a
+    per-write fsync.
+    """
+
+    def __init__(self, delay : float = 0.0, flush : Optional[Callable[[], None]] = None):
+        """
+        Args:
+            delay : float : Seconds a leader waits for more writers before committing
+            flush : Callable : Also called once per round, to make what the writers updated before
+              joining durable (the local index)
+        """
+        self.delay = delay
+        self.flush = flush
+        self._cond = threading.Condition()
+        self._pending = []
+        self._leading = False
+
+    def commit(self, directories : set):
+        """Makes the entries of directories durable, returns once they are"""
+        commit = _Commit(directories)
+        with self._cond:
+            self._pending.append(commit)
+            while self._leading and not commit.done:
+                self._cond.wait()
+            if not commit.done:
+                self._leading = True
+        if not commit.done:
+            self._lead()
+        if commit.error is not None:
+            raise commit.error
+
+    def _lead(self):
+        batch = []
+        try:
+            if self.delay > 0:
+                time.sleep(self.delay)
+            with self._cond:
+                batch, self._pending = self._pending, []
+            errors = fsync_directories([ commit.directories for commit in batch ])
+            if self.flush is not None:
+                try:
+                    self.flush()
+                except Exception as e:
+                    errors = [ error or e for error in errors ]
+            for commit, error in zip(batch, errors):
+                commit.error = error
+        except BaseException as e:
+            for commit in batch:
+                commit.error = commit.error or e
+            raise
+        finally:
+            with self._cond:
+                for commit in batch:
+                    commit.done = True
+                self._leading = False
+                self._cond.notify_all()
@@ -0,0 +1,140 @@
+import os
+import sqlite3
+import threading
+from typing import Iterable, Iterator, Optional, Tuple
+from ..object import ObjectInfo
+
+INDEX_FILE = ".index.sqlite"
+# rows fetched per query while listing, the lock is released between pages
+PAGE_SIZE = 1000
+
+
+class LocalIndex:
+    """A SQLite table of the keys stored under a local basedir, with their size and mtime
+
+    The index answers existence checks and prefix listings with B-tree lookups instead of
+    directory scans.  Writers refresh a key's row from the file after renaming it into place,
+    so a crash between the two leaves the index missing the latest writes;
+    `mc-local-migrate --reindex` rebuilds it from the files.  Several processes may share an
+    index, SQLite serializes their writes.
+
+    Without sync, updates are not fsynced (synchronous=NORMAL, the WAL is only fsynced by
+    checkpoints) and `flush()` makes them durable, which group commit does once per round.
+    """
+
+    def __init__(self, path : str, sync : bool = False):
+        """
+        Args:
+            path : str : The SQLite database file, created if missing
+            sync : bool : fsync every index update (synchronous=FULL)
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(f"PRAGMA synchronous={'FULL' if sync else 'NORMAL'}")
+        self._db.execute("CREATE TABLE IF NOT EXISTS objects (key TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER) WITHOUT ROWID")
+
+    def __repr__(self):
+        return f"LocalIndex<{self.path}>"
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def refresh(self, key : str, path : str):
+        """Sets the row of key from the file at path, or removes it when there is no file
+
+        The file is stat'ed inside the write transaction.  Every write refreshes its key after
+        renaming its file into place and the transactions are serialized, so the last refresh
+        of a key sees the last rename, whatever order concurrent writers get here in.
+        """
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    self._db.execute("DELETE FROM objects WHERE key = ?", (key,))
+                else:
+                    self._db.execute("INSERT OR REPLACE INTO objects VALUES (?, ?, ?)", (key, st.st_size, st.st_mtime_ns))
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def flush(self):
+        """fsyncs the updates committed so far, which synchronous=NORMAL leaves in the WAL"""
+        try:
+            fd = os.open(f"{self.path}-wal", os.O_RDONLY)
+        except FileNotFoundError:
+            return
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def put_many(self, entries : Iterable[Tuple[str, int, int]]):
+        """Adds (key, size, mtime_ns) entries in one transaction"""
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany("INSERT OR REPLACE INTO objects VALUES (?, ?, ?)", entries)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM objects")
+
+    def exists(self, key : str) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM objects WHERE key = ?", (key,)).fetchone() is not None
+
+    def info(self, key : str) -> Optional[ObjectInfo]:
+        with self._lock:
+            row = self._db.execute("SELECT key, size, mtime_ns FROM objects WHERE key = ?", (key,)).fetchone()
+        return None if row is None else _info(row)
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT count(*) FROM objects").fetchone()[0]
+
+    def list(self, prefix : str = "", delimiter : Optional[str] = None) -> Iterator[ObjectInfo]:
+        """Lists the indexed keys starting with prefix in key order
+
+        With a delimiter, the keys below each common prefix are skipped over with a single
+        lookup rather than read.
+        """
+        start = prefix
+        inclusive = True
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    f"SELECT key, size, mtime_ns FROM objects WHERE key {'>=' if inclusive else '>'} ? ORDER BY key LIMIT ?",
+                    (start, PAGE_SIZE)).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                key = row[0]
+                if not key.startswith(prefix):
+                    return
+                if delimiter:
+                    cut = key.find(delimiter, len(prefix))
+                    if cut >= 0:
+                        common = key[:cut+len(delimiter)]
+                        yield ObjectInfo(common, is_prefix=True)
+                        # continue after every key below the common prefix
+                        start = common[:-1] + chr(ord(common[-1]) + 1)
+                        inclusive = True
+                        break
+                yield _info(row)
+                start = key
+                inclusive = False
+
+
+def _info(row) -> ObjectInfo:
+    key, size, mtime_ns = row
+    return ObjectInfo(key, size, mtime_ns / 1e9, f"{mtime_ns:x}-{size:x}")
@@ -0,0 +1,257 @@
+import hashlib
+import json
+import os
+from typing import Callable, Iterator, Optional
+from urllib.parse import quote, unquote
+from .local_commit import TMP_SUFFIX, fsync_directory
+from ...errors import ConfigurationError
+
+LAYOUT_FILE = ".layout.json"
+LAYOUT_PLAIN = "plain"
+LAYOUT_SHARDED = "sharded"
+LAYOUTS = (LAYOUT_PLAIN, LAYOUT_SHARDED)
+# room left in a file name for the object, encoding and temporary suffixes
+MAX_NAME = 200
+
+
+class Layout:
+    """Maps keys to file paths relative to basedir, without the object suffix
+
+    Args:
+      name :str: plain or sharded
+      shard_depth :int: directory levels of a sharded layout, each fanning out to 256
+      index :bool: whether the keys are also recorded in a LocalIndex
+    """
+
+    def __init__(self, name : str = LAYOUT_PLAIN, shard_depth : int = 2, index : bool = False):
+        if name not in LAYOUTS:
+            raise ValueError(f"local layout must be one of {', '.join(LAYOUTS)}, not '{name}'")
+        self.name = name
+        self.sharded = name == LAYOUT_SHARDED
+        self.shard_depth = int(shard_depth) if self.sharded else 0
+        if self.sharded and not 1 <= self.shard_depth <= 8:
+            raise ValueError(f"local shard_depth must be between 1 and 8, not {self.shard_depth}")
+        self.index = bool(index)
+
+    def __repr__(self):
+        shards = f", depth {self.shard_depth}" if self.sharded else ""
+        return f"Layout<{self.name}{shards}{', indexed' if self.index else ''}>"
+
+    def __eq__(self, other):
+        return isinstance(other, Layout) and self.to_dict() == other.to_dict()
+
+    def to_dict(self) -> dict:
+        return { 'layout': self.name, 'shard_depth': self.shard_depth, 'index': self.index }
+
+    @classmethod
+    def from_dict(cls, value : dict) -> 'Layout':
+        return cls(value.get('layout', LAYOUT_PLAIN), value.get('shard_depth', 2), value.get('index', False))
+
+    def shards(self, key : str) -> str:
+        digest = hashlib.blake2b(key.encode('UTF-8'), digest_size=self.shard_depth).hexdigest()
+        if self.shard_depth == 2:
+            return f"{digest[:2]}/{digest[2:]}"
+        return "/".join([ digest[i:i+2] for i in range(0, len(digest), 2) ])
+
+    def relpath(self, key : str) -> str:
+        """The path of key relative to basedir
+
+        A sharded layout keeps each object in the directory named by its key's hash, under
+        a file name that is the key with '/' and other unsafe characters percent-escaped.
+        """
+        if not self.sharded:
+            return key
+        name = quote(key, safe="")
+        if len(name) > MAX_NAME:
+            raise ValueError(f"Key is too long for the sharded local layout: '{key[:64]}...'")
+        return f"{self.shards(key)}/{name}"
+
+    def key(self, relpath : str) -> Optional[str]:
+        """The key stored at relpath, None when the path is not one this layout would use"""
+        if not self.sharded:
+            return relpath
+        parts = relpath.split("/")
+        if len(parts) != self.shard_depth + 1:
+            return None
+        key = unquote(parts[-1])
+        return key if "/".join(parts[:-1]) == self.shards(key) else None
+
+
+def read_layout(basedir : str) -> Optional[dict]:
+    """Returns the contents of the layout marker of basedir, None when there is none"""
+    try:
+        with open(os.path.join(basedir, LAYOUT_FILE), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_layout(basedir : str, marker : Optional[dict]):
+    """Atomically replaces the layout marker of basedir, or removes it when marker is None"""
+    path = os.path.join(basedir, LAYOUT_FILE)
+    if marker is None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    else:
+        tmp_path = f"{path}.{os.getpid()}{TMP_SUFFIX}"
+        with open(tmp_path, "w") as f:
+            json.dump(marker, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    fsync_directory(basedir)
+
+
+def open_layout(basedir : str, requested : Optional[Layout]) -> Layout:
+    """Returns the layout of basedir, recording the requested one in a new or empty basedir
+
+    Args:
+        basedir : str : The root of the object tree
+        requested : Layout : The configured layout, None to use whatever basedir has
+
+    Raises:
+        ConfigurationError : when basedir is being migrated, or holds objects in another layout
+    """
+    marker = read_layout(basedir)
+    if marker is not None and marker.get('migrating'):
+        raise ConfigurationError(f"{basedir} is being migrated to another layout, finish it with mc-local-migrate")
+    current = Layout() if marker is None else Layout.from_dict(marker)
+    if requested is None or requested == current:
+        return current
+    if marker is None and not _has_entries(basedir):
+        os.makedirs(basedir, exist_ok=True)
+        write_layout(basedir, requested.to_dict())
+        return requested
+    raise ConfigurationError(f"{basedir} holds objects in {current!r}, not the configured {requested!r}; "
+                             f"convert it with mc-local-migrate")
+
+
+def _has_entries(basedir : str) -> bool:
+    try:
+        with os.scandir(basedir) as entries:
+            return any(True for _ in entries)
+    except FileNotFoundError:
+        return False
+
+
+def scan(basedir : str, object_suffix : str, start : str = "") -> Iterator[str]:
+    """Yields the path relative to basedir, without the suffix, of every object file under start"""
+    pending = [start]
+    while pending:
+        reldir = pending.pop()
+        try:
+            entries = os.scandir(os.path.join(basedir, reldir))
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(f"{reldir}{entry.name}/")
+                elif entry.name.endswith(object_suffix):
+                    yield f"{reldir}{entry.name[:-len(object_suffix)]}"
+
+
+def migrate(basedir : str, target : Layout, object_suffix : str, sidecar_suffixes = (), dry_run : bool = False,
+            progress : Optional[Callable[[str, str], None]] = None) -> dict:
+    """Moves the objects of basedir into the target layout and rebuilds its index
+
+    Every key is checked against the target layout before anything is changed.  The marker
+    is then switched to the target, flagged as migrating so backends refuse to open the tree,
+    and the flag is cleared once every object has moved.  An interrupted migration is finished
+    by running it again.  Nothing else may write to basedir meanwhile.
+
+    Args:
+        basedir : str : The root of the object tree
+        target : Layout : The layout to convert to; the same layout only rebuilds the index
+        object_suffix : str : The suffix of object files
+        sidecar_suffixes : tuple : Suffixes of files kept next to an object, moved along with it
+        dry_run : bool : Only count what would be moved
+        progress : Callable : Called with (relative path, key) for every object moved
+
+    Returns:
+        dict : counts of the objects 'moved', left in 'place' and 'skipped' as not belonging to either layout
+
+    Raises:
+        ValueError : when keys are too long for the target layout, basedir is left unchanged
+    """
+    marker = read_layout(basedir) or {}
+    source = Layout.from_dict(marker.get('migrating') or marker)
+    counts = { 'moved': 0, 'place': 0, 'skipped': 0 }
+    # plan every move before touching the tree, so keys the target cannot hold stop the
+    # migration while basedir is still in its source layout
+    moves = []
+    placed = []
+    invalid = []
+    # only a sharded source has paths that tell its objects apart from the target's
+    sharded_source = source.sharded and (source.shard_depth != target.shard_depth or not target.sharded)
+    for relpath in scan(basedir, object_suffix):
+        key = target.key(relpath)
+        if key is not None and not (sharded_source and source.key(relpath) is not None):
+            placed.append((relpath, key))
+            continue
+        key = source.key(relpath)
+        if key is None:
+            counts['skipped'] += 1
+            continue
+        try:
+            moves.append((relpath, key, target.relpath(key)))
+        except ValueError:
+            invalid.append(key)
+    if invalid:
+        raise ValueError(f"{len(invalid)} keys are too long for {target!r}, the first is '{invalid[0][:64]}...'")
+    counts['place'] = len(placed)
+    counts['moved'] = len(moves)
+    if dry_run:
+        if progress is not None:
+            for relpath, key, _ in moves:
+                progress(relpath, key)
+        return counts
+    write_layout(basedir, dict(target.to_dict(), migrating=source.to_dict()))
+    created = set()
+    for relpath, key, relpath_to in moves:
+        if progress is not None:
+            progress(relpath, key)
+        src = os.path.join(basedir, relpath)
+        dst = os.path.join(basedir, relpath_to)
+        if os.path.dirname(dst) not in created:
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            created.add(os.path.dirname(dst))
+        for suffix in sidecar_suffixes:
+            try:
+                os.replace(f"{src}{object_suffix}{suffix}", f"{dst}{object_suffix}{suffix}")
+            except FileNotFoundError:
+                pass
+        os.replace(f"{src}{object_suffix}", f"{dst}{object_suffix}")
+    entries = []
+    if target.index:
+        for relpath, key in placed + [ (relpath_to, key) for _, key, relpath_to in moves ]:
+            st = os.stat(os.path.join(basedir, f"{relpath}{object_suffix}"))
+            entries.append((key, st.st_size, st.st_mtime_ns))
+    from .local_index import INDEX_FILE, LocalIndex
+    _remove_empty_directories(basedir)
+    index_path = os.path.join(basedir, INDEX_FILE)
+    for suffix in ("", "-wal", "-shm"):
+        try:
+            os.remove(f"{index_path}{suffix}")
+        except FileNotFoundError:
+            pass
+    if target.index:
+        index = LocalIndex(index_path, sync=True)
+        try:
+            index.put_many(entries)
+        finally:
+            index.close()
+    write_layout(basedir, None if target == Layout() else target.to_dict())
+    return counts
+
+
+def _remove_empty_directories(basedir : str):
+    for dirpath, _, _ in os.walk(basedir, topdown=False):
+        if dirpath != basedir:
+            try:
+                os.rmdir(dirpath)
+            except OSError:
+                # not empty
+                pass
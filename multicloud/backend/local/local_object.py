@@ -1,31 +1,107 @@
+import io
 import os
+import mmap
 from io import IOBase
-from ..object import Object
+from typing import List, Optional
+from ..object import Object, ObjectInfo, TextWriter, check_range
 from ...autocontext import Context
+from .local_commit import PendingFile, open_temporary, write_all, discard
+
+OBJECT_SUFFIX = ".object"
+# sidecar file next to an object recording its content encoding
+ENCODING_SUFFIX = ".encoding"
 
 class LocalObject(Object):
-    def __init__(self, ctx:Context, key:str, basedir:str):
+    def __init__(self, ctx:Context, key:str, backend):
+        """An object stored as a file under the backend's basedir
+
+        Args:
+            ctx : Context : The context this object is part of
+            key : str : The object key, its path relative to basedir
+            backend : LocalBackend : The backend owning the directory cache and the commit policy
+        """
         super().__init__(ctx, key)
-        self.basedir = ctx.environment.interpolate(basedir)
-        #print(f"LocalObject<{self.basedir}>")
+        self.backend = backend
+        self.basedir = backend.basedir
 
     def fullpath(self):
-        path = os.path.join(self.basedir, f"{self.key}.object")
+        layout = self.backend.layout
+        path = os.path.join(self.basedir, f"{layout.relpath(self.key) if layout.sharded else self.key}{OBJECT_SUFFIX}")
         return path
 
     def prepare(self, fullpath):
-        subdir = os.path.dirname(fullpath)
-        os.makedirs(subdir, exist_ok=True)
+        self.backend.ensure_directory(os.path.dirname(fullpath))
 
-    def put_bytes(self, data : bytes):
-        fullpath = self.fullpath()
+    def open_temporary(self, path) -> PendingFile:
+        """Creates the temporary file a write of path goes to, returns (descriptor, temporary path, path)"""
+        try:
+            fd, tmp_path = open_temporary(path)
+        except FileNotFoundError:
+            # the directory was removed since the backend cached it
+            subdir = os.path.dirname(path)
+            self.backend.forget_directory(subdir)
+            self.backend.ensure_directory(subdir)
+            fd, tmp_path = open_temporary(path)
+        return fd, tmp_path, path
+
+    def encoding_path(self, fullpath):
+        return f"{fullpath}{ENCODING_SUFFIX}"
+
+    def remove_content_encoding(self, fullpath):
+        try:
+            os.remove(self.encoding_path(fullpath))
+        except FileNotFoundError:
+            pass
+
+    def start_write(self, fullpath, content_encoding : Optional[str]) -> List[PendingFile]:
+        """Opens the temporary files of a write, the data first and then any encoding sidecar
+
+        Nothing next to the object changes until the write is committed: the data is renamed
+        into place first, then the sidecar, and a stale sidecar is only removed by the commit
+        of a plain write (see `commit`).
+        """
         self.prepare(fullpath)
-        with open(fullpath, "wb") as f:
-            f.write(data)
+        files = []
+        try:
+            files.append(self.open_temporary(fullpath))
+            if content_encoding is not None:
+                files.append(self.open_temporary(self.encoding_path(fullpath)))
+                write_all(files[-1][0], content_encoding.encode('UTF-8'))
+        except BaseException:
+            discard(files)
+            raise
+        return files
 
-    def put_file(self, binary:bool = True) -> IOBase:
-        fullpath = self.fullpath()
-        return open(fullpath, f"w{'b' if binary else 't'}")
+    def commit(self, files : List[PendingFile]):
+        """Publishes a write started by start_write, removing the sidecar of a plain write after the data"""
+        fullpath = files[0][2]
+        self.backend.commit(files, self.key, remove=() if len(files) > 1 else (self.encoding_path(fullpath),))
+
+    def put_bytes(self, data : bytes, content_encoding : Optional[str] = None):
+        # replace rather than truncate, so readers never see a partial object and mapped
+        # readers (see get_buffer) keep the old contents
+        files = self.start_write(self.fullpath(), content_encoding)
+        try:
+            write_all(files[0][0], data)
+        except BaseException:
+            discard(files)
+            raise
+        self.commit(files)
+
+    def put_file(self, binary:bool = True, content_encoding:Optional[str] = None) -> IOBase:
+        """Opens a stream writing a temporary file, which replaces the object when the stream is closed
+
+        Closing the stream from a `with` block that raised, or calling `abort()`, discards the
+        temporary file and leaves the object as it was.
+
+        Args:
+            binary (bool, optional): Whether to write the file in binary mode. Defaults to True.
+            content_encoding (str, optional): Recorded in a sidecar next to the object. Defaults to None.
+        """
+        writer = LocalWriter(self, self.start_write(self.fullpath(), content_encoding))
+        if binary:
+            return writer
+        return TextWriter(writer)
 
     def get_bytes(self):
         fullpath = self.fullpath()
@@ -34,9 +110,122 @@ class LocalObject(Object):
 
     def get_file(self, binary:bool = True) -> IOBase:
         fullpath = self.fullpath()
-        return open(fullpath, "r{'b' if binary else 't'}")
+        return open(fullpath, f"r{'b' if binary else 't'}")
+
+    def get_content_encoding(self) -> Optional[str]:
+        try:
+            with open(self.encoding_path(self.fullpath()), "r") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def get_buffer(self) -> memoryview:
+        """Maps the object file read-only and returns a memoryview over the mapping
+
+        The mapping shares page-cache pages with every other reader of the same file, so
+        repeated or concurrent reads do not copy the data.  The mapping stays valid until the
+        last view of it is released.  Writes replace the file instead of rewriting it, so a
+        held view keeps showing the contents it was mapped with.
+        """
+        with open(self.fullpath(), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return memoryview(b"")
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(mapping)
+
+    def get_range(self, offset:int, length:int) -> bytes:
+        return self.get_ranges([(offset, length)])[0]
+
+    def get_ranges(self, ranges) -> list:
+        """Reads several parts of the object with positional reads on a single open file"""
+        ranges = list(ranges)
+        for offset, length in ranges:
+            check_range(offset, length)
+        fd = os.open(self.fullpath(), os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            return [ pread(fd, length, offset) for offset, length in ranges ]
+        finally:
+            os.close(fd)
 
     def exists(self) -> bool:
+        """Checks for the object in the backend's index when it has one, else for its file"""
+        if self.backend.index is not None:
+            return self.backend.index.exists(self.key)
         fullpath = self.fullpath()
         return os.path.exists(fullpath)
 
+    def info(self) -> Optional[ObjectInfo]:
+        if self.backend.index is not None:
+            return self.backend.index.info(self.key)
+        try:
+            st = os.stat(self.fullpath())
+        except FileNotFoundError:
+            return None
+        return ObjectInfo(self.key, st.st_size, st.st_mtime, f"{st.st_mtime_ns:x}-{st.st_size:x}")
+
+    def delete(self):
+        fullpath = self.fullpath()
+        try:
+            os.remove(fullpath)
+        except FileNotFoundError:
+            pass
+        self.remove_content_encoding(fullpath)
+        self.backend.forget(self.key, fullpath)
+
+
+class LocalWriter(io.RawIOBase):
+    """Writes the temporary file of a put_file, committed by its object on close"""
+
+    def __init__(self, obj : LocalObject, files : List[PendingFile]):
+        super().__init__()
+        self.obj = obj
+        self.files = files
+        self.fd = files[0][0]
+        self._aborted = False
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        if self.closed:
+            raise ValueError("write to closed file")
+        return write_all(self.fd, b)
+
+    def abort(self):
+        """Discards the written data, the object keeps its previous contents if any"""
+        if self.closed:
+            return
+        self._aborted = True
+        self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._aborted:
+                discard(self.files)
+            else:
+                self.obj.commit(self.files)
+        finally:
+            super().close()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self._aborted = True
+        self.close()
+
+
+def pread(fd, length, offset) -> bytes:
+    """Reads up to length bytes at offset, looping over short reads"""
+    if not hasattr(os, 'pread'):
+        os.lseek(fd, offset, os.SEEK_SET)
+        return os.read(fd, length)
+    chunks = []
+    while length > 0:
+        chunk = os.pread(fd, length, offset)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        offset += len(chunk)
+        length -= len(chunk)
+    return chunks[0] if len(chunks) == 1 else b"".join(chunks)
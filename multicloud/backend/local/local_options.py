@@ -0,0 +1,21 @@
+from ...common.config import Config
+from ...common.options import Options
+
+
+class LocalOptions(Options):
+    """Local filesystem settings resolved once per backend"""
+    __slots__ = ('basedir', 'durability', 'group_commit_delay', 'layout', 'shard_depth', 'index')
+
+    def __init__(self, ctx, opts : Config):
+        self.resolve(ctx, opts, {
+            'basedir': ('basedir', None),
+            # none, fsync or group, see LocalBackend
+            'durability': ('durability', 'none'),
+            # seconds a group commit waits for more writers
+            'group_commit_delay': ('group_commit_delay', 0.0),
+            # plain or sharded, None keeps the layout recorded in basedir
+            'layout': ('layout', None),
+            'shard_depth': ('shard_depth', 2),
+            # SQLite key index, defaults to on for the sharded layout
+            'index': ('index', None),
+        })
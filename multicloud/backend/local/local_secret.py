@@ -4,7 +4,6 @@ import keyring
 from ..secret import Secret
 from ...autocontext import Context
 from typing import Optional
-from cryptography.fernet import InvalidToken
 
 
 class LocalSecret(Secret):
@@ -20,17 +19,23 @@ class LocalSecret(Secret):
             keyring_path : Optional[str] : The file to use for file-based keyrings, e.g. for "fernet" backends, default None uses the default location
         """
         super().__init__(ctx, name)
-        keyring_impl = keyring.get_keyring()
 
     def get(self) -> dict:
         """Fetches localhost secrets from keyring"""
         try:
             pw = keyring.get_password(self.ctx.service, self.name)
-            if pw is None:
-                raise KeyError(f"Secret '{self.name}' not found in keyring for service '{self.ctx.service}'")
-            return json.loads(pw)
-        except InvalidToken as e:
+        except Exception as e:
+            # raised by Fernet based keyrings; cryptography is optional, so only imported here
+            try:
+                from cryptography.fernet import InvalidToken
+            except ImportError:
+                InvalidToken = None
+            if InvalidToken is None or not isinstance(e, InvalidToken):
+                raise
             raise RuntimeError(f"Failed to decrypt secret, check that the bootstrap password is correct") from e
+        if pw is None:
+            raise KeyError(f"Secret '{self.name}' not found in keyring for service '{self.ctx.service}'")
+        return json.loads(pw)
 
     def set(self, value : dict):
         """Stores localhost secrets into keyring"""
@@ -1,23 +1,150 @@
 from ..backend import Backend
 from .nas_secret import NasSecret
-from .nas_object import NasObject
+from .nas_object import NasObject, is_sidecar
+from .nas_options import NasOptions
+from .nas_transfer import UPLOAD_SUFFIX
+from .nas_ssh import SshSession
+from ..bulk import BulkResult
 from ..secret import Secret
-from ..object import Object
+from ..object import Object, ObjectInfo
 from ...errors import ConfigurationError
+from typing import Iterable, Iterator, Optional
+import json
+import threading
 
 class NasBackend(Backend):
-    def __init__(self, ctx, server : str, port : int, webdav_secret : str):
-        super().__init__(ctx, "LocalBackend")
-        self.server = server
-        self.port = port
-        self.webdav_secret = webdav_secret
+    def __init__(self, ctx, options : NasOptions):
+        """A NAS backend, objects are stored over WebDAV and secrets over ssh
+
+        All object handles share one thread-safe WebDAV client with a pool of keep-alive
+        connections, created and authenticated on first use.
+
+        Args:
+            ctx : Context : The context this backend is part of
+            options : NasOptions : The resolved backend settings
+        """
+        super().__init__(ctx, "NasBackend")
+        self.options = options
+        self.server = options.server
+        self.port = options.port
+        self.webdav_secret = options.webdav_secret
+        self._client = None
+        self._lock = threading.Lock()
+        self._collections = set()
+        # bulk calls run no more requests than the pool has connections: threads left waiting
+        # on a saturated httpx pool intermittently fail with a closed socket
+        self.bulk_workers = min(self.bulk_workers, int(options.max_connections))
+        self.ssh = SshSession(self.server, options.ssh_port, options.ssh_user,
+                              keepalive=options.ssh_keepalive, timeout=float(options.timeout))
 
     def secret(self, name) -> Secret:
         """Returns a secret by using ssh to store and retrieve files from the server"""
-        return NasSecret(self.ctx, name)
+        return NasSecret(self.ctx, name, self.ssh)
+
+    def get_secrets(self, names:Iterable[str], max_workers:Optional[int] = None) -> BulkResult:
+        """Reads many secrets with a single remote command over the shared ssh session"""
+        names = list(names)
+        values = self.ssh.get_secrets(self.ctx.service, names)
+        result = BulkResult()
+        for name in names:
+            if name in values:
+                try:
+                    result.results[name] = json.loads(values[name])
+                except ValueError as e:
+                    result.errors[name] = e
+            else:
+                result.errors[name] = KeyError(f"Secret '{name}' not found on {self.server} for service '{self.ctx.service}'")
+        return result
 
     def object(self, key) -> Object:
         """Store and retrieve objects over WebDAV"""
-        return NasObject(self.ctx, key, self.server, self.port, self.webdav_secret)
+        return NasObject(self.ctx, key, self)
+
+    def credentials(self):
+        """Resolves the WebDAV basic auth credentials
+
+        The `secret` setting names a secret holding {"username": ..., "password": ...}.  Without
+        it the context credentials are used if set, otherwise requests are anonymous.
+        """
+        if self.webdav_secret is not None:
+            creds = self.secret(self.webdav_secret).get()
+        elif self.ctx.credentials is not None:
+            creds = self.ctx.credentials.get()
+        else:
+            return None
+        if isinstance(creds, dict):
+            return (creds['username'], creds['password'])
+        return tuple(creds)
+
+    def client(self):
+        """Returns the backend's shared WebDAV client, creating it on first use"""
+        client = self._client
+        if client is not None:
+            return client
+        with self._lock:
+            if self._client is None:
+                import httpx
+                from webdav4.client import Client
+                connections = int(self.options.max_connections)
+                self._client = Client(
+                    f"{self.options.scheme}://{self.server}:{self.port}",
+                    auth=self.credentials(),
+                    verify=self.ctx.network.verify,
+                    timeout=float(self.options.timeout),
+                    limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+                )
+            return self._client
+
+    def ensure_collection(self, path : str):
+        """Creates the collection path and its parents, once per backend
+
+        WebDAV refuses a PUT into a missing collection, so writers call this first.  Collections
+        already seen by this backend are skipped without a request.
+        """
+        path = path.strip("/")
+        if not path or path in self._collections:
+            return
+        from webdav4.client import ResourceAlreadyExists
+        parts = path.split("/")
+        for i in range(1, len(parts)+1):
+            collection = "/".join(parts[:i])
+            if collection in self._collections:
+                continue
+            try:
+                self.client().mkdir(collection)
+            except ResourceAlreadyExists:
+                pass
+            with self._lock:
+                self._collections.add(collection)
 
+    def list(self, prefix:str = "", delimiter:Optional[str] = None) -> Iterator[ObjectInfo]:
+        """Lists objects with one PROPFIND (Depth: 1) per visited collection
 
+        Args:
+            prefix : str : Only keys starting with this prefix are listed
+            delimiter : Optional[str] : Only '/' is supported, which lists one collection level
+        """
+        if delimiter not in (None, "/"):
+            raise ValueError(f"NasBackend only supports the '/' delimiter, not '{delimiter}'")
+        from webdav4.client import ResourceNotFound
+        client = self.client()
+        pending = [prefix[:prefix.rfind("/")+1]]
+        while pending:
+            keydir = pending.pop()
+            try:
+                entries = client.ls(keydir or "/", detail=True)
+            except ResourceNotFound:
+                continue
+            for entry in entries:
+                key = entry['name'].strip("/")
+                if entry['type'] == 'directory':
+                    subdir = f"{key}/"
+                    if subdir.startswith(prefix):
+                        if delimiter:
+                            yield ObjectInfo(subdir, is_prefix=True)
+                        else:
+                            pending.append(subdir)
+                elif key.startswith(prefix) and not key.endswith(UPLOAD_SUFFIX) and not is_sidecar(key):
+                    modified = entry.get('modified')
+                    yield ObjectInfo(key, entry.get('content_length'),
+                                     modified.timestamp() if modified else None, entry.get('etag'))
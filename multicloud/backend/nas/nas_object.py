@@ -1,43 +1,123 @@
 import os
-from io import IOBase, BytesIO
-from ..object import Object
+from io import IOBase, BufferedReader, TextIOWrapper
+from typing import Optional
+from ..object import Object, ObjectInfo, TextWriter, check_range
 from ...autocontext import Context
+from .nas_transfer import StreamingUploader, open_download
 
-from webdav4.client import Client
+from webdav4.client import HTTPError, ResourceNotFound
 
+# hidden sidecar next to an object recording its content encoding
+ENCODING_SUFFIX = ".encoding"
 
-client = Client("https://drivep.ank.com:5006", auth=("kevin", "zany0Tiger!"), verify=False)
-#client.exists("Documents/Readme.md")
 
-client.ls("Archive", detail=False)
+def encoding_path(path : str) -> str:
+    return f"{os.path.dirname(path)}/.{os.path.basename(path)}{ENCODING_SUFFIX}".lstrip("/")
+
+
+def is_sidecar(key : str) -> bool:
+    """True for the hidden encoding sidecars, which are not objects"""
+    return os.path.basename(key).startswith(".") and key.endswith(ENCODING_SUFFIX)
 
 
 class NasObject(Object):
-    def __init__(self, ctx:Context, key:str, server:str, port:int, creds_secret:str):
+    def __init__(self, ctx:Context, key:str, backend):
+        """An object stored on the NAS over WebDAV
+
+        Args:
+            ctx : Context : The context this object is part of
+            key : str : The object key, which is also its path on the server
+            backend : NasBackend : The backend owning the shared WebDAV client
+        """
         super().__init__(ctx, key)
-        self.server = ctx.environment.interpolate(server)
-        creds = ctx.backend.secret(creds_secret).get()
-        self.port = port
-        self.client = Client(f"https://{self.server}:{self.port}", auth=creds, verify=ctx.network.verify)
+        self.backend = backend
+        self.client = backend.client()
         self.fullpath = key
-        #print(f"LocalObject<{self.server}:{self.port}>")
 
-    def put_bytes(self, data : bytes):
-        ios = BytesIO(data)
-        with open(self.fullpath, "wb") as f:
-            self.client.upload_fileobj(f, self.fullpath)
+    def set_content_encoding(self, content_encoding : Optional[str]):
+        """Writes the encoding sidecar, or removes it for plain data"""
+        path = encoding_path(self.fullpath)
+        if content_encoding is not None:
+            self.client.request("PUT", path, content=content_encoding.encode('UTF-8'))
+            return
+        try:
+            self.client.request("DELETE", path)
+        except ResourceNotFound:
+            pass
+
+    def put_bytes(self, data : bytes, content_encoding : Optional[str] = None):
+        self.backend.ensure_collection(os.path.dirname(self.fullpath))
+        self.client.request("PUT", self.fullpath, content=bytes(data))
+        # only once the data is stored, so a failed write leaves the previous encoding in place
+        self.set_content_encoding(content_encoding)
+
+    def put_file(self, binary:bool = True, content_encoding:Optional[str] = None) -> IOBase:
+        """Opens a stream that uploads the object with a chunked PUT as it is written
 
-    def put_file(self, binary:bool = True) -> IOBase:
-        fullpath = self.fullpath()
-        return open(fullpath, f"w{'b' if binary else 't'}")
+        Args:
+            binary (bool, optional): Whether to write the file in binary mode. Defaults to True.
+            content_encoding (str, optional): Recorded in a hidden sidecar next to the object once the upload
+              is moved into place; an aborted upload leaves the sidecar untouched. Defaults to None.
+        """
+        self.backend.ensure_collection(os.path.dirname(self.fullpath))
+        writer = StreamingUploader(self.client, self.fullpath, self.backend.options.chunk_size,
+                                   on_commit=lambda: self.set_content_encoding(content_encoding))
+        if binary:
+            return writer
+        return TextWriter(writer)
 
     def get_bytes(self):
-        fullpath = self.fullpath()
-        with open(fullpath, "rb") as f:
-            return f.read()
+        return self.client.request("GET", self.fullpath).content
 
     def get_file(self, binary:bool = True) -> IOBase:
-        fullpath = self.fullpath()
-        return open(fullpath, "r{'b' if binary else 't'}")
+        """Opens a stream that downloads the object as it is read
+
+        Args:
+            binary (bool, optional): Whether to read the file in binary mode. Defaults to True.
+        """
+        reader = BufferedReader(open_download(self.client, self.fullpath, self.backend.options.chunk_size))
+        return reader if binary else TextIOWrapper(reader)
+
+    def get_content_encoding(self) -> Optional[str]:
+        try:
+            response = self.client.request("GET", encoding_path(self.fullpath))
+        except ResourceNotFound:
+            return None
+        return response.content.decode('UTF-8').strip() or None
+
+    def get_range(self, offset:int, length:int) -> bytes:
+        """Reads part of the object with a WebDAV ranged GET
+
+        Servers that ignore the Range header answer with the whole object, which is sliced locally.
+        """
+        check_range(offset, length)
+        if length == 0:
+            return b""
+        try:
+            response = self.client.request("GET", self.fullpath, headers={"Range": f"bytes={offset}-{offset+length-1}"})
+        except HTTPError as e:
+            if e.status_code == 416:
+                return b""
+            raise
+        if response.status_code == 206:
+            return response.content
+        return response.content[offset:offset+length]
+
+    def exists(self) -> bool:
+        return self.client.exists(self.fullpath)
 
+    def info(self) -> Optional[ObjectInfo]:
+        try:
+            entry = self.client.info(self.fullpath)
+        except ResourceNotFound:
+            return None
+        modified = entry.get('modified')
+        return ObjectInfo(self.key, entry.get('content_length'),
+                          modified.timestamp() if modified else None, entry.get('etag'))
 
+    def delete(self):
+        try:
+            self.client.remove(self.fullpath)
+        except ResourceNotFound:
+            pass
+        self.set_content_encoding(None)
@@ -0,0 +1,26 @@
+from ...common.config import Config
+from ...common.options import Options
+
+
+class NasOptions(Options):
+    """NAS (WebDAV objects, ssh secrets) settings resolved once per backend"""
+    __slots__ = ('server', 'port', 'webdav_secret', 'scheme',
+                 'max_connections', 'timeout', 'chunk_size',
+                 'ssh_port', 'ssh_user', 'ssh_keepalive')
+
+    def __init__(self, ctx, opts : Config):
+        self.resolve(ctx, opts, {
+            'server': ('server', None),
+            'port': ('port', None),
+            'webdav_secret': ('secret', None),
+            'scheme': ('scheme', 'https'),
+            # shared WebDAV client, pooled keep-alive connections
+            'max_connections': ('max_connections', 10),
+            'timeout': ('timeout', 60),
+            # streaming put_file/get_file transfer size
+            'chunk_size': ('chunk_size', 1024 * 1024),
+            # persistent ssh session used for secrets
+            'ssh_port': ('ssh_port', 22),
+            'ssh_user': ('ssh_user', None),
+            'ssh_keepalive': ('ssh_keepalive', 30),
+        })
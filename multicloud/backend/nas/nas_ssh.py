@@ -0,0 +1,157 @@
+import shlex
+import threading
+from typing import Iterable, Optional, Tuple
+
+KEYS_DIR = ".keys"
+
+
+class SshSession:
+    """A persistent SSH connection to the NAS, shared by every secret of a backend
+
+    The transport is connected and authenticated once, on first use, and each command runs on
+    its own channel multiplexed over it, so concurrent callers do not serialize on one shell.
+    A transport that has dropped is reconnected transparently and the command retried once.
+    """
+
+    def __init__(self, server : str, port : int = 22, username : Optional[str] = None,
+                 keepalive : int = 30, timeout : float = 30):
+        """
+        Args:
+            server : str : The NAS host name
+            port : int : The ssh port
+            username : Optional[str] : Remote user, defaults to the local user or ssh config
+            keepalive : int : Seconds between keepalive packets, 0 to disable
+            timeout : float : Connect and command timeout in seconds
+        """
+        self.server = server
+        self.port = int(port)
+        self.username = username
+        self.keepalive = int(keepalive)
+        self.timeout = float(timeout)
+        self._client = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"SshSession<{self.server}:{self.port}>"
+
+    def transport(self):
+        """Returns the active transport, connecting or reconnecting it as needed"""
+        with self._lock:
+            client = self._client
+            if client is not None:
+                transport = client.get_transport()
+                if transport is not None and transport.is_active():
+                    return transport
+                client.close()
+                self._client = None
+            from paramiko import SSHClient
+            client = SSHClient()
+            client.load_system_host_keys()
+            client.connect(self.server, port=self.port, username=self.username, timeout=self.timeout)
+            transport = client.get_transport()
+            if self.keepalive > 0:
+                transport.set_keepalive(self.keepalive)
+            self._client = client
+            return transport
+
+    def run(self, command : str, stdin : Optional[bytes] = None):
+        """Runs a remote shell command on a new channel
+
+        Returns:
+            :tuple: (exit status, stdout bytes, stderr bytes)
+        """
+        from paramiko import SSHException
+        for attempt in (1, 2):
+            transport = self.transport()
+            try:
+                channel = transport.open_session(timeout=self.timeout)
+            except (SSHException, EOFError, OSError):
+                # the connection went away while idle, reconnect and retry once
+                transport.close()
+                if attempt == 2:
+                    raise
+                continue
+            with channel:
+                channel.settimeout(self.timeout)
+                channel.exec_command(command)
+                if stdin is not None:
+                    channel.sendall(stdin)
+                channel.shutdown_write()
+                stdout, stderr = _read_output(channel)
+                return channel.recv_exit_status(), stdout, stderr
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    def get_secret(self, service : str, user : str) -> Optional[str]:
+        """Reads .keys/<service>/<user>, returning None if it does not exist"""
+        path = shlex.quote(f"{KEYS_DIR}/{service}/{user}")
+        status, stdout, stderr = self.run(f"test -f {path} || exit 3; cat {path}")
+        if status == 3:
+            return None
+        if status != 0:
+            raise RuntimeError(f"Unable to read secret '{KEYS_DIR}/{service}/{user}' on {self.server}: {stderr.decode(errors='replace').strip()}")
+        return stdout.decode('UTF-8').rstrip("\n")
+
+    def get_secrets(self, service : str, users : Iterable[str]) -> dict:
+        """Reads several secrets of a service with one remote command
+
+        Each file is emitted as a found flag and its contents, NUL separated, so values may hold
+        any text.
+
+        Returns:
+            :dict: user -> value for every secret that exists
+        """
+        users = list(users)
+        if not users:
+            return {}
+        names = " ".join(shlex.quote(user) for user in users)
+        command = (f"cd {shlex.quote(f'{KEYS_DIR}/{service}')} 2>/dev/null || exit 0; "
+                   f"for f in {names}; do "
+                   "if test -f \"$f\"; then printf '1\\0'; cat -- \"$f\"; else printf '0\\0'; fi; printf '\\0'; "
+                   "done")
+        status, stdout, stderr = self.run(command)
+        if status != 0:
+            raise RuntimeError(f"Unable to read secrets of '{service}' on {self.server}: {stderr.decode(errors='replace').strip()}")
+        fields = stdout.split(b"\0")
+        values = {}
+        for i, user in enumerate(users[:len(fields) // 2]):
+            if fields[2*i] == b"1":
+                values[user] = fields[2*i+1].decode('UTF-8').rstrip("\n")
+        return values
+
+    def set_secret(self, service : str, user : str, value : str):
+        """Writes .keys/<service>/<user>, passing the value on stdin rather than the command line"""
+        keydir = shlex.quote(f"{KEYS_DIR}/{service}")
+        path = shlex.quote(f"{KEYS_DIR}/{service}/{user}")
+        status, _, stderr = self.run(f"umask 077 && mkdir -p {keydir} && cat > {path}", (value + "\n").encode('UTF-8'))
+        if status != 0:
+            raise ValueError(f"Unable to write secret '{KEYS_DIR}/{service}/{user}': {stderr.decode(errors='replace').strip()}")
+
+
+def _read_output(channel) -> Tuple[bytes, bytes]:
+    """Reads stdout and stderr of a channel to their ends, returns (stdout, stderr)
+
+    stderr is drained on a thread while stdout is read: reading one stream to its end first
+    stalls the command, and the read, once it fills the other stream's channel window.
+    """
+    result = {}
+
+    def read_stderr():
+        try:
+            result['stderr'] = channel.makefile_stderr('rb').read()
+        except BaseException as e:
+            result['error'] = e
+
+    reader = threading.Thread(target=read_stderr, name="multicloud-ssh-stderr", daemon=True)
+    reader.start()
+    try:
+        stdout = channel.makefile('rb').read()
+    finally:
+        reader.join()
+    if 'error' in result:
+        raise result['error']
+    return stdout, result['stderr']
@@ -0,0 +1,231 @@
+import io
+import os
+import queue
+import threading
+import uuid
+from typing import Callable, Optional
+
+# chunks queued between the writer and the upload thread
+QUEUE_DEPTH = 4
+# streamed uploads are written under a temporary name and moved into place when complete
+UPLOAD_SUFFIX = ".upload"
+
+
+class _QueueReader:
+    """The read side handed to the WebDAV client, yielding the chunks queued by the writer
+
+    It deliberately has no fileno(), seek() or len(), so the upload is sent with chunked
+    transfer encoding instead of a Content-Length taken from an unfinished stream.
+    """
+
+    def __init__(self, chunks : queue.Queue):
+        self.chunks = chunks
+
+    def read(self, _size : int = -1) -> bytes:
+        chunk = self.chunks.get()
+        if isinstance(chunk, BaseException):
+            raise chunk
+        return chunk
+
+
+class StreamingUploader(io.RawIOBase):
+    """A write-only stream that uploads to a WebDAV server with one chunked PUT
+
+    The PUT runs on a background thread and is fed `chunk_size` pieces through a small
+    bounded queue, so `write()` blocks when the upload falls behind and memory stays bounded
+    to roughly chunk_size * (QUEUE_DEPTH + 1).  The data goes to a temporary name next to
+    the destination, which is moved over the destination on close, so readers never see a
+    partial object.  If the stream is closed from a `with` block that raised, or `abort()`
+    is called, the request is cut short and the temporary upload removed.
+    """
+
+    def __init__(self, client, path : str, chunk_size : int, on_commit : Optional[Callable[[], None]] = None):
+        """
+        Args:
+            client : webdav4.client.Client : The backend's shared WebDAV client
+            path : str : Destination path on the server
+            chunk_size : int : Size of each chunk sent to the server
+            on_commit : Callable : Called once the upload has been moved over the destination,
+              never for an aborted or failed upload
+        """
+        super().__init__()
+        self.client = client
+        self.path = path
+        self.upload_path = f"{os.path.dirname(path)}/.{os.path.basename(path)}.{uuid.uuid4().hex}{UPLOAD_SUFFIX}".lstrip("/")
+        self.chunk_size = max(int(chunk_size), 1)
+        self.on_commit = on_commit
+        self._buffer = bytearray()
+        self._chunks = queue.Queue(maxsize=QUEUE_DEPTH)
+        self._error = None
+        self._aborted = False
+        self._thread = threading.Thread(target=self._upload, name="webdav-upload", daemon=True)
+        self._thread.start()
+
+    def _upload(self):
+        try:
+            self.client.upload_fileobj(_QueueReader(self._chunks), self.upload_path,
+                                       overwrite=True, chunk_size=self.chunk_size)
+        except BaseException as e:
+            self._error = e
+            # unblock a writer waiting on a full queue
+            while True:
+                try:
+                    self._chunks.get_nowait()
+                except queue.Empty:
+                    break
+
+    def _send(self, chunk):
+        while self._thread.is_alive():
+            try:
+                self._chunks.put(chunk, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        raise RuntimeError(f"upload of '{self.path}' ended before the stream was closed")
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        if self.closed:
+            raise ValueError("write to closed file")
+        data = memoryview(b).cast('B')
+        self._buffer += data
+        while len(self._buffer) >= self.chunk_size:
+            self._send(bytes(self._buffer[:self.chunk_size]))
+            del self._buffer[:self.chunk_size]
+        return len(data)
+
+    def abort(self):
+        """Aborts the upload, the server keeps the previous version of the object if any"""
+        if self.closed:
+            return
+        self._aborted = True
+        self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._aborted:
+                try:
+                    self._send(RuntimeError(f"upload of '{self.path}' aborted"))
+                except BaseException:
+                    pass
+                self._thread.join()
+                self._remove_upload()
+                return
+            if self._buffer:
+                self._send(bytes(self._buffer))
+            self._send(b"")
+            self._thread.join()
+            if self._error is not None:
+                self._remove_upload()
+                raise self._error
+            self.client.move(self.upload_path, self.path, overwrite=True)
+            if self.on_commit is not None:
+                self.on_commit()
+        finally:
+            self._buffer = bytearray()
+            super().close()
+
+    def _remove_upload(self):
+        from webdav4.client import ResourceNotFound
+        try:
+            self.client.remove(self.upload_path)
+        except ResourceNotFound:
+            pass
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self._aborted = True
+        self.close()
+
+
+def open_download(client, path : str, chunk_size : Optional[int] = None) -> io.RawIOBase:
+    """Opens a streaming GET of path, read iteratively as the caller consumes it
+
+    Raises webdav4's ResourceNotFound when the object does not exist, and its HTTPError for
+    other failed responses, like the client's own requests.
+    """
+    response = _send_download(client, path)
+    return DownloadStream(client, path, response, chunk_size or client.chunk_size)
+
+
+def _send_download(client, path : str, offset : int = 0):
+    from httpx import HTTPStatusError
+    from webdav4.client import HTTPError, ResourceNotFound
+    headers = { "Range": f"bytes={offset}-" } if offset else None
+    request = client.http.build_request("GET", client.join_url(path), headers=headers)
+    response = client.http.send(request, stream=True)
+    try:
+        if response.status_code == 404:
+            raise ResourceNotFound(path)
+        if offset and response.status_code != 206:
+            raise HTTPError(response)
+        try:
+            response.raise_for_status()
+        except HTTPStatusError as e:
+            raise HTTPError(response) from e
+    except BaseException:
+        response.close()
+        raise
+    return response
+
+
+class DownloadStream(io.RawIOBase):
+    """Reads the body of a streamed GET, closing the response when it is closed
+
+    A download cut off by a network error is resumed with a ranged GET from where it stopped,
+    when the server accepts ranges for the object.
+    """
+
+    def __init__(self, client, path : str, response, chunk_size : int):
+        super().__init__()
+        self.client = client
+        self.path = path
+        self.response = response
+        self.chunk_size = chunk_size
+        self.position = 0
+        self._chunks = response.iter_bytes(chunk_size)
+        self._chunk = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        if self.closed:
+            raise ValueError("read from closed file")
+        while not self._chunk:
+            chunk = self._next()
+            if chunk is None:
+                return 0
+            self._chunk = memoryview(chunk)
+        size = min(len(b), len(self._chunk))
+        b[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        self.position += size
+        return size
+
+    def _next(self) -> Optional[bytes]:
+        from httpx import TransportError
+        while True:
+            try:
+                return next(self._chunks, None)
+            except TransportError:
+                if self.response.headers.get("Accept-Ranges") != "bytes":
+                    raise
+                self.response.close()
+                self.response = _send_download(self.client, self.path, self.position)
+                self._chunks = self.response.iter_bytes(self.chunk_size)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self.response.close()
+        finally:
+            super().close()
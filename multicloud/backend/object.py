@@ -1,4 +1,35 @@
-from io import IOBase, BufferedReader, TextIOWrapper, TextIOBase
+from io import IOBase, BufferedReader, BufferedWriter, RawIOBase, TextIOWrapper, TextIOBase
+from typing import Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from ..autocontext import Context
+
+
+class ObjectInfo:
+    """Describes an object found by Backend.list()
+
+    Args:
+      key :str: the object key, or the common prefix when is_prefix is set
+      size :int: size in bytes, None for prefixes
+      mtime :float: modification time as seconds since the epoch, if known
+      etag :str: an opaque version tag that changes when the object changes, if known
+      is_prefix :bool: True for a common prefix rolled up by the list delimiter
+    """
+    __slots__ = ('key', 'size', 'mtime', 'etag', 'is_prefix')
+
+    def __init__(self, key:str, size:Optional[int] = None, mtime:Optional[float] = None,
+                 etag:Optional[str] = None, is_prefix:bool = False):
+        self.key = key
+        self.size = size
+        self.mtime = mtime
+        self.etag = etag
+        self.is_prefix = is_prefix
+
+    def __repr__(self):
+        if self.is_prefix:
+            return f"ObjectInfo<{self.key}>(prefix)"
+        return f"ObjectInfo<{self.key}>(size={self.size}, mtime={self.mtime}, etag={self.etag})"
+
 
 class Object:
     def __init__(self, ctx, key:str):
@@ -8,18 +39,24 @@ class Object:
           ctx :Context:
           key :str: an object key has pathlike syntax (a/b/c), but must not start with a '/'
         """
-        from ..autocontext import Context
         assert(not key.startswith('/'))
-        self.ctx : Context = ctx
+        self.ctx : 'Context' = ctx
         self.key = key
 
     def prepare(self, fullpath):
         raise NotImplementedError("base class")
 
-    def put_bytes(self, data : bytes):
+    def put_bytes(self, data : bytes, content_encoding : Optional[str] = None):
+        """Stores the object
+
+        Args:
+          data :bytes: the object contents
+          content_encoding :str: the encoding the data is already compressed with (e.g. gzip), recorded
+            with the object so readers can decode it; None for plain data
+        """
         raise NotImplementedError("base class")
 
-    def put_file(self, binary:bool = True) -> IOBase:
+    def put_file(self, binary:bool = True, content_encoding:Optional[str] = None) -> IOBase:
         """Opens an output stream that when written to will upload the data to the object store."""
         raise NotImplementedError("base class")
 
@@ -30,6 +67,61 @@ class Object:
         """Opens an input stream that when read from will download the data from the object store."""
         raise NotImplementedError("base class")
 
+    def get_content_encoding(self) -> Optional[str]:
+        """Returns the content encoding recorded when the object was stored, None for plain data"""
+        return None
+
+    def get_file_with_encoding(self) -> Tuple[IOBase, Optional[str]]:
+        """Opens a binary input stream together with the object's content encoding
+
+        Backends that return the encoding with the data (S3) override this to use one request.
+        """
+        content_encoding = self.get_content_encoding()
+        return self.get_file(binary=True), content_encoding
+
+    def get_buffer(self) -> memoryview:
+        """Returns a read-only buffer over the whole object
+
+        Slicing the returned memoryview does not copy.  Backends that can map the object
+        directly (see LocalObject) override this; the default wraps the result of `get_bytes()`.
+        """
+        return memoryview(self.get_bytes()).toreadonly()
+
+    def get_range(self, offset:int, length:int) -> bytes:
+        """Reads part of an object
+
+        Reads that extend past the end of the object return the bytes that are available, and
+        reads starting at or beyond the end return an empty result.
+
+        Backends with native partial reads override this.  The default implementation downloads
+        the whole object with `get_bytes()` and slices it, so it is correct everywhere but only
+        cheaper for backends that override it.
+
+        Args:
+          offset :int: first byte to read
+          length :int: maximum number of bytes to read
+        """
+        check_range(offset, length)
+        return bytes(self.get_bytes()[offset:offset+length])
+
+    def get_ranges(self, ranges) -> list:
+        """Reads several parts of an object
+
+        Args:
+          ranges :list: a sequence of (offset, length) pairs
+
+        Returns:
+          :list: the bytes read for each range, in the order requested
+        """
+        ranges = list(ranges)
+        for offset, length in ranges:
+            check_range(offset, length)
+        if type(self).get_range is Object.get_range:
+            # no native partial reads, so download once and slice every range out of it
+            data = self.get_bytes()
+            return [ bytes(data[offset:offset+length]) for offset, length in ranges ]
+        return [ self.get_range(offset, length) for offset, length in ranges ]
+
     def get_text(self) -> str:
         return self.get_bytes().decode()
 
@@ -43,3 +135,46 @@ class Object:
 
     def exists(self) -> bool:
         raise NotImplementedError("base class")
+
+    def info(self) -> Optional[ObjectInfo]:
+        """Returns the size, modification time and etag of the object, or None if it does not exist
+
+        Backends read this with a single metadata request (stat, HEAD or PROPFIND).  The default
+        only checks that the object exists, leaving the other fields unknown.
+        """
+        return ObjectInfo(self.key) if self.exists() else None
+
+    def delete(self):
+        """Removes the object.  Deleting an object that does not exist is not an error."""
+        raise NotImplementedError("base class")
+
+
+class TextWriter(TextIOWrapper):
+    """The text mode stream of put_file, over the binary stream of a backend
+
+    TextIOWrapper closes its stream when a `with` block exits, whatever happened inside it,
+    which would commit a partial write.  This one hands the block's exception on to the
+    binary stream instead, so that the write is aborted.
+
+    Args:
+      raw :RawIOBase: the binary put_file stream, committed on close and aborted by __exit__
+    """
+
+    def __init__(self, raw : RawIOBase):
+        super().__init__(BufferedWriter(raw))
+
+    def abort(self):
+        """Discards the written data, nothing is committed"""
+        self.buffer.raw.abort()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            return super().__exit__(exc_type, exc, tb)
+        # the buffered text is dropped: once the raw stream is closed, closing the wrappers
+        # no longer flushes
+        return self.buffer.raw.__exit__(exc_type, exc, tb)
+
+
+def check_range(offset:int, length:int):
+    if offset < 0 or length < 0:
+        raise ValueError(f"Invalid byte range offset={offset} length={length}")
@@ -2,11 +2,35 @@ from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from keyring.backend import KeyringBackend
+from contextlib import contextmanager
 import base64
 import json
 import os
+import threading
+
+JOURNAL_FORMAT = "fernet-journal"
+JOURNAL_VERSION = 1
+# compact once the journal holds this many superseded entries beyond the live ones
+COMPACT_SLACK = 64
+# next to the keystore, locked by the process writing it
+LOCK_SUFFIX = ".lock"
 
 class FernetKeyring(KeyringBackend):
+    """A keyring backend storing Fernet encrypted secrets in a single portable file
+
+    The keystore is a journal: a JSON header line holding the KDF salt followed by one JSON line
+    per stored or deleted secret.  Each commit appends only the changed entries and fsyncs them,
+    and secrets are looked up from an in-memory index built when the file is loaded.  Once
+    superseded entries outnumber the live ones the journal is compacted by writing a new file and
+    renaming it over the old one, so a crash never leaves a truncated keystore.
+
+    Several processes may share a keystore.  Commits and compactions hold an exclusive lock on
+    a file next to it and first read the entries other processes committed since, so neither
+    an append nor a compaction loses another process's secrets.
+
+    Keystores written by earlier versions (a single JSON document) are read transparently and
+    rewritten in the journal format on the first commit.
+    """
     priority=8
 
     def __init__(self, password=None, keystore_path=None):
@@ -18,6 +42,14 @@ class FernetKeyring(KeyringBackend):
         if keystore_path is None:
             keystore_path = os.path.expanduser(os.getenv("KEYRING_KEYSTORE_PATH", "fernet-keyring.json"))
         self.keystore_path = keystore_path
+        self._lock = threading.RLock()
+        self._pending = None
+        self._undo = None
+        self._depth = 0
+        # the keystore file the index was read from, held open so that its inode is not reused,
+        # and the end of its last entry read
+        self._file = None
+        self._position = 0
         self.keystore : dict = self.load_data()
         self.codec = Fernet(self.superkey(bytes(password, 'UTF-8')))
 
@@ -31,35 +63,251 @@ class FernetKeyring(KeyringBackend):
 
     def set_password(self, service, user, password):
         #print(f"Storing password for {user}@{service} in {self.keystore_path}")
-        if not service in self.keystore:
-            #print(f"Initializing {service} entry in keystore")
-            self.keystore[service] = {}
         red_text = password
         black_text = self.codec.encrypt(bytes(red_text, 'UTF-8')).hex()
-        self.keystore[service][user] = black_text
-        self.save_data()
-        
+        with self.transaction():
+            self._record(service, user, black_text)
+
+    def delete_password(self, service, user):
+        with self._lock:
+            if user not in self.keystore.get(service, {}):
+                from keyring.errors import PasswordDeleteError
+                raise PasswordDeleteError(f"Secret '{user}' not found for service '{service}'")
+            with self.transaction():
+                self._record(service, user, None)
+
+    @contextmanager
+    def transaction(self):
+        """Groups several set/delete calls into a single journal commit
+
+        Changes are visible to readers in this process immediately, and written to disk with one
+        append and fsync when the outermost transaction exits.  If the block raises, the changes
+        are rolled back instead.  If the commit fails, the index is read again from the keystore,
+        as the commit may already have merged other processes' entries into it.
+        """
+        with self._lock:
+            if self._depth == 0:
+                self._pending = []
+                self._undo = []
+            self._depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._rollback()
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                try:
+                    self.commit(self._pending)
+                except BaseException:
+                    self._reload()
+                    raise
+                self._pending, self._undo = None, None
+
+    def _record(self, service, user, black_text):
+        previous = self.keystore.get(service, {}).get(user, None)
+        self._undo.append((service, user, previous))
+        self._apply(self.keystore, service, user, black_text)
+        self._pending.append({ 's': service, 'u': user, 'v': black_text })
+
+    @staticmethod
+    def _apply(index, service, user, black_text):
+        if black_text is None:
+            entries = index.get(service, {})
+            entries.pop(user, None)
+            if not entries:
+                index.pop(service, None)
+        else:
+            index.setdefault(service, {})[user] = black_text
+
+    def _rollback(self):
+        undo, self._pending, self._undo = self._undo, None, None
+        for service, user, previous in reversed(undo):
+            self._apply(self.keystore, service, user, previous)
+
+    def _reload(self):
+        """Discards the uncommitted changes by reading the index again from the keystore"""
+        self._pending, self._undo = None, None
+        with self._file_lock():
+            if os.path.exists(self.keystore_path):
+                self.keystore = self._read()
+            else:
+                self.keystore = {}
+                self.needs_compaction = True
+
     def superkey(self, password):
-        kdf = PBKDF2HMAC(hashes.SHA256(), 32, bytes.fromhex(self.keystore['salt']), iterations=1_200_000)
+        kdf = PBKDF2HMAC(hashes.SHA256(), 32, bytes.fromhex(self.salt), iterations=1_200_000)
         key = base64.urlsafe_b64encode(kdf.derive(password))
         return key
 
     def load_data(self):
-        if os.path.exists(self.keystore_path):
-            with open(self.keystore_path, "rt") as f:
-                keystore = json.loads(f.read())
-        else:
-            self.salt = os.urandom(16)
-            keystore = { 'salt': self.salt.hex() }
-        assert 'salt' in keystore, f"Invalid keystore {self.keystore_path}, missing salt"
-        return keystore
+        """Loads the keystore into the in-memory index, creating an empty keystore if there is none"""
+        if not os.path.exists(self.keystore_path):
+            with self._file_lock():
+                if not os.path.exists(self.keystore_path):
+                    self.salt = os.urandom(16).hex()
+                    self.keystore = {}
+                    self._write_compacted()
+        return self._read()
 
-    def save_data(self):
+    def _read(self) -> dict:
+        self.journal_entries = 0
+        self.needs_compaction = False
+        index = {}
+        f = self._hold(open(self.keystore_path, "rb"))
+        header = f.readline()
+        try:
+            meta = json.loads(header)
+        except ValueError:
+            meta = None
+        if not isinstance(meta, dict) or meta.get('format') != JOURNAL_FORMAT:
+            # single document keystore from earlier versions
+            legacy = json.loads(header + f.read())
+            assert 'salt' in legacy, f"Invalid keystore {self.keystore_path}, missing salt"
+            self.salt = legacy.pop('salt')
+            self.needs_compaction = True
+            return legacy
+        assert 'salt' in meta, f"Invalid keystore {self.keystore_path}, missing salt"
+        self.salt = meta['salt']
+        self._position = len(header)
+        self._read_entries(f, index)
+        return index
+
+    def _hold(self, f):
+        if self._file is not None:
+            self._file.close()
+        self._file = f
+        return f
+
+    def _read_entries(self, f, index : dict):
+        """Applies the journal lines of f to index, from the current position of f to the end"""
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # torn final append from a crash; dropped by the next compaction
+                self.needs_compaction = True
+                break
+            self._apply(index, entry['s'], entry['u'], entry['v'])
+            self.journal_entries += 1
+            self._position += len(line)
+            if not line.endswith(b"\n"):
+                self.needs_compaction = True
+
+    def _refresh(self, entries = ()):
+        """Reads what other processes committed since this one last read or wrote the keystore
+
+        Called holding the file lock.  The journal lines appended since are applied to the index;
+        a keystore replaced by another process's compaction is read again from the start.  The
+        uncommitted entries of this process are then applied again on top.
+        """
+        try:
+            st = os.stat(self.keystore_path)
+        except FileNotFoundError:
+            # removed behind our back, the next commit writes it anew
+            st = None
+            self._hold(None)
+            self.needs_compaction = True
+        if st is not None and (self._file is None or not os.path.samestat(st, os.fstat(self._file.fileno()))):
+            salt = self.salt
+            self.keystore = self._read()
+            if self.salt != salt:
+                raise RuntimeError(f"Keystore {self.keystore_path} was replaced by one with another key, reopen it")
+        elif st is not None and st.st_size != self._position and not self.needs_compaction:
+            self._file.seek(self._position)
+            self._read_entries(self._file, self.keystore)
+        for entry in entries:
+            self._apply(self.keystore, entry['s'], entry['u'], entry['v'])
+
+    @contextmanager
+    def _file_lock(self):
+        """Holds the exclusive lock that serializes the writers of the keystore across processes
+
+        A no-op where fcntl is unavailable.
+        """
+        try:
+            import fcntl
+        except ImportError:
+            yield
+            return
+        basedir = os.path.dirname(self.keystore_path)
+        if basedir and not os.path.isdir(basedir):
+            os.makedirs(basedir, exist_ok=True)
+        fd = os.open(f"{self.keystore_path}{LOCK_SUFFIX}", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def live_entries(self) -> int:
+        return sum(len(users) for users in self.keystore.values())
+
+    def commit(self, entries):
+        """Appends entries to the journal, compacting it instead when it has grown too large
+
+        The entries must already be applied to the index, as transactions do.
+        """
+        with self._lock, self._file_lock():
+            try:
+                self._refresh(entries)
+                if not entries and not self.needs_compaction:
+                    return
+                if self.needs_compaction or self.journal_entries + len(entries) > 2 * self.live_entries() + COMPACT_SLACK:
+                    self._write_compacted()
+                    return
+                data = "".join(json.dumps(entry) + "\n" for entry in entries).encode('UTF-8')
+                with open(self.keystore_path, "ab") as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+            except BaseException:
+                # the index no longer matches the file, read it again on the next commit
+                self._hold(None)
+                raise
+            self.journal_entries += len(entries)
+            self._position += len(data)
+
+    def compact(self):
+        """Rewrites the journal with only the live entries, atomically replacing the keystore"""
+        with self._lock, self._file_lock():
+            self._refresh(self._pending or ())
+            self._write_compacted()
+
+    def _write_compacted(self):
         basedir = os.path.dirname(self.keystore_path)
         if basedir and not os.path.isdir(basedir):
             os.makedirs(basedir)
-        with open(self.keystore_path, "wt") as f:
-            print(json.dumps(self.keystore), file=f)
+        tmp_path = f"{self.keystore_path}.{os.getpid()}.tmp"
+        lines = [ json.dumps({ 'format': JOURNAL_FORMAT, 'version': JOURNAL_VERSION, 'salt': self.salt }) ]
+        for service, users in self.keystore.items():
+            for user, black_text in users.items():
+                lines.append(json.dumps({ 's': service, 'u': user, 'v': black_text }))
+        data = ("\n".join(lines) + "\n").encode('UTF-8')
+        f = open(tmp_path, "w+b")
+        try:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+            os.replace(tmp_path, self.keystore_path)
+        except BaseException:
+            f.close()
+            raise
+        self._hold(f)
+        if hasattr(os, 'O_DIRECTORY'):
+            fd = os.open(basedir or ".", os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        self._position = len(data)
+        self.journal_entries = len(lines) - 1
+        self.needs_compaction = False
+
+    def save_data(self):
+        self.compact()
 
     def activate(self):
         print("Activating FernetKeyring as the default keyring backend")
@@ -15,7 +15,7 @@ class PortableBackend(Backend):
             ctx : Context : The context this backend is part of
             keyring_file : Optional[str] : The file to use for file-based keyrings, e.g. for "fernet" backends, default None uses the default location
         """
-        super().__init__(ctx, "LocalBackend")
+        super().__init__(ctx, "PortableBackend")
         self.keyring_path = keyring_path
         from .fernet_keyring import FernetKeyring
 
@@ -26,6 +26,15 @@ class PortableBackend(Backend):
         #Not registering to allow the standard keyring backend to be used elsewhere
         #fernet_backend.activate()
 
+    def transaction(self):
+        """Groups secret writes into a single keystore commit, see FernetKeyring.transaction()
+
+            with ctx.backend.transaction():
+                for name, value in secrets.items():
+                    ctx.secret(name).set(value)
+        """
+        return self.fernet_backend.transaction()
+
     def secret(self, name) -> Secret:
         """Returns an abstraction to access a secret stored in the local keyring
 
@@ -0,0 +1,82 @@
+import random
+import threading
+import time
+from typing import Optional
+
+# weight of the newest sample in the moving average
+EWMA_ALPHA = 0.2
+# latency samples kept per replica for percentiles
+RESERVOIR_SIZE = 512
+# samples needed before percentiles are trusted for hedging
+MIN_SAMPLES = 20
+
+
+class LatencyTracker:
+    """Latency and health statistics of one replica
+
+    Keeps an exponentially weighted moving average of successful call latencies, used to rank
+    the replicas, and a reservoir sample of them for percentiles.  After `failure_threshold`
+    consecutive failures that another replica did not share, the replica is considered down
+    for `cooldown` seconds and is only tried after the healthy ones.
+    """
+
+    def __init__(self, failure_threshold : int = 3, cooldown : float = 30):
+        self.failure_threshold = int(failure_threshold)
+        self.cooldown = float(cooldown)
+        self.ewma = None
+        self.samples = []
+        self.seen = 0
+        self.calls = 0
+        self.errors = 0
+        self.failures = 0
+        self.down_until = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds : float):
+        with self._lock:
+            self.calls += 1
+            self.failures = 0
+            self.ewma = seconds if self.ewma is None else EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * self.ewma
+            self.seen += 1
+            if len(self.samples) < RESERVOIR_SIZE:
+                self.samples.append(seconds)
+            else:
+                slot = random.randrange(self.seen)
+                if slot < RESERVOIR_SIZE:
+                    self.samples[slot] = seconds
+
+    def record_error(self):
+        with self._lock:
+            self.calls += 1
+            self.errors += 1
+
+    def penalize(self):
+        """Counts a failure that another replica did not have, taking the replica down if it keeps failing"""
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.down_until = time.monotonic() + self.cooldown
+
+    def healthy(self) -> bool:
+        return self.down_until <= time.monotonic()
+
+    def percentile(self, pct : float) -> Optional[float]:
+        """Returns the pct-th percentile latency in seconds, or None with too few samples"""
+        with self._lock:
+            if len(self.samples) < MIN_SAMPLES:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+    def snapshot(self) -> dict:
+        p50, p95, p99 = (self.percentile(pct) for pct in (50, 95, 99))
+        ms = lambda seconds: None if seconds is None else round(seconds * 1000, 3)
+        return {
+            'ewma_ms': ms(self.ewma),
+            'p50_ms': ms(p50),
+            'p95_ms': ms(p95),
+            'p99_ms': ms(p99),
+            'calls': self.calls,
+            'errors': self.errors,
+            'healthy': self.healthy(),
+        }
@@ -0,0 +1,302 @@
+import itertools
+import threading
+import time
+from typing import Callable, Iterable, Iterator, List, Optional
+from ..backend import Backend
+from ..bulk import BulkResult
+from ..secret import Secret
+from ..object import Object, ObjectInfo
+from .latency import LatencyTracker
+from .replicated_object import ReplicatedObject, ReplicatedSecret, write_all
+from .replicated_options import ReplicatedOptions
+
+# bytes read at a time when repair copies an object between replicas
+COPY_CHUNK = 1024 * 1024
+
+
+class Replica:
+    """A named child backend and its routing statistics"""
+
+    def __init__(self, name : str, backend : Backend, tracker : LatencyTracker):
+        self.name = name
+        self.backend = backend
+        self.tracker = tracker
+        self.served = 0
+        self.hedge_wins = 0
+        # key -> write number, for the keys whose latest write this replica missed
+        self.missed = {}
+
+    def __repr__(self):
+        return f"Replica<{self.name}>({self.backend!r})"
+
+
+class ReplicatedBackend(Backend):
+    def __init__(self, ctx, options : ReplicatedOptions, replicas : dict):
+        """Keeps the same objects and secrets in several backends
+
+        Writes and deletes go to every replica concurrently and succeed once `min_writes` of
+        them have.  Reads go to the healthy replica with the lowest moving average latency and
+        fail over to the next one on errors.  With `hedge` enabled, a read that has not finished
+        within the `hedge_percentile` latency of its replica is also sent to the next replica,
+        and the first answer wins.
+
+        A replica that fails a write which still succeeds elsewhere is recorded as having missed
+        it; reads of that key try it last, and `repair()` copies the key over from a replica
+        that has the write.
+
+        Args:
+            ctx : Context : The context this backend is part of
+            options : ReplicatedOptions : The resolved routing settings
+            replicas : dict : replica name -> Backend, in configuration order
+        """
+        super().__init__(ctx, "ReplicatedBackend")
+        if not replicas:
+            raise ValueError("replicated backend requires at least one replica")
+        self.options = options
+        self.replicas = [ Replica(name, backend, LatencyTracker(options.failure_threshold, options.cooldown))
+                          for name, backend in replicas.items() ]
+        self.min_writes = len(self.replicas) if options.min_writes is None else int(options.min_writes)
+        self.failovers = 0
+        self.hedges = 0
+        self._executor = None
+        self._lock = threading.Lock()
+        self._writes = itertools.count()
+
+    def __repr__(self):
+        return f"{self.name}<{','.join(replica.name for replica in self.replicas)}>"
+
+    def executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    from concurrent.futures import ThreadPoolExecutor
+                    self._executor = ThreadPoolExecutor(max_workers=max(self.bulk_workers, 2 * len(self.replicas)),
+                                                        thread_name_prefix="multicloud-replica")
+        return self._executor
+
+    def ranked(self, key : Optional[str] = None) -> List[Replica]:
+        """Replicas in the order reads try them: healthy before down, then fastest first
+
+        Replicas without measurements sort first, so every replica gets measured.  Replicas
+        that missed the latest write of key sort last.
+        """
+        return sorted(self.replicas, key=lambda replica: (
+            key is not None and key in replica.missed,
+            not replica.tracker.healthy(),
+            -1 if replica.tracker.ewma is None else replica.tracker.ewma))
+
+    def _timed(self, replica : Replica, call : Callable):
+        start = time.perf_counter()
+        try:
+            result = call(replica)
+        except Exception:
+            replica.tracker.record_error()
+            raise
+        replica.tracker.record(time.perf_counter() - start)
+        return result
+
+    def _served(self, replica : Replica, failed : list):
+        replica.served += 1
+        # failures that another replica did not share count against the replica's health
+        for other, _ in failed:
+            other.tracker.penalize()
+
+    def read(self, call : Callable, hedge : bool = True, key : Optional[str] = None):
+        """Runs call(replica) on the best replica, failing over and optionally hedging
+
+        Args:
+            call : Callable : Performs the read against a Replica
+            hedge : bool : False for reads whose result holds resources, like open streams
+            key : str : The object read, to try the replicas that missed its latest write last
+        """
+        order = self.ranked(key)
+        if hedge and self.options.hedge and len(order) > 1:
+            delay = order[0].tracker.percentile(self.options.hedge_percentile)
+            if delay is not None:
+                return self._hedged_read(order, call, delay)
+        failed = []
+        for replica in order:
+            try:
+                result = self._timed(replica, call)
+            except Exception as e:
+                failed.append((replica, e))
+                self.failovers += 1
+                continue
+            self._served(replica, failed)
+            return result
+        raise failed[0][1]
+
+    def _hedged_read(self, order : List[Replica], call : Callable, delay : float):
+        from concurrent.futures import wait, FIRST_COMPLETED
+        executor = self.executor()
+        remaining = list(order)
+        first = remaining.pop(0)
+        pending = { executor.submit(self._timed, first, call): first }
+        failed = []
+        timeout = delay
+        while pending:
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # the read is slower than usual for its replica, ask the next one as well
+                timeout = None
+                if remaining:
+                    self.hedges += 1
+                    replica = remaining.pop(0)
+                    pending[executor.submit(self._timed, replica, call)] = replica
+                continue
+            for future in done:
+                replica = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    failed.append((replica, e))
+                    self.failovers += 1
+                    if remaining and not pending:
+                        replica = remaining.pop(0)
+                        pending[executor.submit(self._timed, replica, call)] = replica
+                    continue
+                if replica is not first:
+                    replica.hedge_wins += 1
+                self._served(replica, failed)
+                return result
+        raise failed[0][1]
+
+    def write(self, call : Callable, key : Optional[str] = None):
+        """Runs call(replica) on every replica concurrently
+
+        Raises the first error when fewer than `min_writes` replicas succeeded.
+
+        Args:
+            call : Callable : Performs the write against a Replica
+            key : str : The object written, to record the replicas that missed the write
+        """
+        futures = [ (replica, self.executor().submit(self._timed, replica, call)) for replica in self.replicas ]
+        succeeded = []
+        failed = []
+        for replica, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                failed.append((replica, e))
+            else:
+                succeeded.append(replica)
+        self.check_write(key, succeeded, failed)
+
+    def check_write(self, key : Optional[str], succeeded : list, failed : list):
+        """Records which replicas missed a write of key and raises when fewer than `min_writes` made it
+
+        Args:
+            key : str : The object written, None for writes that are not recorded
+            succeeded : list : The replicas that have the write
+            failed : list : (Replica, exception) for the replicas that failed it
+        """
+        if key is not None and succeeded:
+            with self._lock:
+                write = next(self._writes)
+                for replica in self.replicas:
+                    if replica in succeeded:
+                        replica.missed.pop(key, None)
+                    else:
+                        replica.missed[key] = write
+        if len(succeeded) < self.min_writes:
+            replica, error = failed[0]
+            raise RuntimeError(f"write succeeded on {len(succeeded)} of {len(self.replicas)} replicas, "
+                               f"'{replica.name}' failed") from error
+
+    def repair(self) -> BulkResult:
+        """Brings the replicas that missed writes up to date
+
+        Each key a replica missed is copied from the fastest replica that has its latest write,
+        or deleted when that replica no longer has the object.  Keys that fail stay recorded
+        for the next repair.
+
+        Returns:
+            BulkResult : The outcome per key
+        """
+        result = BulkResult()
+        for replica in self.replicas:
+            for key, write in list(replica.missed.items()):
+                try:
+                    self._repair(replica, key)
+                except Exception as e:
+                    result.errors[key] = e
+                    continue
+                with self._lock:
+                    # unless the key was written again meanwhile
+                    if replica.missed.get(key) == write:
+                        del replica.missed[key]
+                if key not in result.errors:
+                    result.results[key] = None
+        for key in result.errors:
+            result.results.pop(key, None)
+        return result
+
+    def _repair(self, replica : Replica, key : str):
+        sources = [ other for other in self.ranked(key) if key not in other.missed ]
+        if not sources:
+            raise RuntimeError(f"no replica has the latest write of '{key}'")
+        try:
+            stream, content_encoding = sources[0].backend.object(key).get_file_with_encoding()
+        except FileNotFoundError:
+            replica.backend.object(key).delete()
+            return
+        with stream, replica.backend.object(key).put_file(binary=True, content_encoding=content_encoding) as writer:
+            while True:
+                chunk = stream.read(COPY_CHUNK)
+                if not chunk:
+                    break
+                write_all(writer, memoryview(chunk))
+
+    def secret(self, name) -> Secret:
+        return ReplicatedSecret(self.ctx, name, self)
+
+    def object(self, key) -> Object:
+        return ReplicatedObject(self.ctx, key, self)
+
+    def list(self, prefix:str = "", delimiter:Optional[str] = None) -> Iterator[ObjectInfo]:
+        """Lists the fastest healthy replica, failing over if it errors before yielding anything"""
+        failed = []
+        for replica in self.ranked():
+            listing = iter(replica.backend.list(prefix, delimiter))
+            try:
+                first = next(listing, None)
+            except Exception as e:
+                replica.tracker.record_error()
+                failed.append((replica, e))
+                continue
+            self._served(replica, failed)
+            if first is not None:
+                yield first
+                yield from listing
+            return
+        raise failed[0][1]
+
+    def delete_many(self, keys:Iterable[str], max_workers:Optional[int] = None) -> BulkResult:
+        """Deletes through every replica's own bulk delete; a key fails if any replica failed it"""
+        keys = list(keys)
+        result = BulkResult()
+        outcomes = [ replica.backend.delete_many(keys, max_workers) for replica in self.replicas ]
+        for key in keys:
+            failed = [ (replica, outcome.errors[key]) for replica, outcome in zip(self.replicas, outcomes)
+                       if key in outcome.errors ]
+            try:
+                self.check_write(key, [ replica for replica, outcome in zip(self.replicas, outcomes)
+                                        if key not in outcome.errors ], failed)
+            except RuntimeError:
+                pass
+            if failed:
+                result.errors[key] = failed[0][1]
+            else:
+                result.results[key] = None
+        return result
+
+    def stats(self) -> dict:
+        """Routing order and per replica latency, error and routing counts"""
+        return {
+            'order': [ replica.name for replica in self.ranked() ],
+            'failovers': self.failovers,
+            'hedges': self.hedges,
+            'replicas': { replica.name: dict(replica.tracker.snapshot(), served=replica.served, hedge_wins=replica.hedge_wins,
+                                             missed=len(replica.missed))
+                          for replica in self.replicas },
+        }
@@ -0,0 +1,197 @@
+import io
+from io import IOBase
+from typing import Optional
+from ..object import Object, ObjectInfo, TextWriter
+from ..secret import Secret
+
+
+class ReplicatedObject(Object):
+    def __init__(self, ctx, key:str, backend):
+        """An object kept in every replica of a ReplicatedBackend
+
+        Args:
+            ctx : Context : The context this object is part of
+            key : str : The object key
+            backend : ReplicatedBackend : The backend routing the calls
+        """
+        super().__init__(ctx, key)
+        self.backend = backend
+
+    def __repr__(self):
+        return f"ReplicatedObject<{self.key}>"
+
+    def _read(self, method : str, *args, hedge : bool = True):
+        return self.backend.read(lambda replica: getattr(replica.backend.object(self.key), method)(*args), hedge, self.key)
+
+    def _write(self, method : str, *args):
+        self.backend.write(lambda replica: getattr(replica.backend.object(self.key), method)(*args), self.key)
+
+    def put_bytes(self, data : bytes, content_encoding : Optional[str] = None):
+        self._write('put_bytes', data, content_encoding)
+
+    def put_file(self, binary:bool = True, content_encoding:Optional[str] = None) -> IOBase:
+        """Opens a stream that writes to every replica as it is written
+
+        Closing the stream commits it on every replica and succeeds once `min_writes` of them
+        have, like `put_bytes`.  Replicas that fail to open, write or commit are dropped from
+        the write and recorded as having missed it.
+        """
+        streams = []
+        failed = []
+        try:
+            for replica in self.backend.replicas:
+                try:
+                    streams.append((replica, replica.backend.object(self.key).put_file(binary=True, content_encoding=content_encoding)))
+                except Exception as e:
+                    replica.tracker.record_error()
+                    failed.append((replica, e))
+            if len(streams) < self.backend.min_writes:
+                self.backend.check_write(self.key, [], failed)
+        except BaseException as e:
+            for _, stream in streams:
+                _abort(stream, e)
+            raise
+        writer = _TeeWriter(self.backend, self.key, streams, failed)
+        if binary:
+            return writer
+        return TextWriter(writer)
+
+    def get_bytes(self):
+        return self._read('get_bytes')
+
+    def get_file(self, binary:bool = True) -> IOBase:
+        # a hedged loser would leave its stream open, so streams only fail over
+        return self._read('get_file', binary, hedge=False)
+
+    def get_content_encoding(self) -> Optional[str]:
+        return self._read('get_content_encoding')
+
+    def get_file_with_encoding(self):
+        # data and encoding must come from the same replica
+        return self._read('get_file_with_encoding', hedge=False)
+
+    def get_buffer(self) -> memoryview:
+        return self._read('get_buffer')
+
+    def get_range(self, offset:int, length:int) -> bytes:
+        return self._read('get_range', offset, length)
+
+    def get_ranges(self, ranges) -> list:
+        return self._read('get_ranges', list(ranges))
+
+    def exists(self) -> bool:
+        return self._read('exists')
+
+    def info(self) -> Optional[ObjectInfo]:
+        return self._read('info')
+
+    def delete(self):
+        self._write('delete')
+
+
+class ReplicatedSecret(Secret):
+    """A secret kept in every replica, read from the fastest one"""
+
+    def __init__(self, ctx, name : str, backend):
+        super().__init__(ctx, name)
+        self.backend = backend
+
+    def get(self) -> dict:
+        return self.backend.read(lambda replica: replica.backend.secret(self.name).get())
+
+    def set(self, value : dict):
+        self.backend.write(lambda replica: replica.backend.secret(self.name).set(value))
+
+
+class _TeeWriter(io.RawIOBase):
+    """Writes the same data to the put_file streams of several replicas and commits them together
+
+    A replica whose stream fails is aborted and dropped, and the write goes on while at least
+    `min_writes` replicas remain.  Once the write can no longer reach `min_writes`, the streams
+    not yet committed are aborted rather than committed.
+    """
+
+    def __init__(self, backend, key : str, streams : list, failed : list):
+        """
+        Args:
+            backend : ReplicatedBackend : The backend whose replicas are written
+            key : str : The object key
+            streams : list : (Replica, stream) for every replica being written
+            failed : list : (Replica, exception) for the replicas that already failed
+        """
+        super().__init__()
+        self.backend = backend
+        self.key = key
+        self.streams = streams
+        self.failed = failed
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        data = memoryview(b).cast('B')
+        for replica, stream in list(self.streams):
+            try:
+                write_all(stream, data)
+            except Exception as e:
+                self.streams.remove((replica, stream))
+                self._failed(replica, e)
+                _abort(stream, e)
+        if len(self.streams) < self.backend.min_writes:
+            self._abort_all(self.failed[-1][1])
+            self.backend.check_write(self.key, [], self.failed)
+        return len(data)
+
+    def _failed(self, replica, error : Exception):
+        replica.tracker.record_error()
+        self.failed.append((replica, error))
+
+    def close(self):
+        if self.closed:
+            return
+        streams, self.streams = self.streams, []
+        committed = []
+        for i, (replica, stream) in enumerate(streams):
+            if len(committed) + len(streams) - i < self.backend.min_writes:
+                # too many replicas failed for the write to succeed, commit no more of them
+                _abort(stream, self.failed[-1][1])
+                continue
+            try:
+                stream.close()
+            except Exception as e:
+                self._failed(replica, e)
+                continue
+            committed.append(replica)
+        super().close()
+        self.backend.check_write(self.key, committed, self.failed)
+
+    def abort(self):
+        """Aborts the stream of every replica, nothing is committed"""
+        self._abort_all(RuntimeError("write aborted"))
+
+    def _abort_all(self, error : BaseException):
+        streams, self.streams = self.streams, []
+        for _, stream in streams:
+            _abort(stream, error)
+        super().close()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif not self.closed:
+            self._abort_all(exc)
+
+
+def write_all(stream : IOBase, data : memoryview):
+    """Writes all of data to a raw stream, looping over short writes"""
+    while data:
+        written = stream.write(data)
+        data = data[written:] if written is not None else data[len(data):]
+
+
+def _abort(stream : IOBase, error : BaseException):
+    """Aborts a put_file stream by exiting it with error, ignoring a failure to abort"""
+    try:
+        stream.__exit__(type(error), error, error.__traceback__)
+    except Exception:
+        pass
@@ -0,0 +1,19 @@
+from ...common.config import Config
+from ...common.options import Options
+
+
+class ReplicatedOptions(Options):
+    """Replica routing settings resolved once per backend"""
+    __slots__ = ('hedge', 'hedge_percentile', 'min_writes', 'failure_threshold', 'cooldown')
+
+    def __init__(self, ctx, opts : Config):
+        self.resolve(ctx, opts, {
+            # send slow reads to a second replica once they pass this latency percentile
+            'hedge': ('hedge', False),
+            'hedge_percentile': ('hedge_percentile', 95),
+            # replicas a write must reach, all of them by default
+            'min_writes': ('min_writes', None),
+            # consecutive failures before a replica is skipped for `cooldown` seconds
+            'failure_threshold': ('failure_threshold', 3),
+            'cooldown': ('cooldown', 30),
+        })
@@ -1,9 +1,12 @@
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from ..autocontext import Context
 
 
 class Secret:
     def __init__(self, ctx, name : str):
-        from ..autocontext import Context
-        self.ctx : Context = ctx
+        self.ctx : 'Context' = ctx
         self.name = name
 
     def __repr__(self):
@@ -0,0 +1,121 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from .secret import Secret
+
+
+class SecretCache:
+    """A thread safe TTL + LRU cache of secret values
+
+    Entries expire `ttl` seconds after they were fetched, and once `max_size` entries are held
+    the least recently used one is evicted.  Keys are tuples scoped by backend and service
+    (see CachedSecret), so one cache can safely be shared between contexts.
+
+    Each key has a generation that invalidate() bumps.  A reader takes the generation before
+    fetching a value and passes it to put(), which drops the value if the key was invalidated
+    meanwhile, so a fetch racing with a set() cannot cache the value the set replaced.
+    """
+
+    def __init__(self, ttl : float = 300, max_size : int = 256):
+        self.ttl = float(ttl)
+        self.max_size = int(max_size)
+        self._entries = OrderedDict()
+        self._generations = {}
+        # bumped by clear(), which invalidates every key at once
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __repr__(self):
+        return f"SecretCache<ttl={self.ttl},max_size={self.max_size}>({len(self._entries)} entries)"
+
+    def get(self, key):
+        """Returns the cached value for key, or None on a miss"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, value = entry
+            if expires <= now:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return copy.deepcopy(value)
+
+    def generation(self, key) -> tuple:
+        """Returns the generation of key, to pass to put() with the value fetched next"""
+        with self._lock:
+            return (self._epoch, self._generations.get(key, 0))
+
+    def put(self, key, value, generation : Optional[tuple] = None):
+        """Caches value for key, unless key was invalidated since generation was taken"""
+        if self.max_size <= 0:
+            return
+        expires = time.monotonic() + self.ttl
+        value = copy.deepcopy(value)
+        with self._lock:
+            if generation is not None and generation != (self._epoch, self._generations.get(key, 0)):
+                return
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+            self._epoch += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+class CachedSecret(Secret):
+    """Serves Secret.get() from a SecretCache and invalidates the entry on set()"""
+
+    def __init__(self, secret : Secret, cache : SecretCache):
+        super().__init__(secret.ctx, secret.name)
+        self.secret = secret
+        self.cache = cache
+        self.cache_key = (type(secret).__name__, secret.ctx.backend.instance, secret.ctx.service, secret.name)
+
+    def __repr__(self):
+        return f"CachedSecret<{self.secret!r}>"
+
+    def get(self) -> dict:
+        value = self.cache.get(self.cache_key)
+        if value is None:
+            generation = self.cache.generation(self.cache_key)
+            value = self.secret.get()
+            self.cache.put(self.cache_key, value, generation)
+        return value
+
+    def set(self, value : dict):
+        try:
+            self.secret.set(value)
+        finally:
+            self.cache.invalidate(self.cache_key)
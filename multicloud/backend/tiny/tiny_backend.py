@@ -1,6 +1,109 @@
+import socket
+import threading
+from http.client import HTTPConnection, HTTPException
+from typing import Optional
+from urllib.parse import quote, urlsplit
 
 from ..backend import Backend
+from ..secret import Secret
+from ..object import Object
+from .tiny_secret import TinySecret
+from .tiny_server import DEFAULT_SOCKET
+
+
+class UnixHTTPConnection(HTTPConnection):
+    def __init__(self, socket_path : str, timeout : float):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+class TinyClient:
+    """Keep-alive HTTP client for the tinyserver secret agent
+
+    Each thread keeps its own persistent connection, reopened transparently if the agent
+    closed it.
+    """
+
+    def __init__(self, url : Optional[str] = None, socket_path : Optional[str] = None,
+                 token : Optional[str] = None, timeout : float = 10):
+        if url is None and socket_path is None:
+            socket_path = DEFAULT_SOCKET
+        self.url = url
+        self.socket_path = socket_path
+        self.token = token
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def __repr__(self):
+        return f"TinyClient<{self.url or self.socket_path}>"
+
+    def _connect(self) -> HTTPConnection:
+        if self.url is not None:
+            parts = urlsplit(self.url)
+            return HTTPConnection(parts.hostname, parts.port or 80, timeout=self.timeout)
+        return UnixHTTPConnection(self.socket_path, self.timeout)
+
+    def request(self, method : str, service : str, user : str, body : Optional[bytes] = None):
+        path = f"/secrets/{quote(service, safe='')}/{quote(user, safe='')}"
+        headers = {}
+        if self.token is not None:
+            headers["Authorization"] = f"Bearer {self.token}"
+        for attempt in (1, 2):
+            conn = getattr(self._local, 'conn', None)
+            if conn is None:
+                conn = self._local.conn = self._connect()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                return response.status, response.read()
+            except (HTTPException, ConnectionError):
+                # the agent closed an idle keep-alive connection, retry once on a new one
+                conn.close()
+                self._local.conn = None
+                if attempt == 2:
+                    raise
+
+    def get_password(self, service : str, user : str) -> Optional[str]:
+        status, body = self.request("GET", service, user)
+        if status == 404:
+            return None
+        if status != 200:
+            raise RuntimeError(f"tinyserver returned HTTP {status} reading '{user}' for service '{service}'")
+        return body.decode('UTF-8')
+
+    def set_password(self, service : str, user : str, password : str):
+        status, _ = self.request("PUT", service, user, password.encode('UTF-8'))
+        if status not in (200, 204):
+            raise RuntimeError(f"tinyserver returned HTTP {status} writing '{user}' for service '{service}'")
+
 
 class TinyBackend(Backend):
-    def __init__(self):
-        pass
\ No newline at end of file
+    def __init__(self, ctx, url : Optional[str] = None, socket_path : Optional[str] = None, token : Optional[str] = None):
+        """A secrets backend served by a tinyserver secret agent on the same system
+
+        The agent (bin/tinyserver) unlocks a Fernet keyring once and serves it over a unix socket
+        or loopback HTTP, so short lived processes and containers skip the key derivation.
+
+        Args:
+            ctx : Context : The context this backend is part of
+            url : Optional[str] : HTTP address of the agent, e.g. http://host.docker.internal:8765
+            socket_path : Optional[str] : Unix socket of the agent, default /run/multicloud/tinyserver.sock
+            token : Optional[str] : Bearer token expected by the agent
+        """
+        super().__init__(ctx, "TinyBackend")
+        self.client = TinyClient(url, socket_path, token)
+
+    def __repr__(self):
+        return f"{self.name}<{self.client.url or self.client.socket_path}>"
+
+    def secret(self, name) -> Secret:
+        return TinySecret(self.ctx, name, self.client)
+
+    def object(self, key) -> Object:
+        raise NotImplementedError("tinyserver backend only provides secrets")
@@ -0,0 +1,27 @@
+import json
+from ..secret import Secret
+
+
+class TinySecret(Secret):
+    """Fetches secrets from a tinyserver secret agent running on the same system"""
+
+    def __init__(self, ctx, name : str, client):
+        """
+        Args:
+            ctx : Context : The context this secret is part of
+            name : str : The name of the secret to access
+            client : TinyClient : The backend's connection to the secret agent
+        """
+        super().__init__(ctx, name)
+        self.client = client
+
+    def get(self) -> dict:
+        """Fetches the secret from the secret agent"""
+        pw = self.client.get_password(self.ctx.service, self.name)
+        if pw is None:
+            raise KeyError(f"Secret '{self.name}' not found in tinyserver for service '{self.ctx.service}'")
+        return json.loads(pw)
+
+    def set(self, value : dict):
+        """Stores the secret through the secret agent"""
+        self.client.set_password(self.ctx.service, self.name, json.dumps(value))
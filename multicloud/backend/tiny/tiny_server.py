@@ -0,0 +1,124 @@
+import hmac
+import os
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import unquote
+
+DEFAULT_SOCKET = "/run/multicloud/tinyserver.sock"
+DEFAULT_PORT = 8765
+# largest secret a client may PUT, in bytes
+MAX_BODY = 64 * 1024
+
+
+class TinyRequestHandler(BaseHTTPRequestHandler):
+    """Serves GET/PUT /secrets/<service>/<name> from the server's unlocked keyring"""
+    protocol_version = "HTTP/1.1"
+
+    def address_string(self):
+        # unix socket peers have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _reply(self, status : int, body : bytes = b""):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def _target(self):
+        if self.server.token is not None:
+            authorization = self.headers.get("Authorization", "")
+            if not hmac.compare_digest(authorization.encode('UTF-8'), f"Bearer {self.server.token}".encode('UTF-8')):
+                self._reply(401)
+                return None
+        parts = self.path.split("/")
+        if len(parts) != 4 or parts[0] != "" or parts[1] != "secrets":
+            self._reply(404)
+            return None
+        return unquote(parts[2]), unquote(parts[3])
+
+    def do_GET(self):
+        target = self._target()
+        if target is None:
+            return
+        password = self.server.keyring.get_password(*target)
+        if password is None:
+            self._reply(404)
+        else:
+            self._reply(200, password.encode('UTF-8'))
+
+    def do_PUT(self):
+        # the body is only read once the request is accepted; a rejected request leaves it
+        # unread, so its connection cannot be reused
+        keep_alive = not self.close_connection
+        self.close_connection = True
+        target = self._target()
+        if target is None:
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            self._reply(400)
+            return
+        if length > self.server.max_body:
+            self._reply(413)
+            return
+        body = self.rfile.read(length)
+        self.close_connection = not keep_alive
+        with self.server.write_lock:
+            self.server.keyring.set_password(*target, body.decode('UTF-8'))
+        self._reply(204)
+
+
+class TinyTcpServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class TinyUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def create_server(keyring, socket_path : Optional[str] = None, host : str = "127.0.0.1", port : int = DEFAULT_PORT,
+                  token : Optional[str] = None, verbose : bool = False, max_body : int = MAX_BODY):
+    """Creates a secret agent serving an already unlocked keyring
+
+    The keyring (e.g. a FernetKeyring) is unlocked once by the caller, so clients fetch secrets
+    without repeating the key derivation.  Connections are kept alive between requests.
+
+    Args:
+        keyring : KeyringBackend : The unlocked keyring to serve
+        socket_path : Optional[str] : Listen on this unix socket (created with mode 0600) instead of TCP
+        host : str : TCP listen address, loopback by default
+        port : int : TCP listen port
+        token : Optional[str] : When set, clients must send it as a bearer token
+        verbose : bool : Log every request to stderr
+        max_body : int : Largest secret accepted by PUT, in bytes
+    """
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        os.makedirs(os.path.dirname(socket_path) or ".", exist_ok=True)
+        old_umask = os.umask(0o177)
+        try:
+            server = TinyUnixServer(socket_path, TinyRequestHandler)
+        finally:
+            os.umask(old_umask)
+    else:
+        server = TinyTcpServer((host, port), TinyRequestHandler)
+    server.keyring = keyring
+    server.token = token
+    server.verbose = verbose
+    server.max_body = max_body
+    server.write_lock = threading.Lock()
+    return server
@@ -0,0 +1,369 @@
+import io
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Optional, Tuple
+
+SPOOL_SUFFIX = ".spool"
+TMP_SUFFIX = ".tmp"
+LOCK_FILE = ".lock"
+# spool files that could not be read on replay are renamed with this suffix and left alone
+CORRUPT_SUFFIX = ".corrupt"
+OP_PUT = "put"
+OP_DELETE = "delete"
+
+
+class SpoolEntry:
+    """One spooled write: a file holding a JSON header line followed by the object data"""
+    __slots__ = ('path', 'key', 'op', 'offset', 'size', 'encoding')
+
+    def __init__(self, path : str, key : str, op : str, offset : int, size : int, encoding : Optional[str] = None):
+        self.path = path
+        self.key = key
+        self.op = op
+        self.offset = offset
+        self.size = size
+        self.encoding = encoding
+
+    def __repr__(self):
+        return f"SpoolEntry<{self.key}>({self.op}, {os.path.basename(self.path)})"
+
+    @classmethod
+    def load(cls, path : str) -> 'SpoolEntry':
+        with open(path, "rb") as f:
+            header = json.loads(f.readline())
+            offset = f.tell()
+            size = os.fstat(f.fileno()).st_size - offset
+        return cls(path, header['key'], header['op'], offset, size, header.get('encoding'))
+
+    def open(self):
+        """Opens the spooled data positioned at its first byte"""
+        f = open(self.path, "rb")
+        f.seek(self.offset)
+        return f
+
+
+class SpoolWriter(io.RawIOBase):
+    """Writes one spool entry; on close it is made durable and handed to the uploaders"""
+
+    def __init__(self, spool : 'Spool', key : str, op : str, encoding : Optional[str] = None):
+        super().__init__()
+        self.spool = spool
+        self.key = key
+        self.op = op
+        self.encoding = encoding
+        self.tmp_path = os.path.join(spool.spooldir, f"{uuid.uuid4().hex}{TMP_SUFFIX}")
+        self.file = open(self.tmp_path, "wb")
+        header = { 'key': key, 'op': op }
+        if encoding is not None:
+            header['encoding'] = encoding
+        self.file.write(json.dumps(header).encode('UTF-8') + b"\n")
+        self.offset = self.file.tell()
+        self._aborted = False
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        return self.file.write(b)
+
+    def abort(self):
+        if self.closed:
+            return
+        self._aborted = True
+        self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._aborted:
+                self.file.close()
+                os.remove(self.tmp_path)
+                return
+            size = self.file.tell() - self.offset
+            if self.spool.fsync:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+            self.file.close()
+            self.spool.publish(self.tmp_path, self.key, self.op, self.offset, size, self.encoding)
+        except BaseException:
+            self.file.close()
+            try:
+                os.remove(self.tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        finally:
+            super().close()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self._aborted = True
+        self.close()
+
+
+class Spool:
+    """A durable local queue of writes, drained to a backend by background uploader threads
+
+    Every put or delete is written to its own spool file, fsynced and renamed into the spool
+    directory before the caller returns, so it survives a crash and is replayed when the spool
+    is opened again.  Spool files are named by sequence, and writes to one key are uploaded in
+    order by at most one thread at a time; when several writes to a key are waiting only the
+    newest is uploaded.  A failed upload is retried with exponential backoff, and once retries
+    are exhausted the entry stays in the spool, still visible to reads, until the next write
+    to the key or the next restart.
+
+    The directory is locked while the spool is open, so only one process drains it.  Within a
+    process, backends for the same directory share one spool, see `Spool.open`.
+    """
+
+    def __init__(self, spooldir : str, upload, workers : int = 4, retries : int = 5,
+                 retry_delay : float = 1.0, fsync : bool = True):
+        """
+        Args:
+            spooldir : str : The spool directory, created if missing
+            upload : Callable : upload(entry) writes a SpoolEntry to the backend
+            workers : int : Number of uploader threads
+            retries : int : Attempts after the first before giving up on an entry
+            retry_delay : float : Seconds before the first retry, doubled for every further one
+            fsync : bool : fsync spool files and the directory before returning to the caller
+        """
+        self.spooldir = spooldir
+        self.upload = upload
+        self.workers = max(int(workers), 1)
+        self.retries = int(retries)
+        self.retry_delay = float(retry_delay)
+        self.fsync = fsync
+        self._entries = {}
+        self._ready = deque()
+        self._queued = set()
+        self._inflight = set()
+        self._cond = threading.Condition()
+        self._publish_lock = threading.Lock()
+        self._threads = []
+        self._sequence = 0
+        self.failed = {}
+        self.uploaded = 0
+        self.retried = 0
+        self.coalesced = 0
+        self.quarantined = []
+        os.makedirs(spooldir, exist_ok=True)
+        self._lock_fd = self._lock_directory()
+        self._replay()
+
+    def __repr__(self):
+        return f"Spool<{self.spooldir}>"
+
+    @classmethod
+    def open(cls, spooldir : str, owner : str, upload, **kwargs) -> 'Spool':
+        """Returns the process's spool for spooldir, creating it on first use
+
+        The directory lock only keeps other processes out, so every backend of this process
+        using the directory shares the first one's spool and uploader threads, and with them
+        the upload function.  That is only right for backends of the same service, so owner
+        names it and another owner is refused.
+
+        Args:
+            spooldir : str : The spool directory, created if missing
+            owner : str : The service the spool uploads for
+            upload : Callable : upload(entry), used when the spool is created
+            kwargs : Further Spool arguments, used when the spool is created
+        """
+        path = os.path.realpath(spooldir)
+        with _spools_lock:
+            opened = _spools.get(path)
+            if opened is None:
+                opened = _spools[path] = (owner, cls(spooldir, upload, **kwargs))
+        if opened[0] != owner:
+            raise RuntimeError(f"Spool directory '{spooldir}' is already used by service '{opened[0]}'")
+        return opened[1]
+
+    def _lock_directory(self):
+        try:
+            import fcntl
+        except ImportError:
+            return None
+        fd = os.open(os.path.join(self.spooldir, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            raise RuntimeError(f"Spool directory '{self.spooldir}' is in use by another process")
+        return fd
+
+    def _replay(self):
+        """Queues the entries left in the spool by an earlier process"""
+        names = sorted(os.listdir(self.spooldir))
+        for name in names:
+            path = os.path.join(self.spooldir, name)
+            if name.endswith(TMP_SUFFIX):
+                # never published, the write did not return to its caller
+                os.remove(path)
+            elif name.endswith(SPOOL_SUFFIX):
+                self._sequence = max(self._sequence, int(name.split("-")[0]) + 1)
+                try:
+                    entry = SpoolEntry.load(path)
+                except (ValueError, KeyError, TypeError):
+                    # torn by a crash when written without fsync, keep it for inspection
+                    os.replace(path, f"{path}{CORRUPT_SUFFIX}")
+                    self.quarantined.append(f"{path}{CORRUPT_SUFFIX}")
+                    continue
+                self._enqueue(entry)
+
+    def writer(self, key : str, op : str = OP_PUT, encoding : Optional[str] = None) -> SpoolWriter:
+        return SpoolWriter(self, key, op, encoding)
+
+    def put(self, key : str, data : bytes, encoding : Optional[str] = None):
+        with self.writer(key, encoding=encoding) as w:
+            w.write(data)
+
+    def delete(self, key : str):
+        self.writer(key, OP_DELETE).close()
+
+    def publish(self, tmp_path : str, key : str, op : str, offset : int, size : int, encoding : Optional[str] = None):
+        """Renames a complete temporary file into the spool and queues it
+
+        Publishing is serialized so the queue order of a key always matches its sequence numbers.
+        """
+        with self._publish_lock:
+            path = os.path.join(self.spooldir, f"{self._sequence:016d}-{uuid.uuid4().hex[:8]}{SPOOL_SUFFIX}")
+            self._sequence += 1
+            os.replace(tmp_path, path)
+            if self.fsync and hasattr(os, 'O_DIRECTORY'):
+                fd = os.open(self.spooldir, os.O_RDONLY | os.O_DIRECTORY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            self._enqueue(SpoolEntry(path, key, op, offset, size, encoding))
+
+    def _enqueue(self, entry : SpoolEntry):
+        with self._cond:
+            entries = self._entries.setdefault(entry.key, [])
+            entries.append(entry)
+            self.failed.pop(entry.key, None)
+            if entry.key not in self._inflight:
+                self._queue(entry.key)
+            self._start_workers()
+            self._cond.notify_all()
+
+    def _queue(self, key : str):
+        if key not in self._queued:
+            self._queued.add(key)
+            self._ready.append(key)
+
+    def _start_workers(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name=f"multicloud-spool-{len(self._threads)}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def latest(self, key : str) -> Optional[SpoolEntry]:
+        """The newest write to key not yet uploaded, if any"""
+        with self._cond:
+            entries = self._entries.get(key)
+            return entries[-1] if entries else None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._ready:
+                    self._cond.wait()
+                key = self._ready.popleft()
+                self._queued.discard(key)
+                self._inflight.add(key)
+                entries = self._entries[key]
+                entry = entries[-1]
+                superseded = entries[:-1]
+                del entries[:-1]
+                self.coalesced += len(superseded)
+            for old in superseded:
+                self._remove(old.path)
+            uploaded, error = self._upload(entry)
+            if error is None:
+                # readers that still find the entry fall back to the source, which has it now,
+                # or move on to the newer write that superseded it
+                self._remove(entry.path)
+            with self._cond:
+                self._inflight.discard(key)
+                entries = self._entries[key]
+                if error is None:
+                    entries.remove(entry)
+                    if uploaded:
+                        self.uploaded += 1
+                    else:
+                        self.coalesced += 1
+                else:
+                    self.failed[key] = error
+                if not entries:
+                    del self._entries[key]
+                elif entries[-1] is not entry:
+                    # written again while uploading
+                    self._queue(key)
+                self._cond.notify_all()
+
+    def _upload(self, entry : SpoolEntry) -> Tuple[bool, Optional[Exception]]:
+        """Uploads an entry, retrying failures
+
+        Returns:
+            :tuple: (whether it was uploaded, the last error when it failed); an entry superseded
+              while waiting to retry is dropped without an error, the newer write is uploaded instead
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                self.upload(entry)
+                return True, None
+            except Exception as e:
+                error = e
+                if attempt < self.retries:
+                    self.retried += 1
+                    time.sleep(self.retry_delay * (2 ** attempt))
+                    if self.latest(entry.key) is not entry:
+                        return False, None
+        return False, error
+
+    @staticmethod
+    def _remove(path : str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def flush(self, timeout : Optional[float] = None):
+        """Waits until every spooled write has been uploaded
+
+        Raises:
+            TimeoutError : when timeout seconds pass first
+            RuntimeError : when uploads failed after all retries, the entries stay spooled
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._inflight or any(key not in self.failed for key in self._entries):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"{len(self._entries)} spooled keys not uploaded after {timeout}s")
+                self._cond.wait(remaining)
+            failed = dict(self.failed)
+        for key, error in failed.items():
+            raise RuntimeError(f"{len(failed)} spooled writes failed to upload, first was '{key}'") from error
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                'pending': sum(len(entries) for entries in self._entries.values()),
+                'inflight': len(self._inflight),
+                'uploaded': self.uploaded,
+                'retried': self.retried,
+                'coalesced': self.coalesced,
+                'failed': len(self.failed),
+                'quarantined': len(self.quarantined),
+            }
+
+
+# the spools opened by this process by real path, as (owner, spool)
+_spools = {}
+_spools_lock = threading.Lock()
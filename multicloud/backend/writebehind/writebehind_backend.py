@@ -0,0 +1,66 @@
+import shutil
+from typing import Iterator, Optional
+from ..backend import Backend
+from ..secret import Secret
+from ..object import Object, ObjectInfo
+from .spool import Spool, SpoolEntry, OP_DELETE
+from .writebehind_object import WriteBehindObject
+from .writebehind_options import WriteBehindOptions
+
+# larger spooled writes are streamed to the source with put_file instead of put_bytes
+STREAM_THRESHOLD = 8 * 1024 * 1024
+
+
+class WriteBehindBackend(Backend):
+    def __init__(self, ctx, options : WriteBehindOptions, source : Backend):
+        """Wraps another backend so object writes return once they are durable on local disk
+
+        Writes go to a spool directory and are uploaded to the source backend by `workers`
+        background threads, retried on failure.  Writes left in the spool by a process that
+        exited or crashed are uploaded when the backend is next created.  Call `flush()` to wait
+        for the uploads, e.g. before exiting.  Backends of one service in a process share the
+        spool, so uploads go through the source of the first one created.  Secrets and listings use the source directly, so
+        listings do not include writes still in the spool.
+
+        Args:
+            ctx : Context : The context this backend is part of
+            options : WriteBehindOptions : The resolved spool settings
+            source : Backend : The backend the spool drains into
+        """
+        super().__init__(ctx, "WriteBehindBackend")
+        self.options = options
+        self.source = source
+        self.spool = Spool.open(options.spooldir, ctx.service, self._upload, workers=options.workers,
+                                retries=options.retries, retry_delay=options.retry_delay, fsync=options.fsync)
+
+    def __repr__(self):
+        return f"{self.name}<{self.options.spooldir}>({self.source!r})"
+
+    def _upload(self, entry : SpoolEntry):
+        target = self.source.object(entry.key)
+        if entry.op == OP_DELETE:
+            target.delete()
+            return
+        with entry.open() as f:
+            if entry.size <= STREAM_THRESHOLD:
+                target.put_bytes(f.read(), entry.encoding)
+                return
+            with target.put_file(binary=True, content_encoding=entry.encoding) as writer:
+                shutil.copyfileobj(f, writer, 1024 * 1024)
+
+    def secret(self, name) -> Secret:
+        return self.source.secret(name)
+
+    def object(self, key) -> Object:
+        return WriteBehindObject(self.ctx, key, self.source.object(key), self.spool)
+
+    def list(self, prefix:str = "", delimiter:Optional[str] = None) -> Iterator[ObjectInfo]:
+        return self.source.list(prefix, delimiter)
+
+    def flush(self, timeout:Optional[float] = None):
+        """Waits until every spooled write has been uploaded, see Spool.flush"""
+        self.spool.flush(timeout)
+
+    def stats(self) -> dict:
+        """Pending, in flight, uploaded, retried, coalesced and failed write counts, and unreadable spool files set aside"""
+        return self.spool.stats()
@@ -0,0 +1,116 @@
+import time
+from io import IOBase, TextIOWrapper
+from typing import Optional
+from ..object import Object, ObjectInfo, TextWriter
+from .spool import Spool, OP_DELETE
+
+
+class WriteBehindObject(Object):
+    def __init__(self, ctx, key:str, source:Object, spool:Spool):
+        """An object whose writes are spooled locally and uploaded in the background
+
+        `put_bytes`, `put_file` and `delete` return once the write is durable in the spool.
+        Reads of a key with a write still waiting in the spool are served from the spool.
+
+        Args:
+            ctx : Context : The context this object is part of
+            key : str : The object key
+            source : Object : The object in the wrapped backend
+            spool : Spool : The backend's upload spool
+        """
+        super().__init__(ctx, key)
+        self.source = source
+        self.spool = spool
+
+    def __repr__(self):
+        return f"WriteBehindObject<{self.key}>({self.source!r})"
+
+    def _pending(self):
+        """Opens the newest spooled write of the key, returns (entry, file), (entry, None) for a delete or None"""
+        entry = self.spool.latest(self.key)
+        while entry is not None:
+            if entry.op == OP_DELETE:
+                return entry, None
+            try:
+                return entry, entry.open()
+            except FileNotFoundError:
+                # removed since the lookup: superseded by a newer write, which is read instead,
+                # or uploaded, when it is still the newest and the source has it now
+                newer = self.spool.latest(self.key)
+                if newer is entry:
+                    return None
+                entry = newer
+        return None
+
+    def _missing(self):
+        raise FileNotFoundError(f"Object '{self.key}' was deleted")
+
+    def put_bytes(self, data : bytes, content_encoding : Optional[str] = None):
+        self.spool.put(self.key, data, content_encoding)
+
+    def put_file(self, binary:bool = True, content_encoding:Optional[str] = None) -> IOBase:
+        writer = self.spool.writer(self.key, encoding=content_encoding)
+        if binary:
+            return writer
+        return TextWriter(writer)
+
+    def get_bytes(self):
+        pending = self._pending()
+        if pending is None:
+            return self.source.get_bytes()
+        _, f = pending
+        if f is None:
+            self._missing()
+        with f:
+            return f.read()
+
+    def get_file(self, binary:bool = True) -> IOBase:
+        pending = self._pending()
+        if pending is None:
+            return self.source.get_file(binary)
+        _, f = pending
+        if f is None:
+            self._missing()
+        return f if binary else TextIOWrapper(f)
+
+    def get_content_encoding(self) -> Optional[str]:
+        entry = self.spool.latest(self.key)
+        if entry is None:
+            return self.source.get_content_encoding()
+        return entry.encoding
+
+    def get_file_with_encoding(self):
+        pending = self._pending()
+        if pending is None:
+            return self.source.get_file_with_encoding()
+        entry, f = pending
+        if f is None:
+            self._missing()
+        return f, entry.encoding
+
+    def get_range(self, offset:int, length:int) -> bytes:
+        if self.spool.latest(self.key) is None:
+            return self.source.get_range(offset, length)
+        return super().get_range(offset, length)
+
+    def get_ranges(self, ranges) -> list:
+        if self.spool.latest(self.key) is None:
+            return self.source.get_ranges(ranges)
+        return super().get_ranges(ranges)
+
+    def exists(self) -> bool:
+        entry = self.spool.latest(self.key)
+        if entry is None:
+            return self.source.exists()
+        return entry.op != OP_DELETE
+
+    def info(self) -> Optional[ObjectInfo]:
+        entry = self.spool.latest(self.key)
+        if entry is None:
+            return self.source.info()
+        if entry.op == OP_DELETE:
+            return None
+        return ObjectInfo(self.key, entry.size, time.time())
+
+    def delete(self):
+        self.spool.delete(self.key)
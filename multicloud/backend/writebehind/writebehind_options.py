@@ -0,0 +1,19 @@
+import os
+from ...common.config import Config
+from ...common.options import Options
+
+
+class WriteBehindOptions(Options):
+    """Upload spool settings resolved once per backend"""
+    __slots__ = ('spooldir', 'workers', 'retries', 'retry_delay', 'fsync')
+
+    def __init__(self, ctx, opts : Config):
+        self.resolve(ctx, opts, {
+            'spooldir': ('spooldir', os.path.join("~", ".cache", "multicloud", "spool", ctx.service)),
+            # uploader threads draining the spool, which bounds the concurrent uploads
+            'workers': ('workers', 4),
+            'retries': ('retries', 5),
+            'retry_delay': ('retry_delay', 1.0),
+            'fsync': ('fsync', True),
+        })
+        self._set('spooldir', os.path.expanduser(self.spooldir))
@@ -0,0 +1,343 @@
+import io
+from typing import Optional
+
+# bytes read from the underlying stream per decompression step
+READ_CHUNK = 256 * 1024
+
+
+class Codec:
+    """A streaming compression codec, named by its HTTP Content-Encoding"""
+    name = None
+    default_level = None
+
+    def __init__(self, level : Optional[int] = None):
+        self.level = self.default_level if level is None else int(level)
+
+    def __repr__(self):
+        return f"{type(self).__name__}<level={self.level}>"
+
+    def compressobj(self):
+        """Returns an object with compress(data) and flush() producing one complete frame"""
+        raise NotImplementedError("base class")
+
+    def decompressobj(self):
+        """Returns an object with decompress(data) for one frame"""
+        raise NotImplementedError("base class")
+
+    def compress(self, data) -> bytes:
+        compressor = self.compressobj()
+        return compressor.compress(data) + compressor.flush()
+
+    def decompress(self, data) -> bytes:
+        decompressor = self.decompressobj()
+        result = decompressor.decompress(data)
+        if not decompressor.eof:
+            raise EOFError(f"{self.name} data ended before the end of its frame")
+        return result
+
+    def writer(self, stream) -> 'CompressingWriter':
+        return CompressingWriter(self, stream)
+
+    def reader(self, stream) -> 'DecompressingReader':
+        return DecompressingReader(self, stream)
+
+
+class GzipCodec(Codec):
+    name = "gzip"
+    default_level = 6
+
+    def compressobj(self):
+        import zlib
+        return zlib.compressobj(self.level, zlib.DEFLATED, 31)
+
+    def decompressobj(self):
+        import zlib
+        return zlib.decompressobj(31)
+
+
+class ZstdCodec(Codec):
+    name = "zstd"
+    default_level = 3
+
+    def __init__(self, level : Optional[int] = None):
+        super().__init__(level)
+        self._zstd()
+
+    def _zstd(self):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("the zstd codec requires the 'zstandard' package")
+        return zstandard
+
+    def compressobj(self):
+        return self._zstd().ZstdCompressor(level=self.level).compressobj()
+
+    def decompressobj(self):
+        return self._zstd().ZstdDecompressor().decompressobj()
+
+    def reader(self, stream) -> 'ZstdDecompressingReader':
+        return ZstdDecompressingReader(self, stream)
+
+
+CODECS = { codec.name: codec for codec in (GzipCodec, ZstdCodec) }
+
+
+def get_codec(name : Optional[str], level : Optional[int] = None) -> Optional[Codec]:
+    """Returns the codec for a Content-Encoding name, None for no encoding
+
+    Raises:
+        ValueError : for an encoding that is not supported
+    """
+    if name is None or name == "identity":
+        return None
+    codec = CODECS.get(name)
+    if codec is None:
+        raise ValueError(f"Unsupported content encoding '{name}', expected one of {', '.join(CODECS)}")
+    return codec(level)
+
+
+class CompressingWriter(io.RawIOBase):
+    """Compresses everything written to it into another write stream
+
+    Closing the writer finishes the compressed frame and closes the underlying stream.  Closing
+    it from a `with` block that raised passes the exception on to the underlying stream, so
+    writers that support it (like the S3 multipart writer) abort instead of committing.
+    """
+
+    def __init__(self, codec : Codec, stream):
+        super().__init__()
+        self.stream = stream
+        self.compressor = codec.compressobj()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        data = memoryview(b).cast('B')
+        chunk = self.compressor.compress(data)
+        if chunk:
+            self.stream.write(chunk)
+        return len(data)
+
+    def close(self):
+        self._finish(None, None, None)
+
+    def _finish(self, exc_type, exc, tb):
+        if self.closed:
+            return
+        try:
+            if exc_type is None:
+                self.stream.write(self.compressor.flush())
+        except BaseException as e:
+            self.stream.__exit__(type(e), e, e.__traceback__)
+            raise
+        finally:
+            super().close()
+        self.stream.__exit__(exc_type, exc, tb)
+
+    def abort(self):
+        """Aborts the underlying stream without finishing the frame"""
+        if self.closed:
+            return
+        try:
+            self.stream.abort()
+        finally:
+            super().close()
+
+    def __exit__(self, exc_type, exc, tb):
+        self._finish(exc_type, exc, tb)
+
+
+class DecompressingReader(io.RawIOBase):
+    """Decompresses another read stream as it is read, holding at most one chunk's output
+
+    Each step decompresses at most READ_CHUNK bytes of output; input the decompressor could
+    not consume yet is fed back on the next step.  A stream that ends before its frame is
+    complete raises EOFError rather than returning the truncated data.
+    """
+
+    def __init__(self, codec : Codec, stream):
+        super().__init__()
+        self.codec = codec
+        self.stream = stream
+        self.decompressor = codec.decompressobj()
+        self._tail = b""
+        self._buffer = bytearray()
+        self._eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def _next(self) -> bytes:
+        """Returns the next piece of output, b"" at the end of the frame"""
+        decompressor = self.decompressor
+        while not decompressor.eof:
+            data = self._tail or self.stream.read(READ_CHUNK)
+            if not data:
+                raise EOFError(f"{self.codec.name} stream ended before the end of its frame")
+            output = decompressor.decompress(data, READ_CHUNK)
+            self._tail = decompressor.unconsumed_tail
+            if output:
+                return output
+        return b""
+
+    def _fill(self) -> bool:
+        """Decompresses the next chunk into the buffer, False at the end of the stream"""
+        while not self._buffer and not self._eof:
+            output = self._next()
+            if not output:
+                self._eof = True
+                break
+            self._buffer += output
+        return bool(self._buffer)
+
+    def readinto(self, b) -> int:
+        self._fill()
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        del self._buffer[:n]
+        return n
+
+    def readall(self) -> bytes:
+        chunks = []
+        while self._fill():
+            chunks.append(bytes(self._buffer))
+            self._buffer.clear()
+        return b"".join(chunks)
+
+    def skip(self, n : int) -> int:
+        """Decompresses and discards up to n bytes, returns the number skipped"""
+        skipped = 0
+        while skipped < n and self._fill():
+            step = min(n - skipped, len(self._buffer))
+            del self._buffer[:step]
+            skipped += step
+        return skipped
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self.stream.close()
+        finally:
+            super().close()
+
+
+class ZstdDecompressingReader(DecompressingReader):
+    """Decompresses a zstd stream with zstandard's stream reader, whose reads bound the output
+
+    The stream reader returns b"" for a truncated frame just as for a complete one, so the
+    compressed data is also passed through a ZstdFrameTracker to tell them apart.
+    """
+
+    def __init__(self, codec : ZstdCodec, stream):
+        io.RawIOBase.__init__(self)
+        self.codec = codec
+        self.stream = stream
+        self.tracker = ZstdFrameTracker()
+        self.decompressor = codec._zstd().ZstdDecompressor().stream_reader(
+            _TrackedStream(stream, self.tracker), read_size=READ_CHUNK, read_across_frames=True, closefd=False)
+        self._buffer = bytearray()
+        self._eof = False
+
+    def _next(self) -> bytes:
+        output = self.decompressor.read(READ_CHUNK)
+        if not output and not self.tracker.complete:
+            raise EOFError(f"{self.codec.name} stream ended before the end of its frame")
+        return output
+
+
+class _TrackedStream:
+    """A read stream that passes everything read through a tracker"""
+
+    def __init__(self, stream, tracker : 'ZstdFrameTracker'):
+        self.stream = stream
+        self.tracker = tracker
+
+    def read(self, size : int = -1) -> bytes:
+        data = self.stream.read(size)
+        self.tracker.feed(data)
+        return data
+
+
+ZSTD_MAGIC = 0xFD2FB528
+ZSTD_SKIPPABLE_MASK = 0xFFFFFFF0
+ZSTD_SKIPPABLE_MAGIC = 0x184D2A50
+
+
+class ZstdFrameTracker:
+    """Follows the frame and block headers of zstd data, skipping over the block contents
+
+    `complete` is True when the data fed so far ends on a frame boundary after at least one
+    frame, which is how a complete stream is told apart from a truncated one.
+    """
+
+    def __init__(self):
+        self.frames = 0
+        self._state = 'magic'
+        self._need = 4
+        self._header = bytearray()
+        self._skip = 0
+        self._checksum = False
+
+    @property
+    def complete(self) -> bool:
+        return self.frames > 0 and self._state == 'magic' and not self._header and not self._skip
+
+    def feed(self, data):
+        view = memoryview(data).cast('B')
+        i = 0
+        while i < len(view):
+            if self._skip:
+                step = min(self._skip, len(view) - i)
+                self._skip -= step
+                i += step
+                continue
+            step = min(self._need - len(self._header), len(view) - i)
+            self._header += view[i:i+step]
+            i += step
+            if len(self._header) == self._need:
+                header = bytes(self._header)
+                self._header.clear()
+                self._parse(header)
+
+    def _expect(self, state : str, need : int):
+        self._state = state
+        self._need = need
+
+    def _parse(self, header : bytes):
+        state = self._state
+        if state == 'magic':
+            magic = int.from_bytes(header, 'little')
+            if magic == ZSTD_MAGIC:
+                self._expect('descriptor', 1)
+            elif magic & ZSTD_SKIPPABLE_MASK == ZSTD_SKIPPABLE_MAGIC:
+                self._expect('skippable', 4)
+            else:
+                raise ValueError(f"not zstd data, frame magic {magic:#x}")
+        elif state == 'skippable':
+            self._skip = int.from_bytes(header, 'little')
+            self._expect('magic', 4)
+        elif state == 'descriptor':
+            descriptor = header[0]
+            single_segment = descriptor & 0x20
+            self._checksum = bool(descriptor & 0x04)
+            content_size = (1 if single_segment else 0, 2, 4, 8)[descriptor >> 6]
+            size = (0 if single_segment else 1) + (0, 1, 2, 4)[descriptor & 0x03] + content_size
+            self._skip = size
+            self._expect('block', 3)
+        elif state == 'block':
+            block = int.from_bytes(header, 'little')
+            last, kind, size = block & 1, (block >> 1) & 3, block >> 3
+            self._skip = 1 if kind == 1 else size
+            if not last:
+                self._expect('block', 3)
+            elif self._checksum:
+                self._expect('checksum', 4)
+            else:
+                self.frames += 1
+                self._expect('magic', 4)
+        elif state == 'checksum':
+            self.frames += 1
+            self._expect('magic', 4)
@@ -1,17 +1,51 @@
 from typing import Optional
-import yaml
+import os
+import threading
 #from ..autocontext import Context
 
+DEFAULT_CONFIG_PATH = "~/.jaws"
+
 class Config:
+    # parsed config files keyed by path, holding the (mtime, size) they were parsed at
+    _file_cache = {}
+    _file_cache_lock = threading.Lock()
+
     def __init__(self, config_dict: dict, parent: 'Config' = None):
         self.config = config_dict
         self.parent = parent
 
     @classmethod
     def from_yaml(cls, config_yaml_str: str):
+        import yaml
         config = yaml.load(config_yaml_str, yaml.loader.SafeLoader)
         return cls(config)
     
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_CONFIG_PATH) -> 'Config':
+        """Parses a YAML config file, reusing the parsed result until the file changes
+
+        The cached Config is shared between callers and must be treated as read-only.  It is
+        reparsed whenever the file's modification time or size differs from when it was cached.
+        """
+        path = os.path.abspath(os.path.expanduser(path))
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        cached = cls._file_cache.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        with open(path, "rt") as f:
+            config = cls.from_yaml(f.read())
+        with cls._file_cache_lock:
+            cls._file_cache[path] = (stamp, config)
+        return config
+
+    @classmethod
+    def file_stamp(cls, path: str = DEFAULT_CONFIG_PATH) -> tuple:
+        """Returns the identity used to cache a config file: (absolute path, mtime, size)"""
+        path = os.path.abspath(os.path.expanduser(path))
+        st = os.stat(path)
+        return (path, st.st_mtime_ns, st.st_size)
+
     def to_dict(self):
         return self.config
 
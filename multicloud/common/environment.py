@@ -1,8 +1,35 @@
 from copy import copy
+from functools import lru_cache
 import os
 import re
 #from ..autocontext import Context
 
+# ${env.VAR}, also accepted as ${env:VAR}
+INTERPOLATION_PATTERN = re.compile(r"\${(\w+)[.:](\w+)}")
+
+@lru_cache(maxsize=1024)
+def compile_template(sval : str):
+    """Splits a config string into literal text and variable references
+
+    Returns:
+        :tuple: (literal, var, literal, var, ..., literal), or None when sval has no references
+    """
+    if "${" not in sval:
+        return None
+    parts = []
+    pos = 0
+    for match in INTERPOLATION_PATTERN.finditer(sval):
+        system, var = match.group(1), match.group(2)
+        if system != "env":
+            raise ValueError(f"Unknown interpolation system '{system}' in '{sval}'")
+        parts.append(sval[pos:match.start()])
+        parts.append(var)
+        pos = match.end()
+    if not parts:
+        return None
+    parts.append(sval[pos:])
+    return tuple(parts)
+
 class Environment:
     def __init__(self, ctx : 'Context', environment : dict):
         self.ctx = ctx
@@ -19,17 +46,11 @@ class Environment:
         return self._environ.get(varname, os.environ.get(varname, default))
     
     def interpolate(self, sval):
-        environ = self._environ
-        pattern = re.compile(r"\${(\w+)\.(\w+)}")
-        while True:
-            match = pattern.search(sval)
-            if not match:
-                break
-            text = match.group(0)
-            sys = match.group(1)
-            var = match.group(2)
-            if sys == "env":
-                sval = sval.replace(text, self.getenv(var, ""))
-            else:
-                raise ValueError(f"Unknown interpolation system '{sys}' in '{sval}'")
-        return sval
\ No newline at end of file
+        """Substitutes ${env.VAR} references, using templates compiled once per distinct string"""
+        parts = compile_template(sval)
+        if parts is None:
+            return sval
+        values = list(parts)
+        for i in range(1, len(values), 2):
+            values[i] = str(self.getenv(values[i], ""))
+        return "".join(values)
@@ -0,0 +1,179 @@
+import bisect
+import threading
+from typing import Callable, Optional
+
+# upper bounds in seconds of the latency histogram buckets, the last bucket is unbounded
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class OpEvent:
+    """One completed operation, as passed to metrics listeners
+
+    Args:
+      backend :str: the backend name, e.g. AwsBackend
+      service :str: the context's service name
+      op :str: the operation, e.g. get_bytes or secret.get
+      key :str: the object key or secret name, None for backend wide operations
+      seconds :float: wall clock duration; for streams, from opening to closing the stream
+      nbytes :int: payload bytes read or written, 0 when not applicable
+      error :Exception: the exception the operation raised, None on success
+    """
+    __slots__ = ('backend', 'service', 'op', 'key', 'seconds', 'nbytes', 'error')
+
+    def __init__(self, backend : str, service : str, op : str, key : Optional[str], seconds : float,
+                 nbytes : int = 0, error : Optional[BaseException] = None):
+        self.backend = backend
+        self.service = service
+        self.op = op
+        self.key = key
+        self.seconds = seconds
+        self.nbytes = nbytes
+        self.error = error
+
+    def __repr__(self):
+        status = "ok" if self.error is None else type(self.error).__name__
+        return f"OpEvent<{self.backend}/{self.service}/{self.op}>({self.key}, {self.seconds*1000:.3f}ms, {self.nbytes}B, {status})"
+
+
+class OpStats:
+    """Count, errors, bytes and latency histogram of one (backend, service, op)"""
+    __slots__ = ('count', 'errors', 'bytes', 'seconds', 'buckets', 'lock')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.lock = threading.Lock()
+
+    def add(self, seconds : float, nbytes : int, error : bool):
+        slot = bisect.bisect_left(BUCKETS, seconds)
+        with self.lock:
+            self.count += 1
+            self.errors += error
+            self.bytes += nbytes
+            self.seconds += seconds
+            self.buckets[slot] += 1
+
+    def quantile(self, q : float) -> Optional[float]:
+        """Estimates the q-quantile in seconds as the upper bound of the bucket holding it"""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS + (float("inf"),), self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return bound
+        return None
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                'count': self.count,
+                'errors': self.errors,
+                'bytes': self.bytes,
+                'seconds': self.seconds,
+                'p50': self.quantile(0.5),
+                'p95': self.quantile(0.95),
+                'p99': self.quantile(0.99),
+                'buckets': dict(zip([ str(bound) for bound in BUCKETS ] + ["+Inf"], self.buckets)),
+            }
+
+
+class Metrics:
+    """Operation statistics of instrumented backends, with listeners called for every operation
+
+    Contexts whose service enables metrics (see create_metrics) record every object, secret and
+    bulk call of their backend here.  The statistics are kept per (backend, service, op) and
+    exported with `snapshot()`, `to_json()` or `to_prometheus()`.  Listeners are called
+    synchronously with an OpEvent after each operation, so they should be quick; exceptions
+    raised by a listener are counted in `listener_errors` and otherwise ignored.
+    """
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+        self.listeners = []
+        self.listener_errors = 0
+
+    def __repr__(self):
+        return f"Metrics<{len(self._stats)} series>"
+
+    def add_listener(self, listener : Callable[[OpEvent], None]):
+        self.listeners = self.listeners + [listener]
+
+    def remove_listener(self, listener : Callable[[OpEvent], None]):
+        self.listeners = [ other for other in self.listeners if other is not listener ]
+
+    def stats(self, backend : str, service : str, op : str) -> OpStats:
+        labels = (backend, service, op)
+        stats = self._stats.get(labels)
+        if stats is None:
+            with self._lock:
+                stats = self._stats.setdefault(labels, OpStats())
+        return stats
+
+    def record(self, backend : str, service : str, op : str, key : Optional[str], seconds : float,
+               nbytes : int = 0, error : Optional[BaseException] = None):
+        self.stats(backend, service, op).add(seconds, nbytes, error is not None)
+        listeners = self.listeners
+        if listeners:
+            event = OpEvent(backend, service, op, key, seconds, nbytes, error)
+            for listener in listeners:
+                try:
+                    listener(event)
+                except Exception:
+                    self.listener_errors += 1
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+
+    def snapshot(self) -> list:
+        """Statistics of every (backend, service, op) seen, latencies in seconds"""
+        with self._lock:
+            series = sorted(self._stats.items())
+        return [ dict(backend=backend, service=service, op=op, **stats.snapshot()) for (backend, service, op), stats in series ]
+
+    def to_json(self, indent : Optional[int] = None) -> str:
+        import json
+        return json.dumps(self.snapshot(), indent=indent)
+
+    def to_prometheus(self, prefix : str = "multicloud") -> str:
+        """Renders the statistics in the Prometheus text exposition format"""
+        lines = []
+        snapshot = self.snapshot()
+        counters = (('operations_total', 'count', 'Operations completed'),
+                    ('operation_errors_total', 'errors', 'Operations that raised'),
+                    ('operation_bytes_total', 'bytes', 'Payload bytes read or written'))
+        for name, field, help in counters:
+            lines.append(f"# HELP {prefix}_{name} {help}")
+            lines.append(f"# TYPE {prefix}_{name} counter")
+            for series in snapshot:
+                lines.append(f"{prefix}_{name}{{{_labels(series)}}} {series[field]}")
+        name = f"{prefix}_operation_seconds"
+        lines.append(f"# HELP {name} Operation latency")
+        lines.append(f"# TYPE {name} histogram")
+        for series in snapshot:
+            labels = _labels(series)
+            cumulative = 0
+            for bound, count in series['buckets'].items():
+                cumulative += count
+                lines.append(f"{name}_bucket{{{labels},le=\"{bound}\"}} {cumulative}")
+            lines.append(f"{name}_sum{{{labels}}} {series['seconds']}")
+            lines.append(f"{name}_count{{{labels}}} {series['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(series : dict) -> str:
+    escape = lambda value: str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+    return ",".join(f"{label}=\"{escape(series[label])}\"" for label in ('backend', 'service', 'op'))
+
+
+# the registry shared by every context with metrics enabled
+METRICS = Metrics()
+
+
+def get_metrics() -> Metrics:
+    """Returns the process-wide metrics registry"""
+    return METRICS
@@ -1,5 +1,4 @@
 import os
-import certifi
 from ..common.config import Config
 #from ..autocontext import Context
 
@@ -7,9 +6,16 @@ class Network:
 
     def __init__(self, ctx : 'Context', network_config : Config):
         self.ctx = ctx
-        self.cacerts = certifi.where()
         self.verify = network_config.get_value(ctx, 'verify', True)
-        self.cacerts = network_config.get_value(ctx, 'cacerts', certifi.where())
+        self._cacerts = network_config.get_value(ctx, 'cacerts')
+
+    @property
+    def cacerts(self) -> str:
+        """The certificate bundle, defaulting to certifi's which is only located when first needed"""
+        if self._cacerts is None:
+            import certifi
+            self._cacerts = certifi.where()
+        return self._cacerts
 
     def __repr__(self):
         return f'Network<{self.cacerts}>'
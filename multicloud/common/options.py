@@ -0,0 +1,32 @@
+from typing import Optional
+from .config import Config
+
+
+class Options:
+    """Backend settings resolved from a config section once, when the backend is built
+
+    Subclasses declare their settings in `__slots__` and assign them in `__init__` with
+    `_set()`.  The resolved object is read-only, so every handle created by the backend can
+    share it without copying or re-interpolating anything.
+    """
+    __slots__ = ()
+
+    def _set(self, name : str, value):
+        object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only, '{name}' cannot be set")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is read-only, '{name}' cannot be deleted")
+
+    def resolve(self, ctx, opts : Optional[Config], settings : dict):
+        """Resolves each setting from the config section
+
+        Args:
+            ctx : Context : The context used for ${env.X} interpolation
+            opts : Config : The backend config section, may be None
+            settings : dict : attribute name -> (config key, default)
+        """
+        for name, (key, default) in settings.items():
+            self._set(name, opts.get_value(ctx, key, default) if opts is not None else default)
@@ -1,4 +1,3 @@
-import platform
 import os
 from enum import Enum
 
@@ -15,6 +14,7 @@ g_runtime = None
 def detect_runtime():
     global g_runtime
     if not g_runtime:
+        import platform
         uname = platform.uname()
         if os.path.exists("/var/run/secrets/kubernetes.io") or "KUBERNETES_SERVICE_HOST" in os.environ:
             g_runtime = Runtime.KUBERNETES
@@ -0,0 +1,65 @@
+import threading
+from typing import Optional, Union
+
+from .autocontext import Context
+from .backend.secret import Secret
+from .common.config import Config
+
+_contexts = {}
+_lock = threading.Lock()
+
+
+def config_identity(config : Optional[Union[Config, dict, str]]) -> tuple:
+    """Identifies a configuration for the context registry
+
+    The default config file is identified by its path, modification time and size so that an
+    edited file yields new contexts.  Config objects, dicts and YAML strings are identified by
+    a hash of their content.
+    """
+    if config is None:
+        return ("file",) + Config.file_stamp()
+    import hashlib
+    import json
+    if isinstance(config, Config):
+        config = config.to_dict()
+    if isinstance(config, str):
+        content = config.encode()
+    else:
+        content = json.dumps(config, sort_keys=True, default=str).encode()
+    return ("content", hashlib.sha256(content).hexdigest())
+
+
+def get_context(service : str = "default", config : Optional[Union[Config, dict, str]] = None,
+                credentials : Optional[Secret] = None) -> Context:
+    """Returns the process-wide shared Context for a service and configuration
+
+    Contexts are cached by service name, configuration identity (see config_identity) and
+    credentials, so libraries can ask for a context as often as they like and share one backend,
+    its clients and its secret cache.  The backend itself is only built on first use.
+
+    Args:
+       service :str: The name of the service, see multicloud.Context
+       config :config: The service configuration, default ~/.jaws
+       credentials :Secret: Optional credentials for the backend
+    """
+    identity = config_identity(config)
+    key = (service, identity, id(credentials) if credentials is not None else None)
+    ctx = _contexts.get(key)
+    if ctx is not None:
+        return ctx
+    with _lock:
+        ctx = _contexts.get(key)
+        if ctx is None:
+            ctx = Context(service, config, credentials)
+            if identity[0] == "file":
+                # drop contexts built from earlier versions of the same file
+                for stale in [ k for k in _contexts if k[0] == service and k[1][:2] == identity[:2] and k[2] == key[2] ]:
+                    del _contexts[stale]
+            _contexts[key] = ctx
+    return ctx
+
+
+def clear_contexts():
+    """Forgets every shared context"""
+    with _lock:
+        _contexts.clear()
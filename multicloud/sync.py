@@ -0,0 +1,442 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Callable, Iterator, Optional, Tuple, Union
+
+from .autocontext import Context
+from .backend.object import ObjectInfo
+
+SCHEME = "mc://"
+# bytes copied per read while transferring
+COPY_CHUNK = 1024 * 1024
+# prefix of the temporary files written into a local destination
+TMP_PREFIX = ".mc-sync-"
+# manifest records are kept per endpoint pair under this directory by default
+MANIFEST_DIR = os.path.join("~", ".cache", "multicloud", "sync")
+
+
+class Entry:
+    """One file or object found in a tree
+
+    Args:
+      key :str: path relative to the tree root, '/' separated
+      size :int: size in bytes, if known
+      mtime :float: modification time as seconds since the epoch, if known
+      version :str: changes whenever the content may have changed (local mtime, or the ETag)
+    """
+    __slots__ = ('key', 'size', 'mtime', 'version')
+
+    def __init__(self, key : str, size : Optional[int], mtime : Optional[float], version : Optional[str]):
+        self.key = key
+        self.size = size
+        self.mtime = mtime
+        self.version = version
+
+    def __repr__(self):
+        return f"Entry<{self.key}>(size={self.size}, version={self.version})"
+
+    def state(self) -> list:
+        return [self.size, self.version]
+
+
+class LocalTree:
+    def __init__(self, root : str):
+        """A directory tree on the local filesystem
+
+        Args:
+            root : str : The directory, created when it is a destination
+        """
+        self.root = os.path.abspath(os.path.expanduser(root))
+        self.hashable = True
+
+    def __repr__(self):
+        return f"LocalTree<{self.root}>"
+
+    def path(self, key : str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def scan(self) -> Iterator[Entry]:
+        pending = [""]
+        while pending:
+            keydir = pending.pop()
+            try:
+                entries = os.scandir(os.path.join(self.root, keydir))
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.name.startswith(TMP_PREFIX):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(f"{keydir}{entry.name}/")
+                    elif entry.is_file():
+                        st = entry.stat()
+                        yield Entry(f"{keydir}{entry.name}", st.st_size, st.st_mtime, f"{st.st_mtime_ns:x}")
+
+    def open_read(self, key : str):
+        return open(self.path(key), "rb")
+
+    def write(self, key : str, reader, mtime : Optional[float]) -> str:
+        """Copies reader into the file, replacing it only once complete, and returns the sha256"""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = os.path.join(os.path.dirname(path), f"{TMP_PREFIX}{uuid.uuid4().hex}")
+        try:
+            with open(tmp_path, "wb") as f:
+                digest = copy_hashed(reader, f)
+            if mtime is not None:
+                os.utime(tmp_path, (mtime, mtime))
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        return digest
+
+    def hash(self, key : str) -> str:
+        with self.open_read(key) as f:
+            return copy_hashed(f, None)
+
+    def delete(self, key : str):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+
+class ServiceTree:
+    def __init__(self, ctx : Context, prefix : str = ""):
+        """The objects of a service under a key prefix
+
+        Args:
+            ctx : Context : The service's context
+            prefix : str : Only keys under this prefix are synced, and it is stripped from them
+        """
+        self.ctx = ctx
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        # hashing a remote object means downloading it
+        self.hashable = False
+
+    def __repr__(self):
+        return f"ServiceTree<{self.ctx.service}/{self.prefix}>"
+
+    def scan(self) -> Iterator[Entry]:
+        for info in self.ctx.list(self.prefix):
+            if info.is_prefix:
+                continue
+            yield Entry(info.key[len(self.prefix):], info.size, info.mtime, self._version(info))
+
+    @staticmethod
+    def _version(info : ObjectInfo) -> Optional[str]:
+        if info.etag is not None:
+            return info.etag
+        return None if info.mtime is None else repr(info.mtime)
+
+    def open_read(self, key : str):
+        return self.ctx.object(self.prefix + key).get_file(binary=True)
+
+    def write(self, key : str, reader, mtime : Optional[float]) -> str:
+        with self.ctx.object(self.prefix + key).put_file(binary=True) as writer:
+            return copy_hashed(reader, writer)
+
+    def delete(self, key : str):
+        self.ctx.object(self.prefix + key).delete()
+
+
+Tree = Union[LocalTree, ServiceTree]
+
+
+def copy_hashed(reader, writer) -> str:
+    """Copies a stream in COPY_CHUNK reads, returning the sha256 of what was copied
+
+    Args:
+        reader : IOBase : The binary stream read to its end
+        writer : IOBase : The binary stream written to, None to only hash
+    """
+    digest = hashlib.sha256()
+    while True:
+        chunk = reader.read(COPY_CHUNK)
+        if not chunk:
+            break
+        digest.update(chunk)
+        if writer is not None:
+            view = memoryview(chunk)
+            while view:
+                written = writer.write(view)
+                view = view[written:] if written is not None else view[len(view):]
+    return digest.hexdigest()
+
+
+def open_tree(spec : str, config=None) -> Tree:
+    """Returns the tree named by an endpoint
+
+    Endpoints are `mc://service/prefix` for a configured service, anything else is a local directory.
+
+    Args:
+        spec : str : The endpoint
+        config : Config : Service configuration, default ~/.jaws
+    """
+    if spec.startswith(SCHEME):
+        service, _, prefix = spec[len(SCHEME):].partition("/")
+        if not service:
+            raise ValueError(f"Endpoint '{spec}' does not name a service")
+        from .registry import get_context
+        return ServiceTree(get_context(service, config), prefix)
+    return LocalTree(spec)
+
+
+class Manifest:
+    def __init__(self, path : Optional[str]):
+        """What the previous syncs between two trees transferred
+
+        For every key it records the source and destination (size, version) after the last
+        transfer, and the sha256 of the content.  Unchanged pairs are skipped without reading
+        either side, and a local source whose mtime changed but whose content hash did not is
+        not transferred again.
+
+        Args:
+            path : str : The JSON file holding the records, None to keep them only in memory
+        """
+        self.path = path
+        self.records = {}
+        self._lock = threading.Lock()
+        if path is not None:
+            try:
+                with open(path, "r") as f:
+                    self.records = json.load(f)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def default_path(source : Tree, dest : Tree) -> str:
+        name = hashlib.sha256(f"{source!r}\n{dest!r}".encode('UTF-8')).hexdigest()[:24]
+        return os.path.join(os.path.expanduser(MANIFEST_DIR), f"{name}.json")
+
+    def get(self, key : str) -> Optional[dict]:
+        return self.records.get(key)
+
+    def set(self, key : str, record : Optional[dict]):
+        with self._lock:
+            if record is None:
+                self.records.pop(key, None)
+            else:
+                self.records[key] = record
+
+    def save(self):
+        if self.path is None:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with self._lock:
+            with open(tmp_path, "w") as f:
+                json.dump(self.records, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+
+class SyncResult:
+    """Keys transferred, deleted, skipped as unchanged and failed by one sync"""
+
+    def __init__(self):
+        self.transferred = []
+        self.deleted = []
+        self.skipped = 0
+        self.bytes = 0
+        self.errors = {}
+        self.seconds = 0.0
+
+    def __repr__(self):
+        return (f"SyncResult(transferred={len(self.transferred)}, deleted={len(self.deleted)}, skipped={self.skipped}, "
+                f"errors={len(self.errors)}, bytes={self.bytes})")
+
+    def raise_for_errors(self):
+        for key, error in self.errors.items():
+            raise RuntimeError(f"{len(self.errors)} keys failed to sync, first was '{key}'") from error
+
+
+class Sync:
+    def __init__(self, source : Tree, dest : Tree, manifest : Optional[Manifest] = None,
+                 delete : bool = False, checksum : bool = False, workers : int = 8):
+        """Makes dest hold the same files as source, transferring only what changed
+
+        A key is transferred when it is missing at the destination, or when either side
+        changed since the manifest recorded the last transfer.  Keys without a record are
+        compared by size and modification time, like rsync's quick check, or by sha256 with
+        `checksum` (which reads local files and downloads objects).  Those hashes and the
+        transfers run on a pool of `workers` threads, and with `delete` keys missing from the
+        source are removed from the destination once the transfers are done.
+
+        Args:
+            source : Tree : The tree copied from
+            dest : Tree : The tree copied to
+            manifest : Manifest : Records of earlier syncs, None to decide from the trees alone
+            delete : bool : Remove destination keys that are not in the source
+            checksum : bool : Compare content hashes of keys that have no manifest record
+            workers : int : Concurrent transfers
+        """
+        self.source = source
+        self.dest = dest
+        self.manifest = manifest if manifest is not None else Manifest(None)
+        self.delete = delete
+        self.checksum = checksum
+        self.workers = max(int(workers), 1)
+
+    def plan(self) -> Tuple[list, list, int]:
+        """Compares the trees, returns (entries to transfer, keys to delete, unchanged count)
+
+        Keys that can only be decided by hashing their content are hashed on the worker pool.
+        """
+        dest_entries = { entry.key: entry for entry in self.dest.scan() }
+        decisions = []
+        checks = []
+        source_keys = set()
+        for entry in self.source.scan():
+            source_keys.add(entry.key)
+            dst = dest_entries.get(entry.key)
+            changed = self._changed(entry, dst)
+            if changed is None:
+                checks.append((entry, dst))
+            decisions.append((entry, changed))
+        if checks:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(checks)), thread_name_prefix="multicloud-sync") as executor:
+                compared = dict(zip([ entry.key for entry, _ in checks ],
+                                    executor.map(lambda check: self._compare(*check), checks)))
+            decisions = [ (entry, compared[entry.key] if changed is None else changed) for entry, changed in decisions ]
+        transfers = [ entry for entry, changed in decisions if changed ]
+        deletes = sorted(key for key in dest_entries if key not in source_keys) if self.delete else []
+        return transfers, deletes, len(decisions) - len(transfers)
+
+    def _changed(self, src : Entry, dst : Optional[Entry]) -> Optional[bool]:
+        """Decides from the listings and the manifest, None when the content has to be compared"""
+        if dst is None:
+            return True
+        record = self.manifest.get(src.key)
+        if record is not None:
+            # the destination version is only learned from the listing after the transfer
+            dest_same = record['dst'] is None or record['dst'] == dst.state()
+            if dest_same and record['src'] == src.state():
+                if record['dst'] is None:
+                    # adopt the destination version written by the last transfer
+                    self.manifest.set(src.key, dict(record, dst=dst.state()))
+                return False
+            if dest_same and self.source.hashable and src.size == record['src'][0] and record['sha256'] is not None:
+                # maybe touched but not modified
+                return None
+            return True
+        if src.size != dst.size:
+            return True
+        if self.checksum:
+            return None
+        same = src.mtime is not None and dst.mtime is not None and dst.mtime >= src.mtime
+        if same:
+            self.manifest.set(src.key, { 'src': src.state(), 'dst': dst.state(), 'sha256': None })
+        return not same
+
+    def _compare(self, src : Entry, dst : Entry) -> bool:
+        """Decides what _changed could not by hashing the content, returns whether it changed"""
+        record = self.manifest.get(src.key)
+        if record is not None:
+            if self.source.hash(src.key) != record['sha256']:
+                return True
+            # touched but not modified
+            self.manifest.set(src.key, dict(record, src=src.state()))
+            return False
+        same = self._hash(self.source, src.key) == self._hash(self.dest, dst.key)
+        if same:
+            self.manifest.set(src.key, { 'src': src.state(), 'dst': dst.state(), 'sha256': None })
+        return not same
+
+    @staticmethod
+    def _hash(tree : Tree, key : str) -> str:
+        if tree.hashable:
+            return tree.hash(key)
+        with tree.open_read(key) as f:
+            return copy_hashed(f, None)
+
+    def _transfer(self, entry : Entry) -> str:
+        with self.source.open_read(entry.key) as reader:
+            digest = self.dest.write(entry.key, reader, entry.mtime)
+        self.manifest.set(entry.key, { 'src': entry.state(), 'dst': None, 'sha256': digest })
+        return digest
+
+    def _delete(self, key : str):
+        self.dest.delete(key)
+        self.manifest.set(key, None)
+
+    def run(self, dry_run : bool = False, progress : Optional[Callable[[str, str], None]] = None) -> SyncResult:
+        """Syncs the trees
+
+        Args:
+            dry_run : bool : Only plan, the result lists what would be transferred and deleted
+            progress : Callable : Called as progress(action, key) after each transfer or delete
+        """
+        start = time.perf_counter()
+        result = SyncResult()
+        transfers, deletes, result.skipped = self.plan()
+        if dry_run:
+            result.transferred = [ entry.key for entry in transfers ]
+            result.bytes = sum(entry.size or 0 for entry in transfers)
+            result.deleted = deletes
+            result.seconds = time.perf_counter() - start
+            return result
+        try:
+            self._run_pool(transfers, self._transfer, "put", result, result.transferred, progress)
+            if not result.errors:
+                # never delete after failed transfers, the source may not have been listed right
+                self._run_pool(deletes, self._delete, "delete", result, result.deleted, progress)
+        finally:
+            self.manifest.save()
+        transferred = set(result.transferred)
+        result.bytes = sum(entry.size or 0 for entry in transfers if entry.key in transferred)
+        result.seconds = time.perf_counter() - start
+        return result
+
+    def _run_pool(self, items : list, call : Callable, action : str, result : SyncResult, done : list, progress):
+        from concurrent.futures import ThreadPoolExecutor
+        if not items:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(items)), thread_name_prefix="multicloud-sync") as executor:
+            futures = [ (item, executor.submit(call, item)) for item in items ]
+            for item, future in futures:
+                key = item if isinstance(item, str) else item.key
+                try:
+                    future.result()
+                except Exception as e:
+                    result.errors[key] = e
+                    continue
+                done.append(key)
+                if progress is not None:
+                    progress(action, key)
+
+
+def sync(source : Union[str, Tree], dest : Union[str, Tree], delete : bool = False, dry_run : bool = False,
+         checksum : bool = False, workers : int = 8, manifest : Union[str, bool, None] = True,
+         config=None, progress : Optional[Callable[[str, str], None]] = None) -> SyncResult:
+    """Syncs a local directory and a service, or two services, in either direction
+
+    Args:
+        source : str : The endpoint copied from, a directory or mc://service/prefix
+        dest : str : The endpoint copied to
+        delete : bool : Remove destination keys that are not in the source
+        dry_run : bool : Only report what would be transferred and deleted
+        checksum : bool : Compare content hashes of keys without a manifest record
+        workers : int : Concurrent transfers
+        manifest : str : The manifest file, True for one per endpoint pair under MANIFEST_DIR, False for none
+        config : Config : Service configuration, default ~/.jaws
+        progress : Callable : Called as progress(action, key) after each transfer or delete
+
+    Example:
+        sync("./reports", "mc://archive/reports", delete=True).raise_for_errors()
+    """
+    source = open_tree(source, config) if isinstance(source, str) else source
+    dest = open_tree(dest, config) if isinstance(dest, str) else dest
+    if manifest is True:
+        manifest = Manifest.default_path(source, dest)
+    elif manifest is False:
+        manifest = None
+    return Sync(source, dest, Manifest(manifest), delete, checksum, workers).run(dry_run, progress)
@@ -3,13 +3,35 @@ from .backend import Backend
 from .common.network import Network
 from .common.environment import Environment
 from .common.config import Config
+from .errors import ConfigurationError
 from .backend.secret import Secret
+from .backend.secret_cache import SecretCache
 import os
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .common.metrics import Metrics
 
 
 
 def create_backend(ctx, backend_config : Config) -> Backend:
+    backend = _instrument(ctx, _create_base_backend(ctx, backend_config))
+    if backend_config is not None and backend_config.get_value(ctx, 'codec') is not None:
+        from .backend.codec.codec_backend import CodecBackend
+        from .backend.codec.codec_options import CodecOptions
+        backend = _instrument(ctx, CodecBackend(ctx, CodecOptions(ctx, backend_config), backend))
+    return backend
+
+
+def _instrument(ctx, backend : Backend) -> Backend:
+    metrics = getattr(ctx, 'metrics', None)
+    if metrics is None:
+        return backend
+    from .backend.instrumented.instrumented_backend import InstrumentedBackend
+    return InstrumentedBackend(ctx, backend, metrics)
+
+
+def _create_base_backend(ctx, backend_config : Config) -> Backend:
     if backend_config is None:
         rt = detect_runtime()
         if rt == Runtime.KUBERNETES:
@@ -29,15 +51,18 @@ def create_backend(ctx, backend_config : Config) -> Backend:
         #my_backend.create_backend(ctx, backend_config)
         from multicloud_aws.aws_backend import AwsBackend
         from multicloud_aws.aws_options import AwsOptions
-        options = AwsOptions(backend_config)
+        options = AwsOptions(ctx, backend_config)
         return AwsBackend(ctx, options)
     elif backend_type == 'tinyserver':
         from .backend.tiny.tiny_backend import TinyBackend
-        return TinyBackend(ctx)
+        return TinyBackend(ctx,
+                           url=backend_config.get_value(ctx, 'url'),
+                           socket_path=backend_config.get_value(ctx, 'socket'),
+                           token=backend_config.get_value(ctx, 'token'))
     elif backend_type == 'local':
         from .backend.local.local_backend import LocalBackend
-        return LocalBackend(ctx, 
-                            basedir=backend_config.get_value(ctx, 'basedir'))
+        from .backend.local.local_options import LocalOptions
+        return LocalBackend(ctx, LocalOptions(ctx, backend_config))
     elif backend_type == 'portable':
         from .backend.portable.portable_backend import PortableBackend
         return PortableBackend(ctx,
@@ -46,10 +71,30 @@ def create_backend(ctx, backend_config : Config) -> Backend:
                                )
     elif backend_type == 'nas':
         from .backend.nas.nas_backend import NasBackend
-        return NasBackend(ctx, 
-                          backend_config.get_value(ctx, 'server'), 
-                          backend_config.get_value(ctx, 'port'), 
-                          backend_config.get_value(ctx, 'secret'))
+        from .backend.nas.nas_options import NasOptions
+        return NasBackend(ctx, NasOptions(ctx, backend_config))
+    elif backend_type == 'caching':
+        from .backend.caching.caching_backend import CachingBackend
+        from .backend.caching.caching_options import CachingOptions
+        source_config = backend_config.get_section('source')
+        if source_config is None:
+            raise ConfigurationError("caching backend requires a 'source' backend section")
+        return CachingBackend(ctx, CachingOptions(ctx, backend_config), create_backend(ctx, source_config))
+    elif backend_type == 'writebehind':
+        from .backend.writebehind.writebehind_backend import WriteBehindBackend
+        from .backend.writebehind.writebehind_options import WriteBehindOptions
+        source_config = backend_config.get_section('source')
+        if source_config is None:
+            raise ConfigurationError("writebehind backend requires a 'source' backend section")
+        return WriteBehindBackend(ctx, WriteBehindOptions(ctx, backend_config), create_backend(ctx, source_config))
+    elif backend_type == 'replicated':
+        from .backend.replicated.replicated_backend import ReplicatedBackend
+        from .backend.replicated.replicated_options import ReplicatedOptions
+        replicas_config = backend_config.get_section('replicas')
+        if replicas_config is None:
+            raise ConfigurationError("replicated backend requires a 'replicas' section")
+        replicas = { name: create_backend(ctx, replicas_config.get_section(name)) for name in replicas_config.to_dict() }
+        return ReplicatedBackend(ctx, ReplicatedOptions(ctx, backend_config), replicas)
     else:
         library_name = backend_config.get_value(ctx, 'library')
         if library_name:
@@ -64,16 +109,16 @@ def create_backend(ctx, backend_config : Config) -> Backend:
 
 def create_network(ctx, network_config : Config) -> Network:
     if network_config is None:
-        import certifi
+        # an unset cacerts falls back to the certifi bundle when it is first used
         rt = detect_runtime()
         if rt == Runtime.KUBERNETES:
-            network_config = Config({ "cacerts": certifi.where() })
+            network_config = Config({})
         elif rt == Runtime.DOCKER:
-            network_config = Config({ "cacerts": certifi.where() })
+            network_config = Config({})
         elif rt == Runtime.MACOS:
             network_config = Config({ "cacerts": "~/etc/CombinedCA.cer" })
         elif rt == Runtime.WINDOWS:
-            network_config = Config({ "cacerts": certifi.where() })
+            network_config = Config({})
         else:
             raise NotImplementedError(f"Unable to create network for {rt}")
     return Network(ctx, network_config)
@@ -83,4 +128,28 @@ def create_environment(ctx, environment_config : Config) -> Environment:
         environment_config = {}
     else:
         environment_config = environment_config.to_dict()
-    return Environment(ctx, environment_config)
\ No newline at end of file
+    return Environment(ctx, environment_config)
+
+def create_metrics(ctx, metrics_config : Config) -> Optional['Metrics']:
+    """Returns the metrics registry when the service enables metrics, None otherwise
+
+    Metrics are enabled with `enabled: true` in the service's metrics section, or for every
+    service by setting MULTICLOUD_METRICS=1 in the process environment.
+    """
+    if metrics_config is not None:
+        enabled = metrics_config.get_value(ctx, 'enabled', True)
+    else:
+        enabled = os.environ.get('MULTICLOUD_METRICS', False)
+    if str(enabled).lower() in ('', '0', 'false', 'no', 'off'):
+        return None
+    from .common.metrics import get_metrics
+    return get_metrics()
+
+def create_secret_cache(ctx, cache_config : Config) -> Optional[SecretCache]:
+    if cache_config is None:
+        return None
+    ttl = cache_config.get_value(ctx, 'ttl', 300)
+    max_size = cache_config.get_value(ctx, 'max_size', 256)
+    if float(ttl) <= 0 or int(max_size) <= 0:
+        return None
+    return SecretCache(ttl, max_size)
@@ -1,48 +1,129 @@
 import boto3.session
 from multicloud.backend import Backend
 from multicloud.backend.secret import Secret
-from multicloud.backend.object import Object
+from multicloud.backend.object import Object, ObjectInfo
+from multicloud.backend.bulk import BulkResult, run_bulk
 from .aws_secret import AwsSecret
 from .aws_object import AwsObject
 from .aws_options import AwsOptions
+from typing import Iterable, Iterator, Optional
+import threading
 import boto3
 
+# DeleteObjects accepts at most 1000 keys per request
+DELETE_BATCH_SIZE = 1000
+
 class AwsBackend(Backend):
     def __init__(self, ctx, options : AwsOptions):
-        super().__init__(ctx, "LocalBackend")
+        super().__init__(ctx, "AwsBackend")
+        self.options = options
         self.bucket = options.bucket
         self.region = options.region
-        assert(ctx.credentials is not None, "AWS Backend requires credentials to be provided in the context")
+        assert ctx.credentials is not None, "AWS Backend requires credentials to be provided in the context"
         creds = ctx.credentials.get()
-        self.session = boto3.session.Session( 
-            aws_access_key_id=creds['access_id'], 
-            aws_secret_access_key=creds['secret_key'], 
+        self.session = boto3.session.Session(
+            aws_access_key_id=creds['access_id'],
+            aws_secret_access_key=creds['secret_key'],
             aws_session_token=creds.get('session_token', None)
         )
+        self._clients = {}
+        self._clients_lock = threading.Lock()
+
+    def client(self, service_name : str, region : Optional[str] = None):
+        """Returns the shared botocore client for a service, building it on first use
+
+        Clients are cached per (service, region) so that every handle created from this
+        backend reuses the same service model and connection pool.  botocore clients are
+        thread safe once built, but the session that builds them is not, so construction
+        is serialized.
+
+        Args:
+            service_name : str : The AWS service, e.g. 's3' or 'secretsmanager'
+            region : Optional[str] : The region to connect to, default is the backend region
+        """
+        if region is None:
+            region = self.region
+        key = (service_name, region)
+        client = self._clients.get(key)
+        if client is None:
+            with self._clients_lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = self.session.client(
+                        service_name=service_name,
+                        region_name=region,
+                        config=self.options.client_config()
+                    )
+                    self._clients[key] = client
+        return client
 
     def secret(self, name) -> Secret:
-        client = self.session.client(
-            service_name='secretsmanager',
-            region_name=self.region
-        )
-        return AwsSecret(self.ctx, name, client)
+        return AwsSecret(self.ctx, name, self.client('secretsmanager'))
 
     def object(self, key) -> Object:
-        client = self.session.client(
-            service_name='s3',
-            region_name=self.region
-        )
-        return AwsObject(self.ctx, key, self.bucket, client)
+        return AwsObject(self.ctx, key, self.bucket, self.client('s3'), self.options)
+
+    def list(self, prefix:str = "", delimiter:Optional[str] = None) -> Iterator[ObjectInfo]:
+        """Lists the bucket with the list_objects_v2 paginator, one page of up to 1000 keys at a time"""
+        args = { 'Bucket': self.bucket, 'Prefix': prefix }
+        if delimiter:
+            args['Delimiter'] = delimiter
+        args.update(self.options.s3args_payer())
+        paginator = self.client('s3').get_paginator('list_objects_v2')
+        for page in paginator.paginate(**args):
+            for item in page.get('CommonPrefixes', []):
+                yield ObjectInfo(item['Prefix'], is_prefix=True)
+            for item in page.get('Contents', []):
+                yield ObjectInfo(item['Key'], item['Size'], item['LastModified'].timestamp(), item.get('ETag'))
+
+    def delete_many(self, keys:Iterable[str], max_workers:Optional[int] = None) -> BulkResult:
+        """Deletes many objects with DeleteObjects, 1000 keys per request, sending batches concurrently"""
+        def delete_batch(_, batch):
+            response = self.client('s3').delete_objects(
+                Bucket=self.bucket,
+                Delete={ 'Objects': [ { 'Key': key } for key in batch ], 'Quiet': True },
+                **self.options.s3args_payer()
+            )
+            return { error['Key']: error for error in response.get('Errors', []) }
+
+        batches = {}
+        def batched():
+            batch = []
+            for key in keys:
+                batch.append(key)
+                if len(batch) == DELETE_BATCH_SIZE:
+                    batches[len(batches)] = batch
+                    yield len(batches) - 1, batch
+                    batch = []
+            if batch:
+                batches[len(batches)] = batch
+                yield len(batches) - 1, batch
+
+        outcome = run_bulk(delete_batch, batched(), max_workers or self.bulk_workers)
+        result = BulkResult()
+        for index, batch in batches.items():
+            if index in outcome.errors:
+                for key in batch:
+                    result.errors[key] = outcome.errors[index]
+                continue
+            failed = outcome.results[index]
+            for key in batch:
+                if key in failed:
+                    error = failed[key]
+                    result.errors[key] = RuntimeError(f"Unable to delete '{key}': {error.get('Code')} {error.get('Message')}")
+                else:
+                    result.results[key] = None
+        return result
 
-def create_backend(ctx, backend_config : dict) -> Backend:
+def create_backend(ctx, backend_config) -> Backend:
     if backend_config is None:
         raise ValueError("Backend configuration is required")
 
-    assert('type' in backend_config)
-    if backend_config['type'] == 'aws':
-        options = AwsOptions(backend_config)
-        return AwsBackend(ctx, backend_config['region'], backend_config['bucket'])
+    backend_type = backend_config.get_value(ctx, 'type')
+    if backend_type == 'aws':
+        options = AwsOptions(ctx, backend_config)
+        return AwsBackend(ctx, options)
     else:
-        raise ValueError(f"Unsupported backend type: {backend_config['type']}")
+        raise ValueError(f"Unsupported backend type: {backend_type}")
 
 
@@ -1,44 +1,102 @@
-from io import IOBase, BytesIO
-from multicloud.backend.object import Object
+from io import IOBase, TextIOWrapper
+from concurrent.futures import ThreadPoolExecutor
+import tempfile
+from botocore.exceptions import ClientError
+from typing import Optional
+from multicloud.backend.object import Object, ObjectInfo, TextWriter, check_range
 from multicloud.autocontext import Context
 from .aws_options import AwsOptions
+from .aws_transfer import MultipartWriter, ParallelDownloader
 
-from typing import Callable
-
-class ObjectIO(BytesIO):
-    def __init__(self, object_write : Callable[[bytes], None], *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.object_write = object_write
-
-    def close(self):
-        self.object_write(self.getvalue())
-        super().close()
 
 class AwsObject(Object):
-    options = AwsOptions
-
-
-    def __init__(self, ctx:Context, key:str, bucket:str, client):
+    def __init__(self, ctx:Context, key:str, bucket:str, client, options:AwsOptions):
         super().__init__(ctx, key)
         self.client = client
-        self.bucket = ctx.environment.interpolate(bucket)
+        self.options = options
+        self.bucket = bucket
         #print(f"AwsObject<{self.bucket}>({key})")
 
-    def put_bytes(self, data : bytes):
+    def _put_args(self, content_encoding : Optional[str]) -> dict:
+        args = self.options.s3args_put_object()
+        if content_encoding is not None:
+            args['ContentEncoding'] = content_encoding
+        return args
+
+    def put_bytes(self, data : bytes, content_encoding : Optional[str] = None):
         response = self.client.put_object(
             Body=data,
             Bucket=self.bucket,
             Key=self.key,
-            #ServerSideEncryption='AES256'|'aws:kms'|'aws:kms:dsse',
-            #RequestPayer='requester',
+            **self._put_args(content_encoding)
+        )
+
+    def put_file(self, binary:bool = True, content_encoding:Optional[str] = None) -> IOBase:
+        """Opens a stream that uploads the object with S3 multipart upload as it is written.
+
+        Parts of `MultipartPartSize` bytes are uploaded in the background, with up to
+        `MultipartConcurrency` parts in flight.  The upload is completed on close, or
+        aborted if the stream is closed from a `with` block that raised.
+
+        Args:
+            binary (bool, optional): Whether to write the file in binary mode. Defaults to True.
+            content_encoding (str, optional): Stored as the object's ContentEncoding. Defaults to None.
+
+        Returns:
+            IOBase: A file-like object for writing the object data.
+        """
+        writer = MultipartWriter(
+            self.client, self.bucket, self.key,
+            part_size=self.options.multipart_part_size,
+            concurrency=self.options.multipart_concurrency,
+            extra_args=self._put_args(content_encoding),
+            payer_args=self.options.s3args_payer()
+        )
+        if binary:
+            return writer
+        return TextWriter(writer)
+
+    def _downloader(self) -> ParallelDownloader:
+        return ParallelDownloader(
+            self.client, self.bucket, self.key,
+            chunk_size=self.options.download_chunk_size,
+            concurrency=self.options.download_concurrency,
+            extra_args=self.options.s3args_payer()
         )
 
-    def put_file(self, binary:bool = True) -> IOBase:
-        ios = ObjectIO(self.put_bytes)
-        return ios
+    def get_bytes(self) -> bytes:
+        """Reads the whole object.
+
+        With `ParallelDownload` enabled, objects larger than `DownloadChunkSize` are fetched
+        as concurrent ranged GETs into a single preallocated buffer, which is copied once into
+        the returned bytes.  `get_buffer()` returns a view of that buffer without the copy.
+        """
+        data = self._read()
+        return data if isinstance(data, bytes) else bytes(data)
+
+    def get_buffer(self) -> memoryview:
+        """Returns a read-only buffer over the whole object
+
+        With `ParallelDownload` enabled, large objects are downloaded straight into the buffer
+        the view is over, so nothing is copied.
+        """
+        return memoryview(self._read()).toreadonly()
 
-    def get_bytes(self):
-        response = self.client.get_object(Bucket=self.bucket, Key=self.key)
+    def _read(self):
+        """Returns the object as bytes, or as the bytearray a parallel download filled"""
+        if self.options.parallel_download:
+            downloader = self._downloader()
+            size, etag, response = downloader.first_range()
+            if response is not None:
+                if size > downloader.chunk_size:
+                    return downloader.into_buffer(size, etag, response['Body'])
+                # the first range holds the whole object
+                body = response['Body']
+                try:
+                    return body.read()
+                finally:
+                    body.close()
+        response = self.client.get_object(Bucket=self.bucket, Key=self.key, **self.options.s3args_payer())
         return response['Body'].read()
 
     def get_file(self, binary:bool = True) -> IOBase:
@@ -49,13 +107,83 @@ class AwsObject(Object):
 
         Returns:
             IOBase: A file-like object for reading the object data.
+
+        With `ParallelDownload` enabled, objects larger than `DownloadChunkSize` are first
+        fetched as concurrent ranged GETs into an anonymous temporary file, and the returned
+        stream reads from that file.
+        """
+        if self.options.parallel_download:
+            downloader = self._downloader()
+            size, etag, response = downloader.first_range()
+            if response is not None and size > downloader.chunk_size:
+                spool = tempfile.TemporaryFile()
+                try:
+                    downloader.into_file(spool, size, etag, response['Body'])
+                except BaseException:
+                    spool.close()
+                    raise
+                return spool if binary else TextIOWrapper(spool)
+            if response is not None:
+                # the first range holds the whole object
+                return response['Body'] if binary else TextIOWrapper(response['Body'])
+        response = self.client.get_object(Bucket=self.bucket, Key=self.key, **self.options.s3args_payer())
+        return response['Body'] if binary else TextIOWrapper(response['Body'])
+
+    def get_content_encoding(self) -> Optional[str]:
+        response = self.client.head_object(Bucket=self.bucket, Key=self.key, **self.options.s3args_payer())
+        return response.get('ContentEncoding')
+
+    def get_file_with_encoding(self):
+        """Opens the object with a single GET that also returns its ContentEncoding"""
+        response = self.client.get_object(Bucket=self.bucket, Key=self.key, **self.options.s3args_payer())
+        return response['Body'], response.get('ContentEncoding')
+
+    def get_range(self, offset:int, length:int) -> bytes:
+        """Reads part of the object with an HTTP Range request"""
+        check_range(offset, length)
+        if length == 0:
+            return b""
+        try:
+            response = self.client.get_object(
+                Bucket=self.bucket, Key=self.key,
+                Range=f"bytes={offset}-{offset+length-1}",
+                **self.options.s3args_payer()
+            )
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') == 'InvalidRange':
+                return b""
+            raise
+        return response['Body'].read()
+
+    def get_ranges(self, ranges) -> list:
+        """Reads several parts of the object as concurrent Range requests
+
+        S3 serves a single range per request, so up to `DownloadConcurrency` requests are issued at once.
         """
-        response = self.client.get_object(Bucket=self.bucket, Key=self.key)
-        return response['Body']
+        ranges = list(ranges)
+        for offset, length in ranges:
+            check_range(offset, length)
+        workers = min(int(self.options.download_concurrency), len(ranges))
+        if workers <= 1:
+            return [ self.get_range(offset, length) for offset, length in ranges ]
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="s3-range") as executor:
+            return list(executor.map(lambda r: self.get_range(*r), ranges))
 
     def exists(self) -> bool:
         try:
-            self.client.head_object(Bucket=self.bucket, Key=self.key)
+            self.client.head_object(Bucket=self.bucket, Key=self.key, **self.options.s3args_payer())
             return True
         except self.client.exceptions.ClientError:
             return False
+
+    def info(self) -> Optional[ObjectInfo]:
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=self.key, **self.options.s3args_payer())
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+        return ObjectInfo(self.key, response['ContentLength'], response['LastModified'].timestamp(), response.get('ETag'))
+
+    def delete(self):
+        self.client.delete_object(Bucket=self.bucket, Key=self.key, **self.options.s3args_payer())
@@ -1,6 +1,7 @@
 from enum import Enum
 from typing import Optional
 from multicloud.common.config import Config
+from multicloud.common.options import Options
 
 class S3Sse(Enum):
     #ServerSideEncryption='AES256'|'aws:kms'|'aws:kms:dsse',
@@ -11,20 +12,59 @@ class S3Sse(Enum):
 class S3Payer(Enum):
     REQUESTER = "requester"
 
-class AwsOptions:
-    def __init__(self, opts : Config):
-        self.ServerSideEncryption = opts.get_value(ctx, 'ServerSideEncryption', None)
-        self.RequestPayer = opts.get_value(ctx, 'RequestPayer', None)
-        self.region = opts.get_value(ctx, 'Region', None)
-        self.bucket = opts.get_value(ctx, 'Bucket', None)
+class AwsOptions(Options):
+    """S3 settings resolved once per backend and shared, read-only, by every handle"""
+    __slots__ = (
+        'ServerSideEncryption', 'RequestPayer', 'region', 'bucket',
+        'max_pool_connections', 'connect_timeout', 'read_timeout', 'retry_mode', 'max_attempts',
+        'multipart_part_size', 'multipart_concurrency',
+        'parallel_download', 'download_chunk_size', 'download_concurrency',
+        '_put_object_args', '_payer_args',
+    )
+
+    def __init__(self, ctx, opts : Config):
+        self.resolve(ctx, opts, {
+            'ServerSideEncryption': ('ServerSideEncryption', None),
+            'RequestPayer': ('RequestPayer', None),
+            'region': ('Region', None),
+            'bucket': ('Bucket', None),
+            # botocore client tuning, shared by every handle created from the backend
+            'max_pool_connections': ('MaxPoolConnections', 10),
+            'connect_timeout': ('ConnectTimeout', 60),
+            'read_timeout': ('ReadTimeout', 60),
+            'retry_mode': ('RetryMode', 'standard'),
+            'max_attempts': ('MaxAttempts', 3),
+            # multipart upload used by AwsObject.put_file
+            'multipart_part_size': ('MultipartPartSize', 8 * 1024 * 1024),
+            'multipart_concurrency': ('MultipartConcurrency', 4),
+            # opt-in parallel ranged download used by AwsObject.get_bytes/get_file
+            'parallel_download': ('ParallelDownload', False),
+            'download_chunk_size': ('DownloadChunkSize', 8 * 1024 * 1024),
+            'download_concurrency': ('DownloadConcurrency', 8),
+        })
+        self._set('_put_object_args', self.populate(['ServerSideEncryption', 'RequestPayer']))
+        self._set('_payer_args', self.populate(['RequestPayer']))
 
     def populate(self, opts):
         dd = {}
         for opt in opts:
-            v = self.__getattribute__(self, opt)
+            v = getattr(self, opt)
             if v is not None:
-                dd[opt] = v.value
+                dd[opt] = v.value if isinstance(v, Enum) else v
         return dd
 
     def s3args_put_object(self):
-        return self.populate(['ServerSideEncryption', 'RequestPayer'])
+        return dict(self._put_object_args)
+
+    def s3args_payer(self):
+        return dict(self._payer_args)
+
+    def client_config(self):
+        """Returns the botocore client configuration built from the backend options"""
+        from botocore.config import Config as BotoConfig
+        return BotoConfig(
+            max_pool_connections=int(self.max_pool_connections),
+            connect_timeout=self.connect_timeout,
+            read_timeout=self.read_timeout,
+            retries={ 'mode': self.retry_mode, 'max_attempts': int(self.max_attempts) }
+        )
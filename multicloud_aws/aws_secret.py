@@ -1,6 +1,5 @@
 import os
 import json
-from keyring import get_password, set_password
 from multicloud.backend.secret import Secret
 import boto3
 import sys
@@ -0,0 +1,291 @@
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from botocore.exceptions import ClientError
+
+# S3 rejects multipart parts smaller than 5 MiB (other than the last one)
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10_000
+
+
+class MultipartWriter(io.RawIOBase):
+    """A write-only stream that uploads to S3 using multipart upload
+
+    Data is cut into parts of `part_size` bytes, and each part is uploaded on a
+    thread pool as soon as it fills.  At most `concurrency` parts are in flight,
+    so `write()` blocks when the uploads fall behind and memory stays bounded to
+    roughly part_size * (concurrency + 1).
+
+    Objects smaller than one part are sent with a single `put_object` on close.
+    If the writer is closed from a `with` block that raised, or `abort()` is
+    called, the multipart upload is aborted and nothing is stored.
+    """
+
+    def __init__(self, client, bucket : str, key : str, part_size : int, concurrency : int,
+                 extra_args : Optional[dict] = None, payer_args : Optional[dict] = None):
+        """
+        Args:
+            client : The S3 client
+            bucket : str : Destination bucket
+            key : str : Destination key
+            part_size : int : Size of each uploaded part, at least 5 MiB
+            concurrency : int : Maximum number of parts uploading at once
+            extra_args : Optional[dict] : Additional arguments for put_object / create_multipart_upload
+            payer_args : Optional[dict] : RequestPayer arguments repeated on every part request
+        """
+        super().__init__()
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = max(int(part_size), MIN_PART_SIZE)
+        self.concurrency = max(int(concurrency), 1)
+        self.extra_args = extra_args or {}
+        self.payer_args = payer_args or {}
+        self.upload_id = None
+        self._buffer = bytearray()
+        self._parts = []
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._executor = None
+        self._aborted = False
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        if self.closed:
+            raise ValueError("write to closed file")
+        data = memoryview(b).cast('B')
+        pos = 0
+        while pos < len(data):
+            take = min(self.part_size - len(self._buffer), len(data) - pos)
+            self._buffer += data[pos:pos+take]
+            pos += take
+            if len(self._buffer) >= self.part_size:
+                self._submit_part(bytes(self._buffer))
+                self._buffer = bytearray()
+        return len(data)
+
+    def _start(self):
+        response = self.client.create_multipart_upload(
+            Bucket=self.bucket, Key=self.key, **self.extra_args)
+        self.upload_id = response['UploadId']
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="s3-multipart")
+
+    def _upload_part(self, part_number : int, data : bytes) -> dict:
+        try:
+            response = self.client.upload_part(
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                PartNumber=part_number, Body=data, **self.payer_args)
+            return { 'PartNumber': part_number, 'ETag': response['ETag'] }
+        finally:
+            self._slots.release()
+
+    def _submit_part(self, data : bytes):
+        if self.upload_id is None:
+            self._start()
+        for _, future in self._parts:
+            if future.done() and future.exception() is not None:
+                raise future.exception()
+        part_number = len(self._parts) + 1
+        if part_number > MAX_PARTS:
+            raise ValueError(f"Object '{self.key}' exceeds {MAX_PARTS} parts, increase the part size")
+        self._slots.acquire()
+        self._parts.append((part_number, self._executor.submit(self._upload_part, part_number, data)))
+
+    def abort(self):
+        """Aborts the upload, discarding any parts already sent"""
+        if self.closed:
+            return
+        self._aborted = True
+        self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._aborted:
+                self._abort_upload()
+            elif self.upload_id is None:
+                self.client.put_object(
+                    Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer), **self.extra_args)
+            else:
+                try:
+                    if self._buffer:
+                        self._submit_part(bytes(self._buffer))
+                    parts = [ future.result() for _, future in self._parts ]
+                    self.client.complete_multipart_upload(
+                        Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                        MultipartUpload={ 'Parts': parts }, **self.payer_args)
+                except BaseException:
+                    self._abort_upload()
+                    raise
+        finally:
+            self._buffer = bytearray()
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+            super().close()
+
+    def _abort_upload(self):
+        if self.upload_id is None:
+            return
+        for _, future in self._parts:
+            future.cancel()
+        self._executor.shutdown(wait=True)
+        self.client.abort_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, **self.payer_args)
+        self.upload_id = None
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self._aborted = True
+        self.close()
+
+
+def byte_ranges(size : int, chunk_size : int):
+    """Splits an object of `size` bytes into inclusive (first, last) byte ranges"""
+    chunk_size = max(int(chunk_size), 1)
+    return [ (start, min(start + chunk_size, size) - 1) for start in range(0, size, chunk_size) ]
+
+
+class ParallelDownloader:
+    """Downloads an S3 object as concurrent ranged GETs
+
+    The first range is requested on its own and its Content-Range gives the object size and
+    ETag; the object is split into ranges of `chunk_size` bytes, and the remaining ranges are
+    fetched on a thread pool while the first is read.  Each range is
+    read straight into its slice of the destination, either one preallocated
+    buffer or an open file, so the parts are never concatenated.  Every range
+    request carries `If-Match` so a concurrent overwrite fails the download rather
+    than mixing two versions of the object.
+    """
+    READ_BLOCK = 1024 * 1024
+
+    def __init__(self, client, bucket : str, key : str, chunk_size : int, concurrency : int,
+                 extra_args : Optional[dict] = None):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.chunk_size = max(int(chunk_size), 1)
+        self.concurrency = max(int(concurrency), 1)
+        self.extra_args = extra_args or {}
+
+    def first_range(self):
+        """GETs the first chunk of the object
+
+        The object's size and ETag are read from the response's Content-Range, so the download
+        needs no HEAD, and the response body is the download's first range.  A server that
+        ignores the range answers with the whole object.
+
+        Returns:
+            :tuple: (size, etag, response), or (0, None, None) for an empty object, which has
+              no byte range to request
+        """
+        try:
+            response = self.client.get_object(
+                Bucket=self.bucket, Key=self.key, Range=f"bytes=0-{self.chunk_size-1}", **self.extra_args)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') == 'InvalidRange':
+                return 0, None, None
+            raise
+        content_range = response.get('ContentRange')
+        size = int(content_range.rsplit("/", 1)[1]) if content_range else response['ContentLength']
+        return size, response.get('ETag'), response
+
+    def _get_range(self, first : int, last : int, etag : Optional[str]):
+        args = dict(self.extra_args)
+        if etag is not None:
+            args['IfMatch'] = etag
+        response = self.client.get_object(
+            Bucket=self.bucket, Key=self.key, Range=f"bytes={first}-{last}", **args)
+        return response['Body']
+
+    def _run(self, ranges, fetch):
+        if not ranges:
+            return
+        if len(ranges) == 1:
+            fetch(ranges[0])
+            return
+        workers = min(self.concurrency, len(ranges))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="s3-download") as executor:
+            for future in [ executor.submit(fetch, r) for r in ranges ]:
+                future.result()
+
+    def _first(self, size : Optional[int], etag : Optional[str], first):
+        """Returns (size, etag, first body), requesting the first range when size is not known"""
+        if size is None:
+            size, etag, response = self.first_range()
+            first = None if response is None else response['Body']
+        return size, etag, first
+
+    def into_buffer(self, size : Optional[int] = None, etag : Optional[str] = None, first = None) -> bytearray:
+        """Downloads the whole object into a single preallocated bytearray
+
+        Args:
+            size : int : The object size, from `first_range()` which is called when it is None
+            etag : str : The object's ETag, every range must match it
+            first : The body of the `first_range()` response, read as the first range
+        """
+        size, etag, first = self._first(size, etag, first)
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+
+        def fetch(byte_range):
+            first_byte, last = byte_range
+            body = first if first_byte == 0 and first is not None else self._get_range(first_byte, last, etag)
+            try:
+                pos = first_byte
+                while pos <= last:
+                    n = body.readinto(view[pos:last+1])
+                    if n == 0:
+                        raise IOError(f"Short read on '{self.key}' range {first_byte}-{last}")
+                    pos += n
+            finally:
+                body.close()
+
+        self._run(byte_ranges(size, self.chunk_size), fetch)
+        return buffer
+
+    def into_file(self, fobj, size : Optional[int] = None, etag : Optional[str] = None, first = None):
+        """Downloads the whole object into an open binary file, writing each range at its offset
+
+        The arguments after fobj are those of `into_buffer`.
+        """
+        size, etag, first = self._first(size, etag, first)
+        fobj.truncate(size)
+        fobj.flush()
+        fd = fobj.fileno()
+        lock = threading.Lock()
+
+        def pwrite(data, offset):
+            # loop over short writes, which would otherwise leave a hole in the file
+            while data:
+                if hasattr(os, 'pwrite'):
+                    written = os.pwrite(fd, data, offset)
+                else:
+                    with lock:
+                        os.lseek(fd, offset, os.SEEK_SET)
+                        written = os.write(fd, data)
+                data = data[written:]
+                offset += written
+
+        def fetch(byte_range):
+            first_byte, last = byte_range
+            body = first if first_byte == 0 and first is not None else self._get_range(first_byte, last, etag)
+            scratch = bytearray(min(self.READ_BLOCK, last - first_byte + 1))
+            view = memoryview(scratch)
+            try:
+                pos = first_byte
+                while pos <= last:
+                    n = body.readinto(view[:min(len(scratch), last - pos + 1)])
+                    if n == 0:
+                        raise IOError(f"Short read on '{self.key}' range {first_byte}-{last}")
+                    pwrite(view[:n], pos)
+                    pos += n
+            finally:
+                body.close()
+
+        self._run(byte_ranges(size, self.chunk_size), fetch)
+        fobj.seek(0)
+        return fobj
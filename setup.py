@@ -16,6 +16,11 @@ setup(name='multicloud',
           'multicloud.backend.portable',
           'multicloud.backend.nas',
           'multicloud.backend.tiny',
+          'multicloud.backend.caching',
+          'multicloud.backend.replicated',
+          'multicloud.backend.writebehind',
+          'multicloud.backend.codec',
+          'multicloud.backend.instrumented',
           'multicloud.common'
       ],
       package_dir={
@@ -24,10 +29,14 @@ setup(name='multicloud',
       },
       scripts=[
           'bin/krfernet',
+          'bin/tinyserver',
 	  'bin/copy-secrets',
+          'bin/mc-sync',
+          'bin/mc-local-migrate',
       ],
       extras_require={
             'aws': ['boto3'],
+            'zstd': ['zstandard'],
       },
       install_requires=[]
      )
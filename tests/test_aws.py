@@ -0,0 +1,253 @@
+import os
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+import multicloud
+from bench.suite import StaticSecret
+from multicloud_aws.aws_backend import DELETE_BATCH_SIZE
+from multicloud_aws.aws_transfer import MIN_PART_SIZE, MultipartWriter
+
+BUCKET = "multicloud-test"
+MiB = 1024 * 1024
+
+
+def make_context(**backend):
+    config = { "svc": {
+        "network": { "verify": True },
+        "backend": dict({ "type": "aws", "Bucket": BUCKET, "Region": "us-east-1" }, **backend)
+    } }
+    return multicloud.Context("svc", config, credentials=StaticSecret({ "access_id": "test", "secret_key": "test" }))
+
+
+def record_calls(ctx, operation):
+    """Returns a list that collects the parameters of every S3 request of the given operation"""
+    calls = []
+    ctx.backend.client('s3').meta.events.register(
+        f"before-parameter-build.s3.{operation}", lambda params, **_: calls.append(params))
+    return calls
+
+
+def pending_uploads(ctx):
+    return ctx.backend.client('s3').list_multipart_uploads(Bucket=BUCKET).get('Uploads', [])
+
+
+@pytest.fixture
+def s3():
+    with moto.mock_aws():
+        boto3.client('s3', region_name="us-east-1").create_bucket(Bucket=BUCKET)
+        yield
+
+
+@pytest.fixture
+def ctx(s3):
+    return make_context(MultipartPartSize=MIN_PART_SIZE, MultipartConcurrency=2)
+
+
+# multipart upload
+
+def test_put_file_below_one_part_uses_put_object(ctx):
+    created = record_calls(ctx, "CreateMultipartUpload")
+    data = os.urandom(MIN_PART_SIZE - 1)
+    with ctx.object("small").put_file() as f:
+        f.write(data)
+    assert created == []
+    assert ctx.object("small").get_bytes() == data
+
+
+def test_put_file_uploads_parts_as_they_fill(ctx):
+    created = record_calls(ctx, "CreateMultipartUpload")
+    parts = record_calls(ctx, "UploadPart")
+    data = os.urandom(2 * MIN_PART_SIZE + 5)
+    with ctx.object("big").put_file() as f:
+        for i in range(0, len(data), 1000003):
+            f.write(data[i:i+1000003])
+        # the upload starts as soon as the first part fills, not on close
+        assert len(created) == 1
+    assert sorted(p['PartNumber'] for p in parts) == [ 1, 2, 3 ]
+    client = ctx.backend.client('s3')
+    sizes = [ client.head_object(Bucket=BUCKET, Key="big", PartNumber=n)['ContentLength'] for n in (1, 2, 3) ]
+    assert sizes == [ MIN_PART_SIZE, MIN_PART_SIZE, 5 ]
+    assert ctx.object("big").get_bytes() == data
+    assert pending_uploads(ctx) == []
+
+
+def test_part_size_is_raised_to_the_s3_minimum(ctx):
+    writer = MultipartWriter(ctx.backend.client('s3'), BUCKET, "k", part_size=1024, concurrency=0)
+    assert writer.part_size == MIN_PART_SIZE
+    assert writer.concurrency == 1
+    writer.abort()
+
+
+def test_put_file_aborts_on_exception(ctx):
+    ctx.object("kept").put_bytes(b"previous")
+    aborted = record_calls(ctx, "AbortMultipartUpload")
+    with pytest.raises(KeyError):
+        with ctx.object("kept").put_file() as f:
+            f.write(os.urandom(MIN_PART_SIZE + 1))
+            raise KeyError("boom")
+    assert len(aborted) == 1
+    assert pending_uploads(ctx) == []
+    assert ctx.object("kept").get_bytes() == b"previous"
+
+
+def test_put_file_aborts_before_the_first_part(ctx):
+    with pytest.raises(KeyError):
+        with ctx.object("never").put_file() as f:
+            f.write(b"partial")
+            raise KeyError("boom")
+    assert not ctx.object("never").exists()
+
+
+def test_text_put_file_aborts_on_exception(ctx):
+    with pytest.raises(KeyError):
+        with ctx.object("text").put_file(binary=False) as f:
+            f.write("x" * (MIN_PART_SIZE + 1))
+            raise KeyError("boom")
+    assert not ctx.object("text").exists()
+    assert pending_uploads(ctx) == []
+    with ctx.object("text").put_file(binary=False) as f:
+        f.write("héllo")
+    assert ctx.object("text").get_text() == "héllo"
+
+
+def test_abort_discards_the_upload(ctx):
+    f = ctx.object("aborted").put_file()
+    f.write(os.urandom(MIN_PART_SIZE + 1))
+    f.abort()
+    assert f.closed
+    assert not ctx.object("aborted").exists()
+    assert pending_uploads(ctx) == []
+
+
+# ranged and parallel download
+
+def test_get_range(ctx):
+    ctx.object("r").put_bytes(b"0123456789")
+    assert ctx.object("r").get_range(2, 3) == b"234"
+    assert ctx.object("r").get_range(8, 10) == b"89"
+    assert ctx.object("r").get_range(10, 5) == b""
+    assert ctx.object("r").get_range(3, 0) == b""
+    assert ctx.object("r").get_ranges([ (0, 2), (5, 3), (20, 1) ]) == [ b"01", b"567", b"" ]
+    with pytest.raises(ValueError):
+        ctx.object("r").get_range(-1, 2)
+
+
+@pytest.fixture
+def parallel(s3):
+    return make_context(ParallelDownload=True, DownloadChunkSize=MiB, DownloadConcurrency=4)
+
+
+def test_parallel_get_bytes(parallel):
+    data = os.urandom(3 * MiB + 7)
+    parallel.object("p").put_bytes(data)
+    ranges = record_calls(parallel, "GetObject")
+    heads = record_calls(parallel, "HeadObject")
+    got = parallel.object("p").get_bytes()
+    assert type(got) is bytes
+    assert got == data
+    assert sorted(r['Range'] for r in ranges) == sorted(
+        f"bytes={i * MiB}-{min((i + 1) * MiB, len(data)) - 1}" for i in range(4))
+    # the size and etag come from the first range, later ranges must match that version
+    assert heads == []
+    assert all(r.get('IfMatch') for r in ranges if not r['Range'].startswith("bytes=0-"))
+
+
+def test_parallel_get_buffer_is_read_only(parallel):
+    data = os.urandom(2 * MiB + 1)
+    parallel.object("p").put_bytes(data)
+    view = parallel.object("p").get_buffer()
+    assert view.readonly
+    assert view == data
+
+
+def test_parallel_get_file(parallel):
+    data = os.urandom(2 * MiB + 1)
+    parallel.object("p").put_bytes(data)
+    with parallel.object("p").get_file() as f:
+        assert f.read() == data
+
+
+def test_parallel_get_file_completes_short_writes(parallel, monkeypatch):
+    data = os.urandom(2 * MiB + 1)
+    parallel.object("p").put_bytes(data)
+    pwrite = os.pwrite
+    monkeypatch.setattr(os, "pwrite", lambda fd, b, offset: pwrite(fd, b[:1000], offset))
+    with parallel.object("p").get_file() as f:
+        assert f.read() == data
+
+
+def test_parallel_download_of_small_objects_takes_one_request(parallel):
+    parallel.object("small").put_bytes(b"abc")
+    ranges = record_calls(parallel, "GetObject")
+    heads = record_calls(parallel, "HeadObject")
+    assert parallel.object("small").get_bytes() == b"abc"
+    with parallel.object("small").get_file() as f:
+        assert f.read() == b"abc"
+    assert [ r.get('Range') for r in ranges ] == [ f"bytes=0-{MiB - 1}" ] * 2
+    assert heads == []
+
+
+def test_parallel_download_of_empty_objects(parallel):
+    parallel.object("empty").put_bytes(b"")
+    assert parallel.object("empty").get_bytes() == b""
+    with parallel.object("empty").get_file() as f:
+        assert f.read() == b""
+
+
+def test_reads_pass_the_request_payer(s3):
+    ctx = make_context(RequestPayer="requester", ParallelDownload=True, DownloadChunkSize=MiB)
+    ctx.object("small").put_bytes(b"abc")
+    ctx.object("large").put_bytes(os.urandom(2 * MiB + 1))
+    gets = record_calls(ctx, "GetObject")
+    heads = record_calls(ctx, "HeadObject")
+    for key in ("small", "large"):
+        ctx.object(key).get_bytes()
+        ctx.object(key).get_file().close()
+        ctx.object(key).exists()
+        ctx.object(key).info()
+    assert gets and heads
+    assert all(params.get('RequestPayer') == "requester" for params in gets + heads)
+
+
+# bulk operations
+
+def test_put_get_many(ctx):
+    items = { f"bulk/{i}": f"value {i}".encode() for i in range(40) }
+    put = ctx.put_many(items)
+    assert put.errors == {}
+    got = ctx.get_many(list(items) + [ "bulk/missing" ])
+    assert got.results == items
+    assert list(got.errors) == [ "bulk/missing" ]
+
+
+def test_delete_many_batches_requests(ctx):
+    batches = record_calls(ctx, "DeleteObjects")
+    ctx.put_many({ f"d/{i}": b"x" for i in range(5) })
+    keys = [ f"d/{i}" for i in range(2 * DELETE_BATCH_SIZE + 500) ]
+    result = ctx.delete_many(keys)
+    assert result.errors == {}
+    assert sorted(result.results) == sorted(keys)
+    assert sorted(len(b['Delete']['Objects']) for b in batches) == [ 500, DELETE_BATCH_SIZE, DELETE_BATCH_SIZE ]
+    assert list(ctx.list("d/")) == []
+
+
+# listing
+
+def test_list_pages_through_the_bucket(ctx):
+    pages = record_calls(ctx, "ListObjectsV2")
+    keys = sorted(f"many/{i:05}" for i in range(1005))
+    ctx.put_many({ key: b"x" for key in keys })
+    listed = list(ctx.list("many/"))
+    assert [ info.key for info in listed ] == keys
+    assert all(info.size == 1 and info.etag for info in listed)
+    assert len(pages) == 2
+
+
+def test_list_with_delimiter(ctx):
+    ctx.put_many({ "a/1": b"1", "a/b/2": b"22", "a/c/3": b"333", "other": b"" })
+    listed = list(ctx.list("a/", delimiter="/"))
+    assert sorted((info.key, info.is_prefix) for info in listed) == [
+        ("a/1", False), ("a/b/", True), ("a/c/", True) ]
+    assert [ info.key for info in ctx.list() ] == [ "a/1", "a/b/2", "a/c/3", "other" ]
@@ -0,0 +1,94 @@
+import pytest
+import multicloud
+from multicloud.backend.caching.disk_cache import DiskCache
+from multicloud.backend.object import ObjectInfo
+
+
+def make_contexts(tmp_path, revalidate=60, max_bytes=1024 * 1024):
+    """Returns a caching context over a local basedir, and a plain context writing to the same basedir"""
+    source = { "type": "local", "basedir": str(tmp_path / "source") }
+    config = {
+        "cached": { "backend": { "type": "caching", "cachedir": str(tmp_path / "cache"), "max_bytes": max_bytes,
+                                 "revalidate": revalidate, "source": source } },
+        "source": { "backend": source },
+    }
+    return multicloud.Context("cached", config), multicloud.Context("source", config)
+
+
+def store(cache, key, size):
+    cache.store(key, _Reader(b"x" * size), ObjectInfo(key, size, 0.0, f"etag-{key}"))
+
+
+class _Reader:
+    def __init__(self, data : bytes):
+        self.data = data
+
+    def read(self, size=-1):
+        data, self.data = self.data, b""
+        return data
+
+
+def test_budget_is_shared_between_instances(tmp_path):
+    first = DiskCache(str(tmp_path), 1000)
+    second = DiskCache(str(tmp_path), 1000)
+    for i in range(10):
+        store(first, f"a{i}", 100)
+        store(second, f"b{i}", 100)
+        assert first.usage() <= 1000
+    assert first.evictions + second.evictions > 0
+    assert first.stats()['bytes'] <= 1000 and second.stats()['bytes'] <= 1000
+    # the most recently stored entries survive eviction
+    assert first.lookup("b9") is not None
+
+
+def test_invalidate_and_clear_update_the_shared_usage(tmp_path):
+    first = DiskCache(str(tmp_path), 1000)
+    second = DiskCache(str(tmp_path), 1000)
+    store(first, "a", 300)
+    store(second, "b", 200)
+    assert second.stats()['bytes'] == 500
+    first.invalidate("b")
+    store(second, "c", 100)
+    assert second.stats()['bytes'] == 400 == second.usage()
+    first.clear()
+    store(second, "d", 50)
+    assert second.stats()['bytes'] == 50
+
+
+def test_reads_are_served_from_the_cache(tmp_path):
+    cached, source = make_contexts(tmp_path)
+    source.object("k").put_bytes(b"version 1")
+    assert cached.object("k").get_bytes() == b"version 1"
+    assert cached.object("k").get_bytes() == b"version 1"
+    assert cached.backend.stats()['misses'] == 1
+    assert cached.backend.stats()['hits'] == 1
+    # within the revalidate window the source is not asked
+    source.object("k").put_bytes(b"version two")
+    assert cached.object("k").get_bytes() == b"version 1"
+
+
+def test_etag_revalidation(tmp_path):
+    cached, source = make_contexts(tmp_path, revalidate=0)
+    source.object("k").put_bytes(b"version 1")
+    assert cached.object("k").get_bytes() == b"version 1"
+    assert cached.object("k").get_bytes() == b"version 1"
+    stats = cached.backend.stats()
+    assert (stats['misses'], stats['revalidations']) == (1, 1)
+    source.object("k").put_bytes(b"version two")
+    assert cached.object("k").get_bytes() == b"version two"
+    assert cached.backend.stats()['misses'] == 2
+    source.object("k").delete()
+    assert not cached.object("k").exists()
+    with pytest.raises(FileNotFoundError):
+        cached.object("k").get_bytes()
+    assert cached.backend.cache.lookup("k") is None
+
+
+def test_writes_drop_the_cache_entry(tmp_path):
+    cached, _ = make_contexts(tmp_path)
+    cached.object("k").put_bytes(b"version 1")
+    assert cached.object("k").get_bytes() == b"version 1"
+    cached.object("k").put_bytes(b"version two")
+    assert cached.object("k").get_bytes() == b"version two"
+    cached.object("k").delete()
+    assert cached.backend.cache.lookup("k") is None
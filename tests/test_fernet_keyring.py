@@ -0,0 +1,32 @@
+import pytest
+
+pytest.importorskip("cryptography")
+pytest.importorskip("keyring")
+
+from multicloud.backend.portable import fernet_keyring
+from multicloud.backend.portable.fernet_keyring import FernetKeyring
+
+
+def test_failed_commit_keeps_other_processes_entries(tmp_path, monkeypatch):
+    path = str(tmp_path / "keystore.json")
+    mine = FernetKeyring("password", path)
+    other = FernetKeyring("password", path)
+    mine.set_password("svc", "kept", "1")
+    other.set_password("svc", "a", "theirs")
+
+    def failing(file, mode="r", *args, **kwargs):
+        if mode == "ab":
+            raise OSError("disk full")
+        return open(file, mode, *args, **kwargs)
+    monkeypatch.setattr(fernet_keyring, "open", failing, raising=False)
+    with pytest.raises(OSError):
+        with mine.transaction():
+            mine.set_password("svc", "a", "mine")
+            mine.set_password("svc", "b", "mine")
+    monkeypatch.undo()
+    # the commit merged the other process's entry before failing, which must survive the failure
+    assert mine.get_password("svc", "a") == "theirs"
+    assert mine.get_password("svc", "b") is None
+    assert mine.get_password("svc", "kept") == "1"
+    mine.set_password("svc", "b", "2")
+    assert FernetKeyring("password", path).get_password("svc", "b") == "2"
@@ -0,0 +1,214 @@
+import os
+import pytest
+
+pytest.importorskip("webdav4")
+pytest.importorskip("wsgidav")
+pytest.importorskip("cheroot")
+
+import httpx
+import multicloud
+from webdav4.client import ResourceNotFound
+from bench.suite import StaticSecret, start_webdav
+from multicloud.backend.nas.nas_transfer import UPLOAD_SUFFIX, open_download
+
+CHUNK_SIZE = 64 * 1024
+
+
+class CountingSecret(StaticSecret):
+    def __init__(self, value : dict):
+        super().__init__(value)
+        self.reads = 0
+
+    def get(self) -> dict:
+        self.reads += 1
+        return super().get()
+
+
+@pytest.fixture
+def root(tmp_path):
+    server, port = start_webdav(str(tmp_path))
+    yield tmp_path, port
+    server.stop()
+
+
+@pytest.fixture
+def ctx(root):
+    _, port = root
+    config = { "svc": {
+        "network": { "verify": True },
+        "backend": { "type": "nas", "server": "127.0.0.1", "port": port, "scheme": "http", "chunk_size": CHUNK_SIZE }
+    } }
+    return multicloud.Context("svc", config, credentials=CountingSecret({ "username": "bench", "password": "bench" }))
+
+
+def stored(root, key):
+    with open(os.path.join(root[0], key), "rb") as f:
+        return f.read()
+
+
+def uploads(root, directory=""):
+    return [ name for name in os.listdir(os.path.join(root[0], directory)) if name.endswith(UPLOAD_SUFFIX) ]
+
+
+def test_handles_share_one_client(ctx):
+    ctx.object("a").put_bytes(b"1")
+    ctx.object("b").put_bytes(b"2")
+    assert ctx.object("a").client is ctx.object("b").client
+    assert ctx.credentials.reads == 1
+
+
+def test_put_get_bytes(ctx, root):
+    o = ctx.object("a/b/c.txt")
+    o.put_bytes(b"hello")
+    assert stored(root, "a/b/c.txt") == b"hello"
+    assert o.get_bytes() == b"hello"
+    assert o.exists()
+    assert o.info().size == 5
+    o.delete()
+    assert not o.exists()
+    assert o.info() is None
+    o.delete()
+
+
+def test_put_file_streams_chunks(ctx, root):
+    data = os.urandom(20 * CHUNK_SIZE + 3)
+    with ctx.object("big/x").put_file() as f:
+        for i in range(0, len(data), 100000):
+            f.write(data[i:i+100000])
+    assert stored(root, "big/x") == data
+    assert uploads(root, "big") == []
+
+
+def test_put_file_aborts_on_exception(ctx, root):
+    ctx.object("big/x").put_bytes(b"previous")
+    with pytest.raises(KeyError):
+        with ctx.object("big/x").put_file() as f:
+            f.write(os.urandom(10 * CHUNK_SIZE))
+            raise KeyError("boom")
+    assert stored(root, "big/x") == b"previous"
+    assert uploads(root, "big") == []
+
+
+def test_abort_keeps_the_previous_object(ctx, root):
+    ctx.object("x").put_bytes(b"previous")
+    f = ctx.object("x").put_file()
+    f.write(os.urandom(3 * CHUNK_SIZE))
+    f.abort()
+    assert f.closed
+    assert stored(root, "x") == b"previous"
+    assert uploads(root) == []
+
+
+def test_text_put_file_aborts_on_exception(ctx, root):
+    with pytest.raises(KeyError):
+        with ctx.object("t").put_file(binary=False) as f:
+            f.write("partial")
+            raise KeyError("boom")
+    assert not ctx.object("t").exists()
+    assert uploads(root) == []
+    with ctx.object("t").put_file(binary=False) as f:
+        f.write("héllo\n")
+    assert ctx.object("t").get_textfile().read() == "héllo\n"
+
+
+def test_get_file_streams(ctx):
+    data = os.urandom(10 * CHUNK_SIZE + 1)
+    ctx.object("x").put_bytes(data)
+    with ctx.object("x").get_file() as f:
+        assert b"".join(iter(lambda: f.read(70000), b"")) == data
+
+
+def test_get_file_missing(ctx):
+    with pytest.raises(ResourceNotFound):
+        ctx.object("missing").get_file()
+
+
+def test_download_resumes_after_a_dropped_connection(ctx):
+    data = os.urandom(10 * CHUNK_SIZE)
+    ctx.object("x").put_bytes(data)
+    stream = open_download(ctx.object("x").client, "x", CHUNK_SIZE)
+    chunks = stream._chunks
+    def dropped():
+        for i, chunk in enumerate(chunks):
+            if i == 3:
+                raise httpx.ReadError("connection reset")
+            yield chunk
+    stream._chunks = dropped()
+    try:
+        assert b"".join(iter(lambda: stream.read(50000), b"")) == data
+        assert stream.response.status_code == 206
+    finally:
+        stream.close()
+
+
+def test_get_range(ctx):
+    ctx.object("r").put_bytes(b"0123456789")
+    assert ctx.object("r").get_range(2, 3) == b"234"
+    assert ctx.object("r").get_range(8, 10) == b"89"
+    assert ctx.object("r").get_range(10, 5) == b""
+    assert ctx.object("r").get_range(3, 0) == b""
+
+
+def test_content_encoding(ctx):
+    ctx.object("z").put_bytes(b"compressed", content_encoding="gzip")
+    assert ctx.object("z").get_content_encoding() == "gzip"
+    ctx.object("z").put_bytes(b"plain")
+    assert ctx.object("z").get_content_encoding() is None
+
+
+def test_aborted_write_keeps_the_content_encoding(ctx, root):
+    ctx.object("z").put_bytes(b"compressed", content_encoding="gzip")
+    with pytest.raises(KeyError):
+        with ctx.object("z").put_file() as f:
+            f.write(b"plain")
+            raise KeyError("boom")
+    assert stored(root, "z") == b"compressed"
+    assert ctx.object("z").get_content_encoding() == "gzip"
+    with ctx.object("z").put_file() as f:
+        f.write(b"plain")
+    assert ctx.object("z").get_content_encoding() is None
+
+
+def test_failed_put_bytes_keeps_the_content_encoding(ctx, monkeypatch):
+    o = ctx.object("z")
+    o.put_bytes(b"compressed", content_encoding="gzip")
+    request = o.client.request
+    def failing(method, path, **kwargs):
+        if method == "PUT" and path == "z":
+            raise httpx.ReadError("connection reset")
+        return request(method, path, **kwargs)
+    monkeypatch.setattr(o.client, "request", failing)
+    with pytest.raises(httpx.ReadError):
+        o.put_bytes(b"plain")
+    monkeypatch.undo()
+    assert o.get_bytes() == b"compressed"
+    assert o.get_content_encoding() == "gzip"
+
+
+def test_list(ctx):
+    ctx.put_many({ "a/1": b"1", "a/b/2": b"22", "a/b/c/3": b"333", "d": b"" })
+    ctx.object("a/e").put_bytes(b"e", content_encoding="gzip")
+    assert sorted((info.key, info.size) for info in ctx.list()) == [
+        ("a/1", 1), ("a/b/2", 2), ("a/b/c/3", 3), ("a/e", 1), ("d", 0) ]
+    assert sorted(info.key for info in ctx.list("a/b")) == [ "a/b/2", "a/b/c/3" ]
+    assert sorted((info.key, info.is_prefix) for info in ctx.list("a/", delimiter="/")) == [
+        ("a/1", False), ("a/b/", True), ("a/e", False) ]
+    with pytest.raises(ValueError):
+        list(ctx.list(delimiter="-"))
+
+
+def test_bulk(ctx):
+    items = { f"bulk/{i}": f"value {i}".encode() for i in range(30) }
+    assert ctx.put_many(items).errors == {}
+    got = ctx.get_many(list(items) + [ "bulk/missing" ])
+    assert got.results == items
+    assert list(got.errors) == [ "bulk/missing" ]
+    assert ctx.delete_many(list(items)).errors == {}
+    assert list(ctx.list("bulk/")) == []
+
+
+def test_bulk_concurrency_fits_the_connection_pool(ctx):
+    assert ctx.backend.bulk_workers == 10
+    items = { f"pool/{i}": b"x" for i in range(200) }
+    assert ctx.put_many(items).errors == {}
+    assert ctx.get_many(list(items)).results == items
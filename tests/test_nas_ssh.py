@@ -0,0 +1,159 @@
+import os
+import socket
+import subprocess
+import threading
+import pytest
+
+paramiko = pytest.importorskip("paramiko")
+
+import multicloud
+from multicloud.backend.nas.nas_ssh import SshSession
+
+HOST_KEY = paramiko.RSAKey.generate(2048)
+
+
+class SshServer(paramiko.ServerInterface):
+    """Accepts any public key and runs each exec request with bash in a fixed directory
+
+    stdin, stdout and stderr are forwarded concurrently, as sshd does, so a client that
+    stops reading one stream stalls the command.
+    """
+
+    def __init__(self, home : str):
+        self.home = home
+        self.connections = 0
+        self.commands = 0
+        self.listener = socket.socket()
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.listen(8)
+        self.port = self.listener.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                sock, _ = self.listener.accept()
+            except OSError:
+                return
+            self.connections += 1
+            transport = paramiko.Transport(sock)
+            transport.add_server_key(HOST_KEY)
+            transport.start_server(server=self)
+
+    def close(self):
+        self.listener.close()
+
+    def get_allowed_auths(self, username):
+        return "publickey"
+
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED
+
+    def check_channel_exec_request(self, channel, command):
+        self.commands += 1
+        threading.Thread(target=self._run, args=(channel, command), daemon=True).start()
+        return True
+
+    def _run(self, channel, command):
+        process = subprocess.Popen(["bash", "-c", command], cwd=self.home,
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        def forward_stdin():
+            for chunk in iter(lambda: channel.recv(65536), b""):
+                process.stdin.write(chunk)
+            process.stdin.close()
+
+        def forward(stream, send):
+            for chunk in iter(lambda: stream.read1(65536), b""):
+                send(chunk)
+
+        threads = [ threading.Thread(target=forward_stdin, daemon=True),
+                    threading.Thread(target=forward, args=(process.stderr, channel.sendall_stderr), daemon=True) ]
+        for thread in threads:
+            thread.start()
+        forward(process.stdout, channel.sendall)
+        for thread in threads:
+            thread.join()
+        channel.send_exit_status(process.wait())
+        channel.close()
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """An ssh server running commands in tmp_path/remote, trusted by a client whose $HOME is tmp_path/home"""
+    remote = tmp_path / "remote"
+    ssh_dir = tmp_path / "home" / ".ssh"
+    remote.mkdir()
+    ssh_dir.mkdir(parents=True)
+    server = SshServer(str(remote))
+    (ssh_dir / "known_hosts").write_text(f"[127.0.0.1]:{server.port} {HOST_KEY.get_name()} {HOST_KEY.get_base64()}\n")
+    paramiko.RSAKey.generate(2048).write_private_key_file(str(ssh_dir / "id_rsa"))
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+    monkeypatch.delenv("SSH_AUTH_SOCK", raising=False)
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def ctx(server):
+    config = { "svc": {
+        "network": { "verify": True },
+        "backend": { "type": "nas", "server": "127.0.0.1", "ssh_port": server.port, "timeout": 10 }
+    } }
+    ctx = multicloud.Context("svc", config)
+    yield ctx
+    ctx.backend.ssh.close()
+
+
+def test_secrets_share_one_connection(ctx, server):
+    value = { "password": "it's \"quoted\"\nand multiline" }
+    for i in range(10):
+        ctx.secret(f"user{i}").set(dict(value, n=i))
+    for i in range(10):
+        assert ctx.secret(f"user{i}").get() == dict(value, n=i)
+    assert server.connections == 1
+    assert server.commands == 20
+    assert oct(os.stat(os.path.join(server.home, ".keys", "svc", "user3")).st_mode & 0o777) == "0o600"
+
+
+def test_missing_secret(ctx):
+    with pytest.raises(KeyError):
+        ctx.secret("missing").get()
+
+
+def test_get_secrets_in_one_command(ctx, server):
+    for name in ("a", "b", "we ird'name"):
+        ctx.secret(name).set({ "name": name })
+    commands = server.commands
+    result = ctx.get_secrets([ "a", "missing", "b", "we ird'name" ])
+    assert server.commands == commands + 1
+    assert result.results == { "a": { "name": "a" }, "b": { "name": "b" }, "we ird'name": { "name": "we ird'name" } }
+    assert list(result.errors) == [ "missing" ]
+    assert isinstance(result.errors["missing"], KeyError)
+
+
+def test_get_secrets_of_a_service_without_secrets(ctx):
+    result = ctx.get_secrets([ "a" ])
+    assert result.results == {}
+    assert list(result.errors) == [ "a" ]
+
+
+def test_reconnects_after_the_connection_drops(ctx, server):
+    ctx.secret("a").set({ "v": 1 })
+    ctx.backend.ssh.transport().close()
+    assert ctx.secret("a").get() == { "v": 1 }
+    assert server.connections == 2
+
+
+def test_large_stderr_does_not_stall_the_command(server):
+    session = SshSession("127.0.0.1", server.port, timeout=10)
+    try:
+        # more stderr than a channel window holds, written before any stdout
+        status, stdout, stderr = session.run("head -c 3000000 /dev/zero >&2; echo ok")
+        assert (status, stdout, len(stderr)) == (0, b"ok\n", 3000000)
+        assert session.run("cat; echo err >&2; exit 4", b"in") == (4, b"in", b"err\n")
+    finally:
+        session.close()
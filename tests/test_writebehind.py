@@ -0,0 +1,163 @@
+import json
+import os
+import threading
+import time
+import multicloud
+from multicloud.backend.writebehind.spool import CORRUPT_SUFFIX, OP_DELETE, SPOOL_SUFFIX, TMP_SUFFIX, Spool
+
+
+class Uploads:
+    """An upload function recording (key, op, data) in order, optionally held back or failing"""
+
+    def __init__(self):
+        self.done = []
+        self.failures = 0
+        self.gate = threading.Event()
+        self.gate.set()
+        self.started = threading.Event()
+
+    def __call__(self, entry):
+        self.started.set()
+        self.gate.wait(10)
+        if self.failures:
+            self.failures -= 1
+            raise IOError("upload failed")
+        data = None
+        if entry.op != OP_DELETE:
+            with entry.open() as f:
+                data = f.read(entry.size)
+        self.done.append((entry.key, entry.op, data))
+
+
+def write_spool_file(spooldir, sequence, key, data, op="put"):
+    with open(os.path.join(spooldir, f"{sequence:016d}-0000abcd{SPOOL_SUFFIX}"), "wb") as f:
+        f.write(json.dumps({ 'key': key, 'op': op }).encode('UTF-8') + b"\n" + data)
+
+
+def test_replays_leftover_spool_files_in_order(tmp_path):
+    write_spool_file(tmp_path, 7, "a", b"first")
+    write_spool_file(tmp_path, 9, "b", b"other")
+    write_spool_file(tmp_path, 12, "a", b"", op=OP_DELETE)
+    (tmp_path / f"unpublished{TMP_SUFFIX}").write_bytes(b"partial")
+    uploads = Uploads()
+    spool = Spool(str(tmp_path), uploads, workers=1, fsync=False)
+    spool.flush(10)
+    assert uploads.done == [ ("a", OP_DELETE, None), ("b", "put", b"other") ]
+    assert spool.stats()['coalesced'] == 1
+    assert [ name for name in os.listdir(tmp_path) if name != ".lock" ] == []
+    # new writes are numbered after the replayed ones
+    spool.put("c", b"new")
+    spool.flush(10)
+    assert uploads.done[-1] == ("c", "put", b"new")
+
+
+def test_quarantines_corrupt_spool_files(tmp_path):
+    write_spool_file(tmp_path, 1, "a", b"good")
+    torn = tmp_path / f"{2:016d}-0000beef{SPOOL_SUFFIX}"
+    torn.write_bytes(b'{"key": "b", "o')
+    uploads = Uploads()
+    spool = Spool(str(tmp_path), uploads, fsync=False)
+    spool.flush(10)
+    assert uploads.done == [ ("a", "put", b"good") ]
+    assert spool.quarantined == [ f"{torn}{CORRUPT_SUFFIX}" ]
+    assert spool.stats()['quarantined'] == 1
+    assert (tmp_path / f"{torn.name}{CORRUPT_SUFFIX}").read_bytes() == b'{"key": "b", "o'
+
+
+def test_waiting_writes_to_a_key_are_coalesced(tmp_path):
+    uploads = Uploads()
+    uploads.gate.clear()
+    spool = Spool(str(tmp_path), uploads, workers=2, fsync=False)
+    spool.put("k", b"1")
+    assert uploads.started.wait(10)
+    for value in (b"2", b"3", b"4"):
+        spool.put("k", value)
+    assert spool.latest("k").size == 1
+    uploads.gate.set()
+    spool.flush(10)
+    assert uploads.done == [ ("k", "put", b"1"), ("k", "put", b"4") ]
+    stats = spool.stats()
+    assert (stats['uploaded'], stats['coalesced'], stats['pending']) == (2, 2, 0)
+
+
+def test_superseded_retry_is_not_counted_as_uploaded(tmp_path):
+    uploads = Uploads()
+    uploads.failures = 1
+    spool = Spool(str(tmp_path), uploads, retries=3, retry_delay=0.3, fsync=False)
+    spool.put("k", b"old")
+    assert uploads.started.wait(10)
+    spool.put("k", b"new")
+    spool.flush(10)
+    assert uploads.done == [ ("k", "put", b"new") ]
+    stats = spool.stats()
+    assert (stats['uploaded'], stats['coalesced'], stats['retried']) == (1, 1, 1)
+
+
+def test_failed_uploads_stay_readable(tmp_path):
+    uploads = Uploads()
+    uploads.failures = 10
+    spool = Spool(str(tmp_path), uploads, retries=1, retry_delay=0.01, fsync=False)
+    spool.put("k", b"value")
+    try:
+        spool.flush(10)
+    except RuntimeError as e:
+        assert isinstance(e.__cause__, IOError)
+    else:
+        raise AssertionError("flush did not report the failed upload")
+    entry = spool.latest("k")
+    with entry.open() as f:
+        assert f.read() == b"value"
+
+
+def make_context(tmp_path):
+    config = { "svc": { "backend": { "type": "writebehind", "spooldir": str(tmp_path / "spool"), "fsync": False,
+                                     "source": { "type": "local", "basedir": str(tmp_path / "source") } } } }
+    return multicloud.Context("svc", config)
+
+
+def test_reads_are_served_from_the_spool(tmp_path):
+    ctx = make_context(tmp_path)
+    uploads = Uploads()
+    uploads.gate.clear()
+    upload = ctx.backend.spool.upload
+    ctx.backend.spool.upload = lambda entry: (uploads(entry), upload(entry))
+    ctx.object("k").put_bytes(b"spooled")
+    assert ctx.object("k").get_bytes() == b"spooled"
+    ctx.object("k").delete()
+    assert not ctx.object("k").exists()
+    uploads.gate.set()
+    ctx.backend.flush(10)
+    assert not ctx.object("k").exists()
+
+
+def test_read_follows_a_write_that_superseded_the_entry_it_found(tmp_path):
+    ctx = make_context(tmp_path)
+    spool = ctx.backend.spool
+    permits = threading.Semaphore(0)
+    upload = spool.upload
+    def held(entry):
+        assert permits.acquire(timeout=10)
+        upload(entry)
+    spool.upload = held
+    ctx.object("k").put_bytes(b"v1")
+    ctx.object("k").put_bytes(b"v2")
+    found = spool.latest("k")
+
+    latest = spool.latest
+    def racing_latest(key):
+        # between the reader's lookup and its open, v3 is written and v2 dropped as superseded,
+        # while v3 is still waiting to be uploaded
+        spool.latest = latest
+        ctx.object("k").put_bytes(b"v3")
+        permits.release()
+        while os.path.exists(found.path):
+            time.sleep(0.01)
+        return found
+    spool.latest = racing_latest
+    try:
+        assert ctx.object("k").get_bytes() == b"v3"
+    finally:
+        permits.release()
+        spool.flush(10)
+    assert ctx.object("k").get_bytes() == b"v3"
+    assert spool.stats()['coalesced'] == 1